@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'github_bot.settings')
 
 application = get_wsgi_application()
+
+# resume interrupted jobs and start serving the job queue
+from webhook_handler.webhook import start_job_queue  # noqa: E402 (requires configured Django settings)
+start_job_queue()
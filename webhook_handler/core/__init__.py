@@ -1,15 +1,35 @@
+from .cancellation    import CancellationToken
+from .cancellation    import JobCancelled
 from .config          import Config
 from .config          import configure_logger
+from .config          import get_config
+from .config          import release_logger
+from .deadline        import Deadline
+from .deadline        import DeadlineExceeded
 from .execution_error import ExecutionError
+from .job_context     import JobContext
+from .job_context     import cloned_repo_dir
+from .job_context     import new_execution_timestamp
+from .repo_tree       import RepoTree
 from .                import git_diff
 from .                import helpers
 from .                import templates
 from .                import test_injection
 
 __all__ = [
+    "CancellationToken",
+    "JobCancelled",
     "Config",
     "configure_logger",
+    "get_config",
+    "release_logger",
+    "Deadline",
+    "DeadlineExceeded",
     "ExecutionError",
+    "JobContext",
+    "cloned_repo_dir",
+    "new_execution_timestamp",
+    "RepoTree",
     "git_diff",
     "helpers",
     "templates",
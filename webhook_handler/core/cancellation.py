@@ -0,0 +1,80 @@
+import threading
+
+from typing import Callable
+
+
+class JobCancelled(Exception):
+    """
+    Raised when a pipeline stops early because its job was cancelled.
+    """
+    pass
+
+
+class CancellationToken:
+    """
+    Signals a running pipeline to stop. The pipeline checks the token between stages and attempts,
+    long-running operations (e.g., a test container) register a callback which aborts them immediately.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._callbacks = []
+        self.reason = None
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self, reason: str) -> None:
+        """
+        Cancels the pipeline and runs all registered callbacks.
+
+        Parameters:
+            reason (str): Why the pipeline is cancelled
+        """
+
+        with self._lock:
+            if self._cancelled.is_set():
+                return
+            self.reason = reason
+            self._cancelled.set()
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass  # aborting is best effort, the pipeline stops at its next check anyway
+
+    def raise_if_cancelled(self) -> None:
+        """
+        Stops the pipeline if it has been cancelled.
+        """
+
+        if self._cancelled.is_set():
+            raise JobCancelled(f"Cancelled ({self.reason})")
+
+    def add_callback(self, callback: Callable[[], None]) -> None:
+        """
+        Registers a callback which aborts an ongoing operation. Runs immediately if already cancelled.
+
+        Parameters:
+            callback (Callable[[], None]): The callback
+        """
+
+        with self._lock:
+            if not self._cancelled.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback: Callable[[], None]) -> None:
+        """
+        Unregisters a callback once its operation has finished.
+
+        Parameters:
+            callback (Callable[[], None]): The callback
+        """
+
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
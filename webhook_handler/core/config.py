@@ -1,18 +1,21 @@
 import os
+import contextvars
+import functools
 import tree_sitter_javascript
 import logging
 
 from dotenv import load_dotenv
-from datetime import datetime
 from tree_sitter import Language
 from pathlib import Path
 
 
 class Config:
     """
-    Holds all configuration and path variables.
+    Holds all configuration and path variables. Instances are immutable snapshots shared by all pipelines
+    of a process (see get_config), per-PR state is kept in a JobContext. Options can be overridden on
+    creation, e.g., Config(fetch_pdf=False).
     """
-    def __init__(self):
+    def __init__(self, **overrides):
         ############# Environment Variables #############
         load_dotenv()
         self.github_webhook_secret = os.getenv('GITHUB_WEBHOOK_SECRET')
@@ -27,12 +30,10 @@ class Config:
         }
 
         ################# General Config ################
-        self.execution_timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
         self.project_root = Path.cwd()
         is_in_server = Path("/home/ubuntu").is_dir()  # Directory where webhook requests will be saved
 
         ############### Modifiable Config ###############
-        self.parse_language = Language(tree_sitter_javascript.language())
         self.prompt_combinations = {
             "include_golden_code"        : [1, 1, 1, 1, 0],
             "include_pr_summary"         : [0, 1, 0, 0, 0],
@@ -43,6 +44,31 @@ class Config:
         self.fetch_pdf = True  # default: True
         self.inject_in_file = ""  # default: ""
         self.execute_teardown = True  # default: True
+        self.reuse_artifacts = True  # default: True (clone, image and prepared inputs of open PRs serve later pushes)
+        self.max_kept_artifacts = 20  # default: 20 (PRs whose artifacts are kept, least recently prepared are removed)
+        self.kept_artifacts_max_age = 7 * 24 * 3600  # default: 7 days (artifacts not prepared since are removed)
+        self.max_changed_files = 50  # default: 50 (larger PRs are rejected before validation)
+        self.max_workers = 2  # default: 2 (concurrent pipelines)
+        self.max_queue_size = 10  # default: 10 (waiting pipelines before requests are rejected)
+        self.queue_retry_after = 300  # default: 300 (seconds suggested to client when queue is full)
+        self.http_timeout = (5, 30)  # default: (5, 30) (connect and read timeout of HTTP requests in seconds)
+        self.http_max_retries = 3  # default: 3 (retries of idempotent requests on server errors and connection resets)
+        self.rate_limit_reserve = 0.1  # default: 0.1 (share of the rate limit bulk downloads leave to validation calls)
+        self.rate_limit_pace_below = 0.5  # default: 0.5 (share of the rate limit below which bulk downloads are paced)
+        self.max_fetch_workers = 8  # default: 8 (concurrent file downloads per PR)
+        self.blob_cache_max_bytes = 512 * 1024 ** 2  # default: 512 MiB (file versions cached on disk)
+        self.pdf_max_bytes = 50 * 1024 ** 2  # default: 50 MiB (larger reference PDFs are skipped)
+        self.pdf_download_timeout = 120  # default: 120 (seconds per reference PDF download)
+        self.pdf_cache_max_bytes = 1024 ** 3  # default: 1 GiB (reference PDFs cached on disk)
+        self.linked_issue_ttl = 600  # default: 600 (seconds a resolved issue number is reused by other PRs)
+        self.bugzilla_cache_ttl = 3600  # default: 3600 (seconds Bugzilla bugs are served from the response cache)
+        self.job_timeout = 5400  # default: 5400 (seconds per job, attempts which cannot start in time are skipped)
+        self.stage_timeouts = {  # seconds per stage, capped by the time left for the job
+            "rate_limit_wait": 900,
+            "docker_build"   : 1800,
+            "llm_query"      : 300,
+            "test_run"       : 300,
+        }
         if is_in_server:
             self.webhook_raw_log_dir = "/home/ubuntu/logs_js/raw/"  # for raw requests
             self.bot_log_dir         = "/home/ubuntu/logs_js/"      # for parsed requests
@@ -51,42 +77,68 @@ class Config:
             self.bot_log_dir         = Path(self.project_root, "bot_logs")  # for parsed requests
         self.gen_test_dir = Path(self.project_root, "generated_tests")
 
-        ############# Log Directories Config ############
-        self.pr_log_dir = None
-        self.output_dir = None
-        self.cloned_repo_dir = None
+        for name, value in overrides.items():
+            if name not in self.__dict__:
+                raise AttributeError(f"Unknown config option '{name}'")
+            setattr(self, name, value)
 
         Path(self.webhook_raw_log_dir).mkdir(parents=True, exist_ok=True)
         Path(self.bot_log_dir).mkdir(parents=True, exist_ok=True)
         Path(self.gen_test_dir).mkdir(parents=True, exist_ok=True)
+        self._frozen = True
 
-    def setup_pr_log_dir(self, pr_id: str) -> None:
-        """
-        Sets up directory for logger output file (one directory per PR)
+    def __setattr__(self, name, value):
+        if getattr(self, "_frozen", False):
+            raise AttributeError(f"Config is immutable, pass '{name}' to Config() instead")
+        super().__setattr__(name, value)
 
-        Parameters:
-            pr_id (str): ID of the PR
+    @functools.cached_property
+    def parse_language(self) -> Language:
+        """
+        The Tree-sitter language used to parse source files, loaded on first use.
         """
 
-        self.pr_log_dir = Path(self.bot_log_dir, pr_id + "_%s" % self.execution_timestamp)
-        self.cloned_repo_dir = f"tmp_repo_dir_{pr_id}"
-        Path(self.pr_log_dir).mkdir(parents=True, exist_ok=True)
+        return Language(tree_sitter_javascript.language())
 
-    def setup_output_dir(self, i_attempt: int, model) -> None:
-        """
-        Sets up directory for generated pipeline files (one directory per run)
+    @property
+    def job_db_path(self) -> Path:
+        return Path(self.bot_log_dir, "jobs.sqlite3")
 
-        Parameters:
-            i_attempt (int): Attempt number
-            model (LLM): Model name
-        """
+    @property
+    def blob_cache_dir(self) -> Path:
+        return Path(self.bot_log_dir, "blob_cache")
+
+    @property
+    def repo_mirror_dir(self) -> Path:
+        return Path(self.bot_log_dir, "mirrors")
+
+    @property
+    def pdf_cache_dir(self) -> Path:
+        return Path(self.bot_log_dir, "pdf_cache")
+
+    @property
+    def response_cache_path(self) -> Path:
+        return Path(self.bot_log_dir, "response_cache.sqlite3")
+
+    @property
+    def import_index_path(self) -> Path:
+        return Path(self.bot_log_dir, "import_index.sqlite3")
+
+    @property
+    def co_change_index_path(self) -> Path:
+        return Path(self.bot_log_dir, "co_change_index.sqlite3")
 
-        self.output_dir = Path(
-            self.pr_log_dir,
-            "i%s" % (i_attempt + 1) + "_%s" % model
-        )
-        Path(self.output_dir).mkdir(parents=True, exist_ok=True)
-        Path(self.output_dir, "generation").mkdir(parents=True)
+
+@functools.cache
+def get_config() -> Config:
+    """
+    Returns the process-wide config, created on first use.
+
+    Returns:
+        Config: The shared config
+    """
+
+    return Config()
 
 
 ############### Custom Logger Tags ##############
@@ -142,41 +194,86 @@ class ColoredFormatter(logging.Formatter):
 
 
 ############# Logger Initialization #############
-def configure_logger(pr_log_dir: Path, execution_id: str) -> None:
+# ID of the job whose log file receives the records emitted in the current (thread) context
+_job_log_id: contextvars.ContextVar[str | None] = contextvars.ContextVar("job_log_id", default=None)
+
+
+class JobLogFilter(logging.Filter):
+    """
+    Only lets records through that are emitted in the context of a specific job.
+    """
+    def __init__(self, job_log_id: str):
+        super().__init__()
+        self.job_log_id = job_log_id
+
+    def filter(self, record) -> bool:
+        """
+        Compares the job of the current context with the job of the handler.
+        """
+
+        return _job_log_id.get() == self.job_log_id
+
+
+def configure_logger(pr_log_dir: Path, execution_id: str) -> logging.Handler:
     """
-    Sets up the global logger for PR test generation
+    Sets up the logger for PR test generation. The root logger keeps a single console handler, while
+    every job gets its own file handler which only receives the records emitted in the job's context.
+    Hence, pipelines running concurrently in different threads never write into each other's log file.
 
     Parameters:
         pr_log_dir (Path): Path to the PR log directory
         execution_id (str): ID of the PR test generation execution
+
+    Returns:
+        logging.Handler: The file handler of the job, to be passed to release_logger once the job is done
     """
 
     logfile = Path(pr_log_dir, f"{execution_id}.log")
+    job_log_id = logfile.as_posix()
 
     # get root logger
     root = logging.getLogger()
     root.setLevel("INFO")
 
-    # remove any existing handlers (so pytest reruns don't duplicate)
-    for h in list(root.handlers):
-        root.removeHandler(h)
-
     fmt = "[%(asctime)s] %(levelname)-9s: %(message)s"
 
-    # console handler
-    ch = logging.StreamHandler()
-    ch.setLevel("INFO")
-    ch.setFormatter(ColoredFormatter(
-        fmt,
-        datefmt="%H:%M:%S"
-    ))
-    root.addHandler(ch)
+    # console handler (shared by all jobs, only added once)
+    if not any(getattr(h, "is_pipeline_console", False) for h in root.handlers):
+        ch = logging.StreamHandler()
+        ch.is_pipeline_console = True
+        ch.setLevel("INFO")
+        ch.setFormatter(ColoredFormatter(
+            fmt,
+            datefmt="%H:%M:%S"
+        ))
+        root.addHandler(ch)
 
-    # file handler
-    fh = logging.FileHandler(logfile, mode="w", encoding="utf-8")
+    # remove a stale handler of the same job (so pytest reruns don't duplicate)
+    for h in list(root.handlers):
+        if any(isinstance(f, JobLogFilter) and f.job_log_id == job_log_id for f in h.filters):
+            release_logger(h)
+
+    # file handler (only for records of this job)
+    fh = logging.FileHandler(logfile, mode="a", encoding="utf-8")  # resumed jobs continue their log
     fh.setLevel("INFO")
     fh.setFormatter(logging.Formatter(
         fmt,
         datefmt="%Y-%m-%d %H:%M:%S"
     ))
+    fh.addFilter(JobLogFilter(job_log_id))
     root.addHandler(fh)
+
+    _job_log_id.set(job_log_id)
+    return fh
+
+
+def release_logger(handler: logging.Handler) -> None:
+    """
+    Detaches and closes the file handler of a finished job.
+
+    Parameters:
+        handler (logging.Handler): The handler returned by configure_logger
+    """
+
+    logging.getLogger().removeHandler(handler)
+    handler.close()
@@ -0,0 +1,68 @@
+import math
+import time
+
+from .execution_error import ExecutionError
+
+
+class DeadlineExceeded(ExecutionError):
+    """
+    Raised when a job or one of its stages runs out of time.
+    """
+    pass
+
+
+class Deadline:
+    """
+    Bounds the total run time of a job. Every stage derives its own budget from it, which is capped by the
+    time left for the whole job.
+    """
+    def __init__(self, seconds: float | None):
+        self._expires_at = time.monotonic() + seconds if seconds else None
+
+    @property
+    def remaining(self) -> float:
+        if self._expires_at is None:
+            return math.inf
+        return max(0.0, self._expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining <= 0
+
+    def budget(self, stage_seconds: float | None) -> float:
+        """
+        Determines how long a stage may take.
+
+        Parameters:
+            stage_seconds (float | None): The budget of the stage, None if unbounded
+
+        Returns:
+            float: The budget of the stage, capped by the time left for the job
+        """
+
+        return min(stage_seconds if stage_seconds is not None else math.inf, self.remaining)
+
+    def timeout(self, stage_seconds: float | None) -> float | None:
+        """
+        Determines the budget of a stage in the form expected by client timeouts.
+
+        Parameters:
+            stage_seconds (float | None): The budget of the stage, None if unbounded
+
+        Returns:
+            float | None: The budget of the stage, None if neither the stage nor the job is bounded
+        """
+
+        budget = self.budget(stage_seconds)
+        return None if math.isinf(budget) else budget
+
+    def check(self, stage: str) -> None:
+        """
+        Aborts if no time is left for the job.
+
+        Parameters:
+            stage (str): The stage which is about to start
+        """
+
+        if self.expired:
+            raise DeadlineExceeded(f"Job deadline exceeded before {stage}")
@@ -1,4 +1,5 @@
 import shutil
+import contextvars
 import re
 import subprocess
 import os
@@ -9,101 +10,166 @@ import logging
 
 from pathlib import Path
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterable, Iterator
+
+from .repo_tree import RepoTree
 
 
 logger = logging.getLogger(__name__)
 
+_IMPORT_BLOCK_PATTERN = re.compile(
+    r'import\s+(?P<imports>[^;]+?)\s+from\s+[\'"](?P<path>(\./|\.\./)[^\'"]+)[\'"]',
+    re.DOTALL # for multi-line imports
+)
+
 
-def extract_packages(base_commit: str, repo_dir: str) -> str:
+def extract_packages(repo_tree: RepoTree) -> str:
     """
-    Filters the repository for the package.json file and extracts all its dependencies.
+    Reads the package.json file of a commit and extracts all its dependencies.
 
     Parameters:
-        base_commit (str): The base commit to check out
-        repo_dir (str): The path to the temporary directory
+        repo_tree (RepoTree): The files of the base commit
 
     Returns:
         str: All the dependencies
     """
 
-    current_branch = run_command("git rev-parse --abbrev-ref HEAD", cwd=repo_dir)
-    run_command(f"git checkout {base_commit}", cwd=repo_dir)
-    try:
-        package_json_path = Path(repo_dir, "package.json")
-        if not package_json_path.is_file():
-            logger.warning('No package.json found')
-            return ""
-        package_data = json.loads(package_json_path.read_text(encoding="utf-8"))
-        dependencies = package_data.get("dependencies", {})
-        dev_dependencies = package_data.get("devDependencies", {})
-        engines = package_data.get("engines", {})
-        output_lines = ["Available Packages"]
-        if not dependencies and not dev_dependencies:
-            return ""
-        if dependencies:
-            output_lines.append("Dependencies:")
-            for pkg, version in dependencies.items():
-                output_lines.append(f"- {pkg}: {version}")
-            output_lines[-1] += "\n"
-        if dev_dependencies:
-            output_lines.append("Dev Dependencies:")
-            for pkg, version in dev_dependencies.items():
-                output_lines.append(f"- {pkg}: {version}")
-            output_lines[-1] += "\n"
-        if engines:
-            output_lines.append("Engines:")
-            for engine, version in engines.items():
-                output_lines.append(f"- {engine}: {version}")
-            output_lines[-1] += "\n"
-
-        return "\n".join(output_lines)
-    finally:
-        run_command(f"git checkout {current_branch}", cwd=repo_dir)  # Reset to the original commit
-
-
-def extract_relative_imports(base_commit:str, repo_dir: str) -> str:
-    """
-    Loops through all test files and extracts all relative imports.
+    package_json = repo_tree.read_text("package.json")
+    if package_json is None:
+        logger.warning('No package.json found')
+        return ""
+    package_data = json.loads(package_json)
+    dependencies = package_data.get("dependencies", {})
+    dev_dependencies = package_data.get("devDependencies", {})
+    engines = package_data.get("engines", {})
+    output_lines = ["Available Packages"]
+    if not dependencies and not dev_dependencies:
+        return ""
+    if dependencies:
+        output_lines.append("Dependencies:")
+        for pkg, version in dependencies.items():
+            output_lines.append(f"- {pkg}: {version}")
+        output_lines[-1] += "\n"
+    if dev_dependencies:
+        output_lines.append("Dev Dependencies:")
+        for pkg, version in dev_dependencies.items():
+            output_lines.append(f"- {pkg}: {version}")
+        output_lines[-1] += "\n"
+    if engines:
+        output_lines.append("Engines:")
+        for engine, version in engines.items():
+            output_lines.append(f"- {engine}: {version}")
+        output_lines[-1] += "\n"
+
+    return "\n".join(output_lines)
+
+
+def list_test_files(repo_tree: RepoTree) -> list[str]:
+    """
+    Lists all test files of a commit whose imports are collected.
 
     Parameters:
-        base_commit (str): The base commit to check out
-        repo_dir (str): The path to the temporary directory
+        repo_tree (RepoTree): The files of the commit
+
+    Returns:
+        list[str]: The paths of the test files
+    """
+
+    return [path for path in repo_tree.paths if path.startswith("test/unit/") and path.endswith(".js")]
+
+
+def parse_relative_imports(content: str) -> dict[str, set[str]]:
+    """
+    Extracts the relative imports of a single file.
+
+    Parameters:
+        content (str): The content of the file
+
+    Returns:
+        dict[str, set[str]]: The imported symbols per import path
+    """
+
+    import_map = defaultdict(set)
+    for match in _IMPORT_BLOCK_PATTERN.finditer(content):
+        import_path = match.group("path")
+        raw_imports = match.group("imports")
+        raw_imports = raw_imports.replace("{", "").replace("}", "")
+        symbols = [s.strip() for s in raw_imports.split(",") if s.strip()]
+        for sym in symbols:
+            # Handle "A as B" → resolve to A
+            if " as " in sym:
+                original_sym = sym.split(" as ")[0].strip()
+            else:
+                original_sym = sym
+            if original_sym:
+                import_map[import_path].add(original_sym)
+    return dict(import_map)
+
+
+def format_relative_imports(import_map: dict[str, set[str]]) -> str:
+    """
+    Formats the relative imports for the prompt.
+
+    Parameters:
+        import_map (dict[str, set[str]]): The imported symbols per import path
 
     Returns:
         str: All the relative imports
     """
 
-    current_branch = run_command("git rev-parse --abbrev-ref HEAD", cwd=repo_dir)
-    run_command(f"git checkout {base_commit}", cwd=repo_dir)
-    try:
-        import_block_pattern = re.compile(
-            r'import\s+(?P<imports>[^;]+?)\s+from\s+[\'"](?P<path>(\./|\.\./)[^\'"]+)[\'"]',
-            re.DOTALL # for multi-line imports
-        )
-        import_map = defaultdict(set)
-        for file in Path(repo_dir, 'test', 'unit').rglob("*.js"):
-            content = file.read_text(encoding="utf-8")
-            for match in import_block_pattern.finditer(content):
-                import_path = match.group("path")
-                raw_imports = match.group("imports")
-                raw_imports = raw_imports.replace("{", "").replace("}", "")
-                symbols = [s.strip() for s in raw_imports.split(",") if s.strip()]
-                for sym in symbols:
-                    # Handle "A as B" → resolve to A
-                    if " as " in sym:
-                        original_sym = sym.split(" as ")[0].strip()
-                    else:
-                        original_sym = sym
-                    if original_sym:
-                        import_map[import_path].add(original_sym)
-
-        output_lines = ["Available Relative Imports:"]
-        for path in sorted(import_map):
-            symbols = sorted(import_map[path])
-            output_lines.append(f"- `{path}`: {', '.join(symbols)}")
-        return "\n".join(output_lines) if import_map else ""
-    finally:
-        run_command(f"git checkout {current_branch}", cwd=repo_dir)  # Reset to the original commit
+    output_lines = ["Available Relative Imports:"]
+    for path in sorted(import_map):
+        symbols = sorted(import_map[path])
+        output_lines.append(f"- `{path}`: {', '.join(symbols)}")
+    return "\n".join(output_lines) if import_map else ""
+
+
+def parallel_map(func: Callable, items: Iterable, max_workers: int) -> list:
+    """
+    Helper method to apply a function to all items on a bounded number of threads. Every call runs in a copy
+    of the caller's context, hence logs still end up in the log file of the job.
+
+    Parameters:
+        func (Callable): The function to apply
+        items (Iterable): The items
+        max_workers (int): The maximum number of threads
+
+    Returns:
+        list: The results in the order of the items
+    """
+
+    items = list(items)
+    if len(items) <= 1 or max_workers <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        futures = [executor.submit(contextvars.copy_context().run, func, item) for item in items]
+        return [future.result() for future in futures]
+
+
+def parallel_iter(func: Callable, items: Iterable, max_workers: int) -> Iterator[tuple]:
+    """
+    Helper method to apply a function to all items on a bounded number of threads and to yield the results as
+    soon as they are available. Every call runs in a copy of the caller's context.
+
+    Parameters:
+        func (Callable): The function to apply
+        items (Iterable): The items
+        max_workers (int): The maximum number of threads
+
+    Returns:
+        Iterator[tuple]: Pairs of item and result in the order of completion
+    """
+
+    items = list(items)
+    if len(items) <= 1 or max_workers <= 1:
+        for item in items:
+            yield item, func(item)
+        return
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        futures = {executor.submit(contextvars.copy_context().run, func, item): item for item in items}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
 
 
 def run_command(command: str, cwd: str = None) -> str | None:
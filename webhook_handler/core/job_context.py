@@ -0,0 +1,68 @@
+from datetime import datetime
+from pathlib import Path
+
+from .cancellation import CancellationToken
+from .config import Config
+from .deadline import Deadline
+
+
+class JobContext:
+    """
+    Holds the per-job state of one pipeline execution: its log, output and repository directories, the
+    token which cancels it and the deadline which bounds its run time.
+    """
+    def __init__(
+            self,
+            config: Config,
+            pr_id: str,
+            execution_timestamp: str = None,
+            cancel_token: CancellationToken = None
+    ):
+        self.execution_timestamp = execution_timestamp or new_execution_timestamp()
+        self.cancel_token = cancel_token or CancellationToken()
+        self.deadline = Deadline(config.job_timeout)
+        self.pr_log_dir = Path(config.bot_log_dir, pr_id + "_%s" % self.execution_timestamp)
+        self.cloned_repo_dir = cloned_repo_dir(pr_id)
+        self.output_dir = None
+        Path(self.pr_log_dir).mkdir(parents=True, exist_ok=True)
+
+    def setup_output_dir(self, i_attempt: int, model) -> None:
+        """
+        Sets up directory for generated pipeline files (one directory per run)
+
+        Parameters:
+            i_attempt (int): Attempt number
+            model (LLM): Model name
+        """
+
+        self.output_dir = Path(
+            self.pr_log_dir,
+            "i%s" % (i_attempt + 1) + "_%s" % model
+        )
+        Path(self.output_dir).mkdir(parents=True, exist_ok=True)
+        Path(self.output_dir, "generation").mkdir(parents=True, exist_ok=True)  # exists if attempt is resumed
+
+
+def cloned_repo_dir(pr_id: str) -> str:
+    """
+    Determines where the repository of a PR is cloned to. The clone outlives single jobs of the PR.
+
+    Parameters:
+        pr_id (str): The ID of the PR
+
+    Returns:
+        str: The directory of the clone
+    """
+
+    return f"tmp_repo_dir_{pr_id}"
+
+
+def new_execution_timestamp() -> str:
+    """
+    Creates the timestamp which identifies a job in its directory names.
+
+    Returns:
+        str: The current time
+    """
+
+    return datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
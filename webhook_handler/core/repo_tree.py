@@ -0,0 +1,139 @@
+import subprocess
+import threading
+
+from collections import OrderedDict
+
+
+_TREE_CACHE_SIZE = 16
+_tree_cache = OrderedDict()  # tree hash -> (blob SHA per path, unit test paths per file name)
+_tree_cache_lock = threading.Lock()
+
+
+class RepoTree:
+    """
+    Read-only view of the files of a repository at one commit. Files are listed with `git ls-tree` and read with
+    `git cat-file`, the working tree is never touched. Hence, several views can be used concurrently on one
+    repository. The listing of a tree is cached by its hash, so views of the same tree share it.
+    """
+    def __init__(self, repo_dir: str, commit: str):
+        self.repo_dir = repo_dir
+        self.commit = commit
+        self.tree_hash = self._git("rev-parse", f"{commit}^{{tree}}").decode().strip()
+        self._blobs, self._unit_test_files = _list_tree(repo_dir, self.tree_hash)
+
+    def _git(self, *args: str, stdin: bytes = None) -> bytes:
+        """
+        Runs a git command in the repository.
+
+        Parameters:
+            *args (str): The arguments of the git command
+            stdin (bytes, optional): The input of the command
+
+        Returns:
+            bytes: The output of the command
+        """
+
+        return subprocess.run(["git", *args], cwd=self.repo_dir, input=stdin, capture_output=True, check=True).stdout
+
+    @property
+    def paths(self) -> list[str]:
+        return list(self._blobs)
+
+    def is_file(self, path: str) -> bool:
+        return path in self._blobs
+
+    def blob_sha(self, path: str) -> str | None:
+        return self._blobs.get(path)
+
+    def find_unit_test_files(self, filename: str) -> list[str]:
+        """
+        Looks up the files below a test/unit/ directory by their name.
+
+        Parameters:
+            filename (str): The name of the file (e.g., util_spec.js)
+
+        Returns:
+            list[str]: The paths of all matching files
+        """
+
+        return list(self._unit_test_files.get(filename, []))
+
+    def read_text(self, path: str) -> str | None:
+        """
+        Reads a file.
+
+        Parameters:
+            path (str): The path of the file relative to the repository root
+
+        Returns:
+            str | None: The content of the file, or None if it does not exist at the commit
+        """
+
+        if path not in self._blobs:
+            return None
+        return self._git("cat-file", "blob", self._blobs[path]).decode("utf-8", errors="replace")
+
+    def read_texts(self, paths: list[str]) -> dict[str, str]:
+        """
+        Reads several files with a single `git cat-file --batch` process.
+
+        Parameters:
+            paths (list[str]): The paths of the files relative to the repository root
+
+        Returns:
+            dict[str, str]: The content of every file which exists at the commit
+        """
+
+        paths = [path for path in paths if path in self._blobs]
+        if not paths:
+            return {}
+        output = self._git("cat-file", "--batch", stdin="".join(f"{self._blobs[path]}\n" for path in paths).encode())
+        contents, offset = {}, 0
+        for path in paths:
+            header_end = output.index(b"\n", offset)
+            size = int(output[offset:header_end].split()[2])  # <sha> <type> <size>
+            contents[path] = output[header_end + 1:header_end + 1 + size].decode("utf-8", errors="replace")
+            offset = header_end + 1 + size + 1  # trailing newline
+        return contents
+
+
+def _list_tree(repo_dir: str, tree_hash: str) -> tuple[dict[str, str], dict[str, list[str]]]:
+    """
+    Lists all files of a tree and indexes the files below test/unit/ directories by their name. The listing only
+    depends on the tree hash, hence it is shared by all worktrees of a repository.
+
+    Parameters:
+        repo_dir (str): The directory of the repository
+        tree_hash (str): The hash of the tree
+
+    Returns:
+        dict[str, str]: The blob SHA per path
+        dict[str, list[str]]: The paths below test/unit/ directories per file name
+    """
+
+    with _tree_cache_lock:
+        if tree_hash in _tree_cache:
+            _tree_cache.move_to_end(tree_hash)
+            return _tree_cache[tree_hash]
+
+    output = subprocess.run(
+        ["git", "ls-tree", "-r", "-z", "--full-tree", tree_hash], cwd=repo_dir, capture_output=True, check=True
+    ).stdout
+    blobs, unit_test_files = {}, {}
+    for entry in output.split(b"\0"):
+        if not entry:
+            continue
+        meta, path = entry.split(b"\t", 1)
+        _, obj_type, sha = meta.split()
+        if obj_type != b"blob":
+            continue
+        path = path.decode("utf-8", errors="replace")
+        blobs[path] = sha.decode()
+        if "test/unit/" in path:
+            unit_test_files.setdefault(path.rsplit("/", 1)[-1], []).append(path)
+
+    with _tree_cache_lock:
+        _tree_cache[tree_hash] = blobs, unit_test_files
+        while len(_tree_cache) > _TREE_CACHE_SIZE:
+            _tree_cache.popitem(last=False)
+    return blobs, unit_test_files
@@ -4,9 +4,9 @@ import logging
 
 from tree_sitter import Parser, Language
 from pathlib import Path
-from collections import Counter
+from typing import Callable
 
-from . import helpers
+from .repo_tree import RepoTree
 
 
 logger = logging.getLogger(__name__)
@@ -14,18 +14,19 @@ logger = logging.getLogger(__name__)
 
 def get_candidate_test_file(
         parse_language: Language,
-        base_commit: str,
+        repo_tree: RepoTree,
         patch: str,
-        tmp_repo_dir: str
+        find_co_changes: Callable[[str, int, int], list[tuple[str, int]]]
 ) -> [str, str, str]:
     """
     Finds a fitting test file and its content to inject the newly generated test into.
 
     Parameters:
         parse_language (Language): The language the parser should use
-        base_commit (str): The base commit used to check out
+        repo_tree (RepoTree): The files of the base commit
         patch (str): The golden code patch
-        tmp_repo_dir (str): The directory to look for test files in
+        find_co_changes (Callable[[str, int, int], list[tuple[str, int]]]): Looks up the test files most commonly
+        changed together with a file
 
     Returns:
         str: The name of the test file
@@ -34,7 +35,7 @@ def get_candidate_test_file(
     """
 
     logger.info("Fetching test file for injection...")
-    test_filename, test_file_content = _find_file_to_inject(base_commit, patch, tmp_repo_dir)
+    test_filename, test_file_content = _find_file_to_inject(repo_tree, patch, find_co_changes)
     if not test_file_content:
         logger.warning(f"No suitable test file {test_filename} found. New file created.")
         return test_filename, "", ""
@@ -45,74 +46,65 @@ def get_candidate_test_file(
     return test_filename, test_file_content, test_file_content_sliced
 
 
-def _find_file_to_inject(base_commit: str, patch: str, tmp_repo_dir: str) -> [str, str]:
+def _find_file_to_inject(
+        repo_tree: RepoTree,
+        patch: str,
+        find_co_changes: Callable[[str, int, int], list[tuple[str, int]]]
+) -> [str, str]:
     """
-    Looks through repository and tries to find the candidate test file.
+    Looks through the files of the base commit and tries to find the candidate test file.
 
     Parameters:
-        base_commit (str): The base commit used to check out
+        repo_tree (RepoTree): The files of the base commit
         patch (str): The golden code patch
-        tmp_repo_dir (str): The directory to look for test files in
+        find_co_changes (Callable[[str, int, int], list[tuple[str, int]]]): Looks up the test files most commonly
+        changed together with a file
 
     Returns:
         str: The name of the test file
         str: The contents of the test file
     """
 
-    current_branch = helpers.run_command("git rev-parse --abbrev-ref HEAD", cwd=tmp_repo_dir)
-    helpers.run_command(f"git checkout {base_commit}", cwd=tmp_repo_dir)
-
-    try:
-        edited_files = _extract_edited_files(patch)
-        candidate_files = []
-        edited_file = ""
-        desired_file = ""
-        repo_path = Path(tmp_repo_dir)
-        i = 0
-
-        while i < len(edited_files) and not candidate_files:
-            candidate_files.clear()
-
-            # candidate: ".../x.js" => ".../x_spec.js"
-            edited_path = Path(edited_files[i])
-            stem = edited_path.stem
-            suffix = edited_path.suffix
-            desired_file = f"{stem}_spec{suffix}"
-
-            for filepath in repo_path.rglob(desired_file):
-                if "test/unit/" in filepath.as_posix():
-                    candidate_files.append(filepath.as_posix())
-
-            i += 1
-
-        if candidate_files:
-            candidate_file_relative = [y.replace(tmp_repo_dir + '/', '') for y in candidate_files]
-            file_to_inject = _find_most_similar_matching_test_file(edited_file, candidate_file_relative)
-            file_to_inject = tmp_repo_dir + '/' + file_to_inject
-        else:
-            co_edited_files = _find_co_edited_files(edited_files, tmp_repo_dir, 10)
-            if not co_edited_files:
-                co_edited_files = _find_co_edited_files(edited_files, tmp_repo_dir, 100)
-                if not co_edited_files:
-                    return Path("test", "unit", desired_file).as_posix(), ""
+    edited_files = _extract_edited_files(patch)
+    candidate_files = []
+    edited_file = ""
+    desired_file = ""
+    i = 0
+
+    while i < len(edited_files) and not candidate_files:
+        candidate_files.clear()
+
+        # candidate: ".../x.js" => ".../x_spec.js"
+        edited_path = Path(edited_files[i])
+        stem = edited_path.stem
+        suffix = edited_path.suffix
+        desired_file = f"{stem}_spec{suffix}"
 
-            co_edited_files = sorted(co_edited_files, key=lambda x: -x[1])
+        candidate_files.extend(repo_tree.find_unit_test_files(desired_file))
 
-            file_to_inject = None
-            for co_edited_file in co_edited_files:
-                if co_edited_file[0] and os.path.isfile(tmp_repo_dir + '/' + co_edited_file[0]):
-                    file_to_inject = tmp_repo_dir + '/' + co_edited_file[0]
-                    break
+        i += 1
 
-            if not file_to_inject:
+    if candidate_files:
+        file_to_inject = _find_most_similar_matching_test_file(edited_file, candidate_files)
+    else:
+        co_edited_files = _find_co_edited_files(edited_files, find_co_changes, 10)
+        if not co_edited_files:
+            co_edited_files = _find_co_edited_files(edited_files, find_co_changes, 100)
+            if not co_edited_files:
                 return Path("test", "unit", desired_file).as_posix(), ""
 
-        test_content = Path(file_to_inject).read_text(encoding='utf-8')
+        co_edited_files = sorted(co_edited_files, key=lambda x: -x[1])
+
+        file_to_inject = None
+        for co_edited_file in co_edited_files:
+            if co_edited_file[0] and repo_tree.is_file(co_edited_file[0]):
+                file_to_inject = co_edited_file[0]
+                break
 
-    finally:
-        helpers.run_command(f"git checkout {current_branch}", cwd=tmp_repo_dir)
+        if not file_to_inject:
+            return Path("test", "unit", desired_file).as_posix(), ""
 
-    return Path(file_to_inject).as_posix().replace(tmp_repo_dir + '/', ''), test_content
+    return file_to_inject, repo_tree.read_text(file_to_inject)
 
 
 def _keep_first_n_defs(parse_language: Language, source_code: str, n: int = 3) -> str:
@@ -205,13 +197,19 @@ def _find_most_similar_matching_test_file(source: str, candidates: list) -> str:
     return max(candidates, key=_similarity)
 
 
-def _find_co_edited_files(file_list: list, tmp_repo_dir: str, n_last_commits: int = 10, n_files: int = 3) -> list:
+def _find_co_edited_files(
+        file_list: list,
+        find_co_changes: Callable[[str, int, int], list[tuple[str, int]]],
+        n_last_commits: int = 10,
+        n_files: int = 3
+) -> list:
     """
     Finds the most commonly co-edited file for each file in a list.
 
     Parameters:
         file_list (list): List of filepaths to analyze
-        tmp_repo_dir (str): Path to the temporary repository
+        find_co_changes (Callable[[str, int, int], list[tuple[str, int]]]): Looks up the test files most commonly
+        changed together with a file in its last commits
         n_last_commits (int): Number of last commits to look for
         n_files (int): Number of most common files to return
 
@@ -221,21 +219,12 @@ def _find_co_edited_files(file_list: list, tmp_repo_dir: str, n_last_commits: in
 
     common_files = []
     for file in file_list:
-        commits = _get_last_n_commits(file, tmp_repo_dir, n_last_commits)
-        co_edited_files = []
-        for commit in commits:
-            co_edited_files.extend(_get_files_in_commit(commit, tmp_repo_dir))
-
-        co_edited_files = [f for f in co_edited_files if f != file and _is_test_file(f)]
-
-        if co_edited_files:
-            most_common_files = Counter(co_edited_files).most_common(n_files)
-            common_files.extend(most_common_files)
+        common_files.extend(find_co_changes(file, n_last_commits, n_files))
 
     return common_files
 
 
-def _is_test_file(filepath: str) -> bool:
+def is_test_file(filepath: str) -> bool:
     """
     Determines whether a file is a test file
 
@@ -256,38 +245,3 @@ def _is_test_file(filepath: str) -> bool:
         return True
     else:
         return False
-
-
-def _get_last_n_commits(filepath: str, tmp_repo_dir: str, n: int = 10) -> list:
-    """
-    Retrieves the last N commits of a file.
-
-    Parameters:
-        filepath (str): The path to the file
-        tmp_repo_dir (str): Path to the temporary repository
-        n (int): Number of commits to retrieve
-
-    Returns:
-        list: A list of commits
-    """
-
-    command = f"git log -n {n} --pretty=format:%H -- {filepath}"
-    commits = helpers.run_command(command, cwd=tmp_repo_dir)
-    return commits.splitlines() if commits else []
-
-
-def _get_files_in_commit(commit_hash: str, tmp_repo_dir: str) -> list:
-    """
-    Gets all the files in a commit.
-
-    Parameters:
-        commit_hash (str): The commit hash for which to retrieve files
-        tmp_repo_dir (str): Path to the temporary repository
-
-    Returns:
-        list: The list of files for the chosen commit
-    """
-
-    command = f"git show --name-only --pretty=format:'' {commit_hash}"
-    files = helpers.run_command(command, cwd=tmp_repo_dir)
-    return files.splitlines() if files else []
@@ -1,11 +1,17 @@
-from .llm_enum        import LLM
-from .pr_data         import PullRequestData
-from .pr_file_diff    import PullRequestFileDiff
-from .pipeline_inputs import PipelineInputs
+from .job_state        import CancelReason
+from .job_state        import JobState
+from .llm_enum         import LLM
+from .pr_data          import PullRequestData
+from .pr_file_diff     import PullRequestFileDiff
+from .pipeline_inputs  import PipelineInputs
+from .request_priority import RequestPriority
 
 __all__ = [
+    "CancelReason",
+    "JobState",
     "LLM",
     "PullRequestData",
     "PullRequestFileDiff",
     "PipelineInputs",
+    "RequestPriority",
 ]
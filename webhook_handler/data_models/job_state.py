@@ -0,0 +1,33 @@
+from enum import StrEnum
+
+class JobState(StrEnum):
+    """
+    Determines the states a queued pipeline job passes through.
+    """
+    QUEUED     = "queued"
+    PREPARING  = "preparing"
+    ATTEMPT    = "attempt"
+    VALIDATING = "validating"
+    DONE       = "done"
+    FAILED     = "failed"
+    REJECTED   = "rejected"
+    CANCELLED  = "cancelled"
+
+    @property
+    def is_terminal(self) -> bool:
+        """
+        Determines whether the job has finished.
+
+        Returns:
+            bool: True if no further work is done for a job in this state, False otherwise
+        """
+
+        return self in (JobState.DONE, JobState.FAILED, JobState.REJECTED, JobState.CANCELLED)
+
+
+class CancelReason(StrEnum):
+    """
+    Determines why a job was cancelled.
+    """
+    CLOSED     = "closed"      # the PR was closed, its kept artifacts are discarded
+    SUPERSEDED = "superseded"  # a newer commit was pushed to the PR
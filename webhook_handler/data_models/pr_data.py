@@ -1,6 +1,11 @@
+import re
+
 from dataclasses import dataclass, field
 
 
+ISSUE_PATTERN = re.compile(r'\b(?:Closes|Fixes|Resolves)\s+#(\d+)\b|\(?\b(?:bug|issue)\b\s+(\d+)\)?', re.IGNORECASE)
+
+
 @dataclass
 class PullRequestData:
     """
@@ -17,6 +22,7 @@ class PullRequestData:
     head_commit: str
     owner: str
     repo: str
+    changed_files: int | None = None
     id: str = field(init=False)
     image_tag: str = field(init=False)
 
@@ -27,6 +33,26 @@ class PullRequestData:
         self.id = f"{self.owner}__{self.repo}-{self.number}"
         self.image_tag    = f"image_{self.id}"
 
+    @property
+    def pull_ref(self) -> str:
+        """
+        The ref under which GitHub provides the head commit of the PR, also for forks.
+        """
+
+        return f"pull/{self.number}/head"
+
+    @property
+    def linked_issue_candidates(self) -> list[str]:
+        """
+        Extracts the numbers of all issues referenced in the title and description.
+
+        Returns:
+            list[str]: The issue numbers in order of appearance
+        """
+
+        matches = ISSUE_PATTERN.findall(f"{self.title} {self.description}")
+        return [match[0] or match[1] for match in matches if match[0] or match[1]]
+
     @classmethod
     def from_payload(cls, payload: dict) -> "PullRequestData":
         """
@@ -42,15 +68,16 @@ class PullRequestData:
         pr   = payload["pull_request"]
         repo = payload["repository"]
         return cls(
-            number      = pr["number"],
-            title       = pr["title"],
-            description = pr["body"],
-            url         = pr["url"],
-            diff_url    = pr["diff_url"],
-            base_branch = pr["base"]["ref"],
-            base_commit = pr["base"]["sha"],
-            head_branch = pr["head"]["ref"],
-            head_commit = pr["head"]["sha"],
-            owner       = repo["owner"]["login"],
-            repo        = repo["name"],
+            number        = pr["number"],
+            title         = pr["title"],
+            description   = pr["body"],
+            url           = pr["url"],
+            diff_url      = pr["diff_url"],
+            base_branch   = pr["base"]["ref"],
+            base_commit   = pr["base"]["sha"],
+            head_branch   = pr["head"]["ref"],
+            head_commit   = pr["head"]["sha"],
+            owner         = repo["owner"]["login"],
+            repo          = repo["name"],
+            changed_files = pr.get("changed_files"),
         )
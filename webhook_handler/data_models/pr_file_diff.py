@@ -1,3 +1,5 @@
+import hashlib
+
 from dataclasses import dataclass
 
 from webhook_handler.core import git_diff
@@ -11,6 +13,18 @@ class PullRequestFileDiff:
     name: str
     before: str
     after: str
+    sha: str = None  # blob SHA of the file at the head commit
+
+    @property
+    def digest(self) -> str:
+        """
+        Fingerprint of the name and both contents, used to recognize unchanged files across pushes.
+
+        Returns:
+            str: The SHA-256 digest
+        """
+
+        return hashlib.sha256("\0".join((self.name, self.before, self.after)).encode("utf-8")).hexdigest()
 
     @property
     def is_test_file(self) -> bool:
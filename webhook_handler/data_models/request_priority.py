@@ -0,0 +1,8 @@
+from enum import IntEnum
+
+class RequestPriority(IntEnum):
+    """
+    Determines which requests are served first once the rate limit runs low.
+    """
+    HIGH = 0  # cheap validation calls (PR metadata, issues, comments), may use the whole budget
+    LOW  = 1  # bulk downloads (file versions, PDFs), leave a reserve and are paced
@@ -1,3 +1,5 @@
+import functools
+import hashlib
 import logging
 import docker
 
@@ -5,14 +7,22 @@ from pathlib import Path
 from docker.errors import ImageNotFound
 
 from webhook_handler.core import (
+    CancellationToken,
     Config,
     configure_logger,
+    release_logger,
     ExecutionError,
+    JobCancelled,
+    JobContext,
+    RepoTree,
+    cloned_repo_dir,
     helpers,
     templates,
     test_injection
 )
 from webhook_handler.data_models import (
+    CancelReason,
+    JobState,
     LLM,
     PullRequestData,
     PipelineInputs
@@ -21,9 +31,13 @@ from webhook_handler.services import (
     CSTBuilder,
     DockerService,
     GitHubApi,
+    JobStore,
     LLMHandler,
     PullRequestDiffContext,
-    TestGenerator
+    TestGenerator,
+    get_co_change_index,
+    get_import_index,
+    get_repo_mirror
 )
 
 
@@ -31,12 +45,35 @@ class Pipeline:
     """
     In charge of executing pipeline and attempts.
     """
-    def __init__(self, payload: dict, config: Config, post_comment: bool = False, mock_response: str = None):
+    def __init__(
+            self,
+            payload: dict,
+            config: Config,
+            post_comment: bool = False,
+            mock_response: str = None,
+            job_store: JobStore = None,
+            job: dict = None,
+            cancel_token: CancellationToken = None
+    ):
         self._pr_data = PullRequestData.from_payload(payload)
         self._execution_id = f"pdf_js_{self._pr_data.number}"
         self._config = config
         self._post_comment = post_comment
         self._mock_response = mock_response
+        self._job_store = job_store
+        self._job_id = job["id"] if job else None
+        self._finished_attempts = job["attempt"] if job else 0  # attempts completed before an interruption
+        self._resume_environment = bool(job and job["prepared"])  # clone and image of interrupted run are kept
+        self._job_ctx = JobContext(
+            config,
+            self._pr_data.id,
+            job["execution_timestamp"] if job else None,
+            cancel_token=cancel_token
+        )
+        self._cancel_token = self._job_ctx.cancel_token
+        self._keep_artifacts = job_store is not None and config.reuse_artifacts  # later pushes reuse clone and image
+        self._snapshot = job_store.load_snapshot(self._pr_data.id) if self._keep_artifacts else None
+        self._snapshot_saved = False
         self._generation_completed = False
         self._environment_prepared = False
         self._setup_log_paths()
@@ -63,31 +100,86 @@ class Pipeline:
                 "{:<9},{:<30},{:<9},{:<45}\n".format("prNumber", "model", "iAttempt", "stop"),
                 encoding="utf-8"
             )
-        self._config.setup_pr_log_dir(self._pr_data.id)
-        configure_logger(self._config.pr_log_dir, self._execution_id)
+        self._log_handler = configure_logger(self._job_ctx.pr_log_dir, self._execution_id)
         self._logger = logging.getLogger()
-        if self._config.execute_teardown:
-            helpers.remove_dir(Path(self._config.cloned_repo_dir))
+        if self._resume_environment:
+            self._logger.warning(f"Resuming interrupted job after {self._finished_attempts} finished attempt(s)")
+        elif self._snapshot is not None:
+            self._logger.info(f"Reusing artifacts prepared for previous head {self._snapshot['head_commit']}")
+        elif self._config.execute_teardown:
+            get_repo_mirror(self._pr_data.owner, self._pr_data.repo).remove_worktree(self._job_ctx.cloned_repo_dir)
+
+    def _update_job(self, state: JobState, **fields) -> None:
+        """
+        Persists the progress of the pipeline if it runs as a queued job.
+
+        Parameters:
+            state (JobState): The new state of the job
+            **fields: Further job columns to update
+        """
+
+        if self._job_store is None:
+            return
+        try:
+            self._job_store.update(self._job_id, state, **fields)
+        except Exception as e:
+            self._logger.error(f"Failed to update job state: {e}")
+
+    def _save_snapshot(self, snapshot: dict) -> None:
+        """
+        Persists the prepared inputs so that the next push to the PR only redoes the stages whose inputs changed.
+
+        Parameters:
+            snapshot (dict): The prepared inputs
+        """
+
+        if not self._keep_artifacts:
+            return
+        try:
+            self._job_store.save_snapshot(self._pr_data.id, self._pr_data.head_commit, snapshot)
+            self._snapshot_saved = True
+        except Exception as e:
+            self._logger.error(f"Failed to save prepared inputs: {e}")
+
+    def _ensure_clone(self) -> None:
+        """
+        Checks out the base commit into a worktree of the shared mirror, fetching missing commits first. File
+        versions are read from the worktree afterward.
+        """
+
+        if self._gh_api.has_local_repo:
+            return
+        if Path(self._job_ctx.cloned_repo_dir).exists():
+            self._logger.info(f"Worktree of '{self._pr_data.repo}' already exists – reused")
+        self._gh_api.clone_repo(self._job_ctx.cloned_repo_dir)
+        # head commits of forks only exist in the pull ref
+        self._gh_api.update_repo(self._pr_data.head_commit, ref=self._pr_data.pull_ref)
+        self._gh_api.attach_local_repo(self._job_ctx.cloned_repo_dir)
 
     def _teardown(self) -> None:
         """
         Cleans state of directory after completion.
         """
 
-        if self._config.execute_teardown:
-            helpers.remove_dir(Path(self._config.cloned_repo_dir), log_success=True)
-            image_tag = self._pr_data.image_tag
-            try:
-                client = docker.from_env()
-                client.images.remove(image=f"{image_tag}:latest", force=True)
-                self._logger.success(f"Removed Docker image '{image_tag}'")
-            except ImageNotFound:
-                self._logger.error(f"Tried to remove image '{image_tag}', but it was not found")
-            except Exception as e:
-                self._logger.error(f"Failed to remove Docker image '{image_tag}': {e}")
+        if self._gh_api is not None:
+            self._gh_api.close()
+        helpers.remove_dir(Path(self._job_ctx.pr_log_dir, "pdf"))  # links to the PDF cache
+
+        if self._keep_artifacts and (self._snapshot is not None or self._snapshot_saved):
+            self._logger.info("Clone and Docker image are kept for later pushes to the PR")
+            self._remove_expired_artifacts()
+        elif self._config.execute_teardown:
+            self.remove_artifacts(self._pr_data)
         else:
             self._logger.warning("Teardown is disabled")
 
+        if self._gh_api is not None:
+            stats = self._gh_api.request_stats
+            self._logger.info(
+                f"GitHub traffic: {stats['requests']} requests, {stats['bytes']} bytes, "
+                f"{stats['local_reads']} file versions read from clone"
+            )
+
         with self._executed_tests.open("a", encoding='utf-8') as f:
             f.write(f"{self._execution_id}\n")
 
@@ -100,10 +192,87 @@ class Pipeline:
         self._llm_handler = None
         self._docker_service = None
         self._environment_prepared = False
+        release_logger(self._log_handler)
+
+    def _remove_expired_artifacts(self) -> None:
+        """
+        Removes the kept artifacts of other PRs which exceed the retention limits.
+        """
+
+        try:
+            payloads = self._job_store.expired_snapshots(
+                self._config.max_kept_artifacts,
+                self._config.kept_artifacts_max_age
+            )
+        except Exception as e:
+            self._logger.error(f"Failed to determine expired artifacts: {e}")
+            return
+        for payload in payloads:
+            pr_data = PullRequestData.from_payload(payload)
+            if pr_data.id == self._pr_data.id:
+                continue
+            self._logger.info(f"Artifacts of PR #{pr_data.number} exceed the retention limits – removed")
+            self.remove_artifacts(pr_data, self._job_store)
+
+    def _discard_artifacts(self) -> None:
+        """
+        Removes the worktree of a rejected PR, together with the image and the prepared inputs of earlier pushes.
+        """
+
+        if not self._config.execute_teardown:
+            return
+        if self._snapshot is not None:
+            self.remove_artifacts(self._pr_data, self._job_store)
+        else:
+            get_repo_mirror(self._pr_data.owner, self._pr_data.repo).remove_worktree(
+                self._job_ctx.cloned_repo_dir,
+                ref=self._pr_data.pull_ref
+            )
+
+    @staticmethod
+    def remove_artifacts(pr_data: PullRequestData, job_store: JobStore = None) -> None:
+        """
+        Removes the clone, the Docker image and the prepared inputs of a PR.
+
+        Parameters:
+            pr_data (PullRequestData): The data of the PR
+            job_store (JobStore, optional): The store holding the prepared inputs
+        """
+
+        logger = logging.getLogger()
+        get_repo_mirror(pr_data.owner, pr_data.repo).remove_worktree(cloned_repo_dir(pr_data.id), ref=pr_data.pull_ref)
+        image_tag = pr_data.image_tag
+        try:
+            client = docker.from_env()
+            client.images.remove(image=f"{image_tag}:latest", force=True)
+            logger.success(f"Removed Docker image '{image_tag}'")
+        except ImageNotFound:
+            logger.error(f"Tried to remove image '{image_tag}', but it was not found")
+        except Exception as e:
+            logger.error(f"Failed to remove Docker image '{image_tag}': {e}")
+        if job_store is not None:
+            job_store.delete_snapshot(pr_data.id)
+
+    def _fetch_linked_data(self) -> [str, str]:
+        """
+        Fetches the linked issue unless the issue references are the same as for the previous push.
+
+        Returns:
+            str: The linked issue title and description
+            str: The candidate PDF filename
+        """
+
+        previous = self._snapshot or {}
+        if previous.get("problem_statement") and \
+                previous.get("issue_candidates") == self._pr_data.linked_issue_candidates:
+            self._logger.info("Linked issue references unchanged – reused")
+            return previous["problem_statement"], previous["pdf_candidate"]
+        return self._gh_api.get_linked_data()
 
     def is_valid_pr(self) -> [str, bool]:
         """
-        PR must have linked issue and source code changes.
+        PR must have linked issue and source code changes. The job log and the open handles are released if the
+        PR is rejected or the validation fails.
 
         Returns:
             str: Message to deliver to client
@@ -112,79 +281,127 @@ class Pipeline:
 
         self._logger.marker(f"=============== Running Payload #{self._pr_data.number} ===============")
         self._logger.marker("================ Preparing Environment ===============")
-        self._gh_api = GitHubApi(self._config, self._pr_data)
-        self._issue_statement, self._pdf_candidate = self._gh_api.get_linked_data()
-        if not self._issue_statement:
-            helpers.remove_dir(self._config.pr_log_dir)
-            self._gh_api = None
-            self._issue_statement = None
-            self._pdf_candidate = None
-            return 'No linked issue found', False
-
-        self._pr_diff_ctx = PullRequestDiffContext(self._pr_data.base_commit, self._pr_data.head_commit, self._gh_api)
-        if not self._pr_diff_ctx.fulfills_requirements:
-            helpers.remove_dir(self._config.pr_log_dir)
-            self._gh_api = None
-            self._issue_statement = None
-            self._pdf_candidate = None
-            self._pr_diff_ctx = None
-            return 'Must modify source code files only', False
+        try:
+            self._gh_api = GitHubApi(self._config, self._pr_data, self._job_ctx.deadline)
+            self._issue_statement, self._pdf_candidate = self._fetch_linked_data()
+            if not self._issue_statement:
+                self._release_validation()
+                helpers.remove_dir(self._job_ctx.pr_log_dir)
+                self._discard_artifacts()
+                return 'No linked issue found', False
+
+            self._ensure_clone()
+            self._pr_diff_ctx = PullRequestDiffContext(
+                self._pr_data.base_commit,
+                self._pr_data.head_commit,
+                self._gh_api,
+                previous=self._snapshot,
+                max_workers=self._config.max_fetch_workers
+            )
+            if not self._pr_diff_ctx.fulfills_requirements:
+                self._release_validation()
+                helpers.remove_dir(self._job_ctx.pr_log_dir)
+                self._discard_artifacts()
+                return 'Must modify source code files only', False
+        except BaseException:
+            self._release_validation()
+            raise
 
         return 'Payload is being processed...', True
 
+    def _release_validation(self) -> None:
+        """
+        Closes the GitHub API, detaches the job log and drops the data gathered during the validation.
+        """
+
+        if self._gh_api is not None:
+            self._gh_api.close()
+        release_logger(self._log_handler)
+        self._gh_api = None
+        self._issue_statement = None
+        self._pdf_candidate = None
+        self._pr_diff_ctx = None
+
     def execute_pipeline(self, execute_mini: bool = False) -> bool:
         """
-        Execute whole pipeline with 5 attempts per model (optional o4-mini execution).
+        Execute whole pipeline with 5 attempts per model (optional o4-mini execution). The cancellation token
+        is checked before every attempt, attempts which cannot start before the job deadline are skipped.
 
         Parameters:
             execute_mini (bool, optional): If True, executes additional attempt with mini model
 
         Returns:
             bool: True if the generation was successful, False otherwise
+
+        Raises:
+            JobCancelled: If the job was cancelled
         """
 
+        n_attempts = 0
+
         def _try_and_execute(curr_model: LLM, curr_i_attempt: int, success_msg: str) -> None:
-            self._config.setup_output_dir(curr_i_attempt, curr_model)
+            nonlocal n_attempts
+            n_attempts += 1
+            if n_attempts <= self._finished_attempts:
+                self._logger.info(f"Attempt {curr_i_attempt + 1} with model {curr_model} finished before interruption – skipped")
+                return
+            self._cancel_token.raise_if_cancelled()
+            if self._job_ctx.deadline.expired:
+                self._logger.warning(f"Job deadline exceeded – attempt {curr_i_attempt + 1} with model {curr_model} skipped")
+                return
+            self._job_ctx.setup_output_dir(curr_i_attempt, curr_model)
             try:
                 self._generation_completed = self._execute_attempt(model=curr_model, i_attempt=curr_i_attempt)
                 self._logger.success(success_msg)
                 self._record_result(self._pr_data.number, curr_model, curr_i_attempt + 1, self._generation_completed)
             except ExecutionError as e:
                 self._record_result(self._pr_data.number, curr_model, curr_i_attempt + 1, str(e))
+            except JobCancelled:
+                self._record_result(self._pr_data.number, curr_model, curr_i_attempt + 1, "cancelled")
+                raise
             except Exception as e:
                 self._logger.critical("Failed with unexpected error:\n%s" % e)
                 self._record_result(self._pr_data.number, curr_model, curr_i_attempt + 1, "unexpected error")
+            self._update_job(JobState.ATTEMPT, attempt=n_attempts)
 
         def _save_generated_test() -> None:
-            gen_test = Path(self._config.output_dir, "generation", "generated_test.txt").read_text(encoding="utf-8")
-            new_filename = f"{self._execution_id}_{self._config.output_dir.name}.txt"
+            gen_test = Path(self._job_ctx.output_dir, "generation", "generated_test.txt").read_text(encoding="utf-8")
+            new_filename = f"{self._execution_id}_{self._job_ctx.output_dir.name}.txt"
             Path(self._config.gen_test_dir, new_filename).write_text(gen_test, encoding="utf-8")
             self._logger.success(f"Test file copied to {self._config.gen_test_dir.name}/{new_filename}")
 
-        if self._mock_response is None:
-            for model in [LLM.GPT4o, LLM.LLAMA, LLM.DEEPSEEK]:
-                i_attempt = 0
-                while i_attempt < len(self._config.prompt_combinations["include_golden_code"]) and not self._generation_completed:
-                    _try_and_execute(model, i_attempt, f"Attempt %d with model %s finished successfully" % (i_attempt + 1, model))
-                    i_attempt += 1
-
-                if self._generation_completed:
-                    _save_generated_test()
-                    break
-
-            if not self._generation_completed and execute_mini:
-                model = LLM.GPTo3_MINI
-                _try_and_execute(model, 0, "o3-mini finished successfully")
+        try:
+            if self._mock_response is None:
+                for model in [LLM.GPT4o, LLM.LLAMA, LLM.DEEPSEEK]:
+                    i_attempt = 0
+                    while i_attempt < len(self._config.prompt_combinations["include_golden_code"]) and not self._generation_completed:
+                        _try_and_execute(model, i_attempt, f"Attempt %d with model %s finished successfully" % (i_attempt + 1, model))
+                        i_attempt += 1
+
+                    if self._generation_completed:
+                        _save_generated_test()
+                        break
+
+                if not self._generation_completed and execute_mini:
+                    model = LLM.GPTo3_MINI
+                    _try_and_execute(model, 0, "o3-mini finished successfully")
+
+                    if self._generation_completed:
+                        _save_generated_test()
+            else:
+                self._logger.success("MOCK response fetched successfully")
+                model = LLM.MOCK
+                _try_and_execute(model, 0, "MOCK finished successfully")
 
                 if self._generation_completed:
                     _save_generated_test()
-        else:
-            self._logger.success("MOCK response fetched successfully")
-            model = LLM.MOCK
-            _try_and_execute(model, 0, "MOCK finished successfully")
-
-            if self._generation_completed:
-                _save_generated_test()
+        except JobCancelled as e:
+            self._logger.warning(f"Pipeline stopped: {e}")
+            self._logger.marker(f"=============== Cancelled Payload #{self._pr_data.number} =============")
+            self._teardown()
+            if self._cancel_token.reason == CancelReason.CLOSED:
+                self.remove_artifacts(self._pr_data, self._job_store)
+            raise
 
         self._logger.marker(f"=============== Finished Payload #{self._pr_data.number} ==============")
         self._teardown()
@@ -211,9 +428,11 @@ class Pipeline:
         else:
             self._prepare_environment()
             self._environment_prepared = True
+        self._update_job(JobState.ATTEMPT, model=model)
 
         generator = TestGenerator(
             self._config,
+            self._job_ctx,
             self._pipeline_inputs,
             self._mock_response,
             self._post_comment,
@@ -224,89 +443,158 @@ class Pipeline:
             self._llm_handler,
             i_attempt,
             model,
+            on_validation=lambda: self._update_job(JobState.VALIDATING)
         )
 
         return generator.generate()
 
+    def _checkpoint(self) -> None:
+        """
+        Stops the preparation between two stages if the job was cancelled or ran out of time.
+        """
+
+        self._cancel_token.raise_if_cancelled()
+        self._job_ctx.deadline.check("the next preparation stage")
+
     def _prepare_environment(self) -> None:
         """
         Prepares all services and data used in each attempt. Only has to execute once to cut down on API calls.
+        Results of a previous push to the PR are reused for every stage whose inputs are unchanged. Stops between
+        stages if the job is cancelled or its deadline is exceeded.
         """
 
+        self._update_job(JobState.PREPARING)
+        previous = self._snapshot or {}
+        same_base = previous.get("base_commit") == self._pr_data.base_commit
+
         # 1. Setup GitHub API
         if self._gh_api is None:
             self._logger.marker(f"=============== Running Payload #{self._pr_data.number} ===============")
             self._logger.marker("================ Preparing Environment ===============")
-            self._gh_api = GitHubApi(self._config, self._pr_data)
+            self._gh_api = GitHubApi(self._config, self._pr_data, self._job_ctx.deadline)
 
+        self._checkpoint()
         # 2. Fetch linked issue
-        if self._issue_statement is None: self._issue_statement, self._pdf_candidate = self._gh_api.get_linked_data()
+        if self._issue_statement is None: self._issue_statement, self._pdf_candidate = self._fetch_linked_data()
+
+        self._checkpoint()
+        # 3. Clone repository locally
+        self._ensure_clone()
 
-        # 3. Compute diffs & file contexts
+        self._checkpoint()
+        # 4. Compute diffs & file contexts
         if self._pr_diff_ctx is None: self._pr_diff_ctx = PullRequestDiffContext(
             self._pr_data.base_commit,
             self._pr_data.head_commit,
-            self._gh_api
+            self._gh_api,
+            previous=self._snapshot,
+            max_workers=self._config.max_fetch_workers
         )
 
-        # 4. Retrieve PDF
-        pdf_name, pdf_content = "", b""
+        self._checkpoint()
+        # 5. Retrieve PDF
+        pdf_name, pdf_path = "", None
         if self._config.fetch_pdf:
-            pdf_name, pdf_content = self._pr_diff_ctx.get_issue_pdf(self._pdf_candidate, self._pr_data.head_commit)
+            pdf_name, pdf_path = self._pr_diff_ctx.get_issue_pdf(
+                self._pdf_candidate,
+                self._pr_data.head_commit,
+                Path(self._job_ctx.pr_log_dir, "pdf")
+            )
         else:
             self._logger.warning("PDF fetching is disabled")
 
-        # 5. Clone repository locally
-        if not Path(self._config.cloned_repo_dir).exists():
-            self._gh_api.clone_repo()
-        else:
-            self._logger.info(f"Temporary repository '{self._pr_data.repo}' already cloned – skipped")
-
-        # 6. Slice golden code
+        self._checkpoint()
+        # 6. Slice golden code (unchanged files reuse their slices)
         self._cst_builder = CSTBuilder(self._config.parse_language, self._pr_diff_ctx)
-        code_sliced = self._cst_builder.slice_code_file()
+        code_sliced = self._cst_builder.slice_code_file(previous.get("slices"))
 
-        # 7. Fetch test file for injection
+        self._checkpoint()
+        # 7. Fetch test file for injection, packages and imports (read from the base commit without checkout)
         test_filename = self._config.inject_in_file
-        if not test_filename:
+        test_injection_key = hashlib.sha256(
+            (self._pr_data.base_commit + self._pr_diff_ctx.golden_code_patch).encode("utf-8")
+        ).hexdigest()
+        previous_injection = previous.get("test_injection") or {}
+        repo_tree = None
+
+        def _fetch_test_file() -> [str, str, str]:
             try:
-                test_filename, test_file_content, test_file_content_sliced = test_injection.get_candidate_test_file(
+                return test_injection.get_candidate_test_file(
                     self._config.parse_language,
-                    self._pr_data.base_commit,
+                    repo_tree,
                     self._pr_diff_ctx.golden_code_patch,
-                    self._config.cloned_repo_dir
+                    functools.partial(
+                        get_co_change_index(self._pr_data.owner, self._pr_data.repo).co_edited_files,
+                        self._pr_data.base_commit
+                    )
                 )
             except:
                 self._logger.critical("Failed to determine test file for injection")
                 raise ExecutionError("Failed to determine test file for injection")
+
+        def _fetch_packages() -> str:
+            try:
+                return helpers.extract_packages(repo_tree)
+            except:
+                self._logger.warning("Failed to determine available packages")
+                return ""
+
+        def _fetch_relative_imports() -> str:
+            try:
+                return get_import_index().relative_imports(repo_tree)
+            except:
+                self._logger.warning("Failed to determine available relative imports")
+                return ""
+
+        tasks = {}
+        if not test_filename and previous_injection.get("key") == test_injection_key:
+            self._logger.info("Base commit and golden code unchanged – test file for injection reused")
+            test_filename = previous_injection["filename"]
+            test_file_content = previous_injection["content"]
+            test_file_content_sliced = previous_injection["sliced"]
+        elif not test_filename:
+            tasks["test_file"] = _fetch_test_file
         else:
             self._logger.warning(f"Custom test file {test_filename} is defined")
             test_file_content = test_file_content_sliced = ""
 
-        # 8. Fetch packages and imports
-        try:
-            available_packages = helpers.extract_packages(self._pr_data.base_commit, self._config.cloned_repo_dir)
-        except:
-            self._logger.warning("Failed to determine available packages")
-            available_packages = ""
-        try:
-            available_relative_imports = helpers.extract_relative_imports(self._pr_data.base_commit,
-                                                                          self._config.cloned_repo_dir)
-        except:
-            self._logger.warning("Failed to determine available relative imports")
-            available_relative_imports = ""
+        if same_base and "available_packages" in previous:
+            self._logger.info("Base commit unchanged – packages and imports reused")
+            available_packages = previous["available_packages"]
+            available_relative_imports = previous["available_relative_imports"]
+        else:
+            tasks["packages"] = _fetch_packages
+            tasks["relative_imports"] = _fetch_relative_imports
 
-        # 9. Build docker image
+        if tasks:
+            try:
+                repo_tree = RepoTree(self._job_ctx.cloned_repo_dir, self._pr_data.base_commit)
+            except:
+                self._logger.critical(f"Failed to read base commit {self._pr_data.base_commit}")
+                raise ExecutionError(f"Failed to read base commit {self._pr_data.base_commit}")
+            results = dict(zip(tasks, helpers.parallel_map(lambda task: task(), tasks.values(), len(tasks))))
+            if "test_file" in results:
+                test_filename, test_file_content, test_file_content_sliced = results["test_file"]
+            if "packages" in results:
+                available_packages = results["packages"]
+                available_relative_imports = results["relative_imports"]
+
+        self._checkpoint()
+        # 8. Build docker image
         self._docker_service = DockerService(
             self._config.project_root.as_posix(),
             self._config.old_repo_state,
             self._pr_data,
             pdf_name,
-            pdf_content
+            pdf_path,
+            cancel_token=self._cancel_token,
+            deadline=self._job_ctx.deadline,
+            build_timeout=self._config.stage_timeouts["docker_build"],
+            test_timeout=self._config.stage_timeouts["test_run"]
         )
         self._docker_service.build()
 
-        # 10. Gather pipeline data
+        # 9. Gather pipeline data
         self._pipeline_inputs = PipelineInputs(
             pr_data=self._pr_data,
             pr_diff_ctx=self._pr_diff_ctx,
@@ -320,9 +608,30 @@ class Pipeline:
             available_relative_imports=available_relative_imports
         )
 
-        # 11. Setup model handler
-        self._llm_handler = LLMHandler(self._config, self._pipeline_inputs)
-
+        self._checkpoint()
+        # 10. Setup model handler
+        self._llm_handler = LLMHandler(self._config, self._pipeline_inputs, self._job_ctx.deadline)
+
+        # 11. Keep prepared inputs for later pushes
+        self._save_snapshot({
+            "base_commit": self._pr_data.base_commit,
+            "head_commit": self._pr_data.head_commit,
+            "issue_candidates": self._pr_data.linked_issue_candidates,
+            "problem_statement": self._issue_statement,
+            "pdf_candidate": self._pdf_candidate,
+            "files": self._pr_diff_ctx.files_snapshot,
+            "slices": dict(zip(self._pr_diff_ctx.code_digests, code_sliced)),
+            "test_injection": {
+                "key": test_injection_key,
+                "filename": test_filename,
+                "content": test_file_content,
+                "sliced": test_file_content_sliced
+            } if not self._config.inject_in_file else None,
+            "available_packages": available_packages,
+            "available_relative_imports": available_relative_imports
+        })
+
+        self._update_job(JobState.PREPARING, prepared=1)
         self._logger.marker("================ Preparation Complete ================")
 
     def _record_result(self, number: str, model: LLM, i_attempt: int, stop: bool | str) -> None:
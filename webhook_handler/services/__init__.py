@@ -1,15 +1,53 @@
-from .cst_builder     import CSTBuilder
-from .docker_service  import DockerService
-from .gh_api          import GitHubApi
-from .llm_handler     import LLMHandler
-from .pr_diff_context import PullRequestDiffContext
-from .test_generator  import TestGenerator
+from .blob_cache        import BlobCache
+from .blob_cache        import get_blob_cache
+from .co_change_index   import CoChangeIndex
+from .co_change_index   import get_co_change_index
+from .cst_builder       import CSTBuilder
+from .docker_service    import DockerService
+from .gh_api            import GitHubApi
+from .git_object_reader import GitObjectReader
+from .http_client       import HttpClient
+from .http_client       import get_http_client
+from .import_index      import ImportIndex
+from .import_index      import get_import_index
+from .job_queue         import JobQueue
+from .job_store         import JobStore
+from .llm_handler       import LLMHandler
+from .pdf_cache         import PdfCache
+from .pdf_cache         import get_pdf_cache
+from .pr_diff_context   import PullRequestDiffContext
+from .rate_limiter      import RateLimiter
+from .rate_limiter      import get_rate_limiter
+from .repo_mirror       import RepoMirror
+from .repo_mirror       import get_repo_mirror
+from .response_cache    import ResponseCache
+from .response_cache    import get_response_cache
+from .test_generator    import TestGenerator
 
 __all__ = [
+    "BlobCache",
+    "get_blob_cache",
+    "CoChangeIndex",
+    "get_co_change_index",
     "CSTBuilder",
     "DockerService",
     "GitHubApi",
+    "GitObjectReader",
+    "HttpClient",
+    "get_http_client",
+    "ImportIndex",
+    "get_import_index",
+    "JobQueue",
+    "JobStore",
     "LLMHandler",
+    "PdfCache",
+    "get_pdf_cache",
     "PullRequestDiffContext",
+    "RateLimiter",
+    "get_rate_limiter",
+    "RepoMirror",
+    "get_repo_mirror",
+    "ResponseCache",
+    "get_response_cache",
     "TestGenerator",
 ]
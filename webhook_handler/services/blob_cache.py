@@ -0,0 +1,203 @@
+import functools
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+
+from contextlib import contextmanager
+from pathlib import Path
+
+from webhook_handler.core.config import get_config
+
+
+logger = logging.getLogger(__name__)
+
+COMMIT_SHA_PATTERN = re.compile(r"[0-9a-f]{40}")
+
+
+class BlobCache:
+    """
+    Persistent cache for file versions pinned to a commit. Contents are stored once per SHA-256 digest, an
+    SQLite index maps (owner, repo, commit, path) to the digest. The least recently used entries are evicted
+    once the stored contents exceed the size limit. Several threads and processes may share one cache.
+    """
+    def __init__(self, cache_dir: Path | str, max_bytes: int):
+        self._cache_dir = Path(cache_dir)
+        self._objects_dir = Path(self._cache_dir, "objects")
+        self._db_path = str(Path(self._cache_dir, "index.sqlite3"))
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._objects_dir.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, digest TEXT, size INTEGER NOT NULL, "
+                "last_access REAL NOT NULL)"  # digest is NULL if the file does not exist at the commit
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_access ON entries (last_access)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_digest ON entries (digest)")
+
+    @contextmanager
+    def _connect(self):
+        """
+        Opens a short-lived connection in autocommit mode.
+        """
+
+        conn = sqlite3.connect(self._db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def is_cacheable(commit: str) -> bool:
+        """
+        Only full commit SHAs are immutable, branch names may point to new content at any time.
+
+        Parameters:
+            commit (str): The commit
+
+        Returns:
+            bool: True if content of the commit can be cached, False otherwise
+        """
+
+        return COMMIT_SHA_PATTERN.fullmatch(commit) is not None
+
+    @staticmethod
+    def _key(owner: str, repo: str, commit: str, path: str) -> str:
+        return f"{owner}/{repo}/{commit}/{path}"
+
+    def _object_path(self, digest: str) -> Path:
+        return Path(self._objects_dir, digest[:2], digest)
+
+    def get(self, owner: str, repo: str, commit: str, path: str) -> bytes | None:
+        """
+        Looks up a file version.
+
+        Parameters:
+            owner (str): The owner of the repository
+            repo (str): The name of the repository
+            commit (str): The commit hash
+            path (str): The path of the file
+
+        Returns:
+            bytes | None: The content (empty if the file does not exist at the commit), or None on a cache miss
+        """
+
+        if not self.is_cacheable(commit):
+            return None
+        key = self._key(owner, repo, commit, path)
+        with self._connect() as conn:
+            row = conn.execute("SELECT digest FROM entries WHERE key = ?", (key,)).fetchone()
+            content = None
+            if row is not None:
+                try:
+                    content = self._object_path(row["digest"]).read_bytes() if row["digest"] else b""
+                except FileNotFoundError:  # evicted by another process in the meantime
+                    content = None
+            if content is not None:
+                conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+        with self._lock:
+            if content is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        return content
+
+    def put(self, owner: str, repo: str, commit: str, path: str, content: bytes | None) -> None:
+        """
+        Stores a file version and evicts the least recently used entries if the cache grows too large.
+
+        Parameters:
+            owner (str): The owner of the repository
+            repo (str): The name of the repository
+            commit (str): The commit hash
+            path (str): The path of the file
+            content (bytes | None): The content, or None if the file does not exist at the commit
+        """
+
+        if not self.is_cacheable(commit):
+            return
+        digest = None
+        if content is not None:
+            digest = hashlib.sha256(content).hexdigest()
+            object_path = self._object_path(digest)
+            if not object_path.exists():
+                object_path.parent.mkdir(parents=True, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=object_path.parent)
+                with os.fdopen(fd, "wb") as f:
+                    f.write(content)
+                os.replace(tmp_path, object_path)  # readers never see partially written objects
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, digest, size, last_access) VALUES (?, ?, ?, ?)",
+                (self._key(owner, repo, commit, path), digest, len(content or b""), time.time())
+            )
+        self._evict()
+
+    def _evict(self) -> None:
+        """
+        Removes the least recently used entries until the distinct contents fit into the size limit.
+        """
+
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                total = conn.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT digest, size FROM entries "
+                    "WHERE digest IS NOT NULL)"
+                ).fetchone()[0]
+                removed_digests = set()
+                if total > self._max_bytes:
+                    for row in conn.execute("SELECT key, digest, size FROM entries ORDER BY last_access").fetchall():
+                        conn.execute("DELETE FROM entries WHERE key = ?", (row["key"],))
+                        if row["digest"] and not conn.execute(
+                                "SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (row["digest"],)).fetchone():
+                            removed_digests.add(row["digest"])
+                            total -= row["size"]
+                        if total <= self._max_bytes:
+                            break
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        for digest in removed_digests:
+            self._object_path(digest).unlink(missing_ok=True)
+        if removed_digests:
+            logger.info(f"Evicted {len(removed_digests)} file version(s) from the blob cache")
+
+    def stats(self) -> dict:
+        """
+        Collects the usage of the cache by this process.
+
+        Returns:
+            dict: Hits, misses and hit rate
+        """
+
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+@functools.cache
+def get_blob_cache() -> BlobCache:
+    """
+    Returns the process-wide blob cache, created on first use.
+
+    Returns:
+        BlobCache: The shared cache
+    """
+
+    config = get_config()
+    return BlobCache(config.blob_cache_dir, config.blob_cache_max_bytes)
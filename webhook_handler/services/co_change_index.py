@@ -0,0 +1,233 @@
+import functools
+import logging
+import sqlite3
+import subprocess
+import threading
+
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+from webhook_handler.core import test_injection
+from webhook_handler.core.config import get_config
+from webhook_handler.services.repo_mirror import get_repo_mirror
+
+
+logger = logging.getLogger(__name__)
+
+
+class CoChangeIndex:
+    """
+    Sparse commit-by-file matrix of the default branch of a repository, recording which files every commit changed.
+    It is built from a single `git log --name-only` stream over the mirror and extended with the new commits after
+    every fetch. Lookups are answered from memory and only consider the ancestors of a given commit, hence commits
+    made after the base commit of a PR never influence its test file selection.
+    """
+    def __init__(self, db_path: Path | str, git_dir: Path | str, repo_key: str):
+        self._db_path = str(db_path)
+        self._git_dir = str(git_dir)
+        self._repo_key = repo_key
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._commit_seqs = {}  # commit -> sequence number, newer commits have higher numbers
+        self._file_commits = {}  # file -> sequence numbers of the commits changing it, newest first
+        self._commit_test_files = {}  # sequence number -> test files changed by the commit
+        self._ancestors = None  # (commit, sequence numbers of its indexed ancestors) of the last lookup
+        Path(self._db_path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS commits (repo TEXT NOT NULL, seq INTEGER NOT NULL, "
+                "commit_hash TEXT NOT NULL, PRIMARY KEY (repo, seq))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS commit_files (repo TEXT NOT NULL, seq INTEGER NOT NULL, "
+                "file TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_commit_files_seq ON commit_files (repo, seq)")
+            conn.execute("CREATE TABLE IF NOT EXISTS indexed_heads (repo TEXT PRIMARY KEY, head TEXT NOT NULL)")
+
+    @contextmanager
+    def _connect(self):
+        """
+        Opens a short-lived connection in autocommit mode.
+        """
+
+        conn = sqlite3.connect(self._db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _git(self, *args: str) -> subprocess.CompletedProcess:
+        return subprocess.run(["git", f"--git-dir={self._git_dir}", *args], capture_output=True, text=True)
+
+    def _indexed_head(self, conn: sqlite3.Connection) -> str | None:
+        row = conn.execute("SELECT head FROM indexed_heads WHERE repo = ?", (self._repo_key,)).fetchone()
+        return row["head"] if row else None
+
+    def _read_commits(self, rev_range: str) -> list[tuple[str, list[str]]]:
+        """
+        Reads the changed files of all commits in a range from one `git log` stream.
+
+        Parameters:
+            rev_range (str): The commits to read
+
+        Returns:
+            list[tuple[str, list[str]]]: The commits and their changed files, newest first
+        """
+
+        process = subprocess.Popen(
+            ["git", f"--git-dir={self._git_dir}", "log", "--no-merges", "--name-only", "--pretty=format:%x00%H",
+             rev_range],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+        )
+        commits = []
+        for line in process.stdout:
+            if line.startswith("\0"):  # start of the next commit
+                commits.append((line[1:].strip(), []))
+            elif line.strip() and commits:
+                commits[-1][1].append(line.strip())
+        if process.wait() != 0:
+            raise subprocess.CalledProcessError(process.returncode, "git log")
+        return commits
+
+    def update(self) -> None:
+        """
+        Adds the commits of the default branch which are not indexed yet. The index is rebuilt if the indexed head
+        is no longer part of the branch.
+        """
+
+        with self._lock:
+            head = self._git("rev-parse", "HEAD").stdout.strip()
+            if not head:
+                return
+            with self._connect() as conn:
+                indexed_head = self._indexed_head(conn)
+            if indexed_head == head:
+                return
+            incremental = indexed_head is not None and \
+                self._git("merge-base", "--is-ancestor", indexed_head, head).returncode == 0
+            rev_range = f"{indexed_head}..{head}" if incremental else head
+            logger.info(f"Updating co-change index of {self._repo_key} ({rev_range})")
+            commits = self._read_commits(rev_range)
+
+            with self._connect() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    if self._indexed_head(conn) != indexed_head:  # updated by another process meanwhile
+                        conn.execute("ROLLBACK")
+                        self._loaded = False
+                        return
+                    if not incremental:
+                        conn.execute("DELETE FROM commits WHERE repo = ?", (self._repo_key,))
+                        conn.execute("DELETE FROM commit_files WHERE repo = ?", (self._repo_key,))
+                    next_seq = conn.execute(
+                        "SELECT COALESCE(MAX(seq), 0) + 1 FROM commits WHERE repo = ?", (self._repo_key,)
+                    ).fetchone()[0]
+                    rows = [(self._repo_key, next_seq + i, commit) for i, (commit, _) in enumerate(reversed(commits))]
+                    conn.executemany("INSERT INTO commits (repo, seq, commit_hash) VALUES (?, ?, ?)", rows)
+                    conn.executemany(
+                        "INSERT INTO commit_files (repo, seq, file) VALUES (?, ?, ?)",
+                        [
+                            (self._repo_key, next_seq + i, file)
+                            for i, (_, files) in enumerate(reversed(commits))
+                            for file in files
+                        ]
+                    )
+                    conn.execute(
+                        "INSERT OR REPLACE INTO indexed_heads (repo, head) VALUES (?, ?)", (self._repo_key, head)
+                    )
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+
+            self._loaded = False
+            logger.success(f"Co-change index of {self._repo_key} updated to {head} ({len(commits)} commits)")
+
+    def _load(self) -> None:
+        """
+        Loads the index into memory. Must be called with the lock held.
+        """
+
+        self._commit_seqs, self._file_commits, self._commit_test_files = {}, {}, {}
+        self._ancestors = None
+        with self._connect() as conn:
+            for row in conn.execute("SELECT seq, commit_hash FROM commits WHERE repo = ?", (self._repo_key,)):
+                self._commit_seqs[row["commit_hash"]] = row["seq"]
+            for row in conn.execute(
+                    "SELECT seq, file FROM commit_files WHERE repo = ? ORDER BY seq DESC", (self._repo_key,)):
+                self._file_commits.setdefault(row["file"], []).append(row["seq"])
+                if test_injection.is_test_file(row["file"]):
+                    self._commit_test_files.setdefault(row["seq"], []).append(row["file"])
+        self._loaded = True
+
+    def _ancestor_seqs(self, commit: str) -> set[int]:
+        """
+        Collects the indexed ancestors of a commit. Must be called with the lock held.
+
+        Parameters:
+            commit (str): The commit
+
+        Returns:
+            set[int]: The sequence numbers of all indexed commits reachable from the commit
+        """
+
+        if self._ancestors is None or self._ancestors[0] != commit:
+            result = self._git("rev-list", commit)
+            if result.returncode != 0:
+                logger.warning(f"Commit {commit} not available in mirror – no co-changes")
+            seqs = {self._commit_seqs[c] for c in result.stdout.split() if c in self._commit_seqs}
+            self._ancestors = (commit, seqs)
+        return self._ancestors[1]
+
+    def co_edited_files(
+            self,
+            commit: str,
+            file: str,
+            n_last_commits: int = 10,
+            n_files: int = 3
+    ) -> list[tuple[str, int]]:
+        """
+        Looks up the test files most commonly changed together with a file in its last commits up to a commit.
+
+        Parameters:
+            commit (str): The commit whose history is considered (e.g., the base commit of a PR)
+            file (str): The path of the file
+            n_last_commits (int, optional): Number of last commits of the file to look at
+            n_files (int, optional): Number of test files to return
+
+        Returns:
+            list[tuple[str, int]]: The test files and their number of co-changes, most common first
+        """
+
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            ancestors = self._ancestor_seqs(commit)
+            last_commits = [seq for seq in self._file_commits.get(file, []) if seq in ancestors][:n_last_commits]
+            co_changes = Counter(
+                test_file
+                for seq in last_commits
+                for test_file in self._commit_test_files.get(seq, [])
+                if test_file != file
+            )
+            return co_changes.most_common(n_files)
+
+
+@functools.cache
+def get_co_change_index(owner: str, repo: str) -> CoChangeIndex:
+    """
+    Returns the process-wide co-change index of a GitHub repository, created on first use.
+
+    Parameters:
+        owner (str): The owner of the repository
+        repo (str): The name of the repository
+
+    Returns:
+        CoChangeIndex: The shared index
+    """
+
+    return CoChangeIndex(get_config().co_change_index_path, get_repo_mirror(owner, repo).mirror_dir, f"{owner}/{repo}")
@@ -35,14 +35,19 @@ class CSTBuilder:
         except SyntaxError:
             return None
 
-    def slice_code_file(self) -> list:
+    def slice_code_file(self, cached_slices: dict = None) -> list:
         """
         Detects which files have been modified to call slice_javascript_code.
 
+        Parameters:
+            cached_slices (dict, optional): Sliced code of an earlier push, keyed by the digest of the file diff
+
         Returns:
             list: Sliced code for modified code, unsliced for untouched code.
         """
 
+        cached_slices = cached_slices or {}
+
         if not self._pr_diff_ctx.code_names:
             return self._pr_diff_ctx.code_before
 
@@ -54,7 +59,11 @@ class CSTBuilder:
         patches = ["diff --git" + x for x in self._pr_diff_ctx.golden_code_patch.split("diff --git")[1:]]
         result = []
 
-        for before, after, diff in zip(self._pr_diff_ctx.code_before, code_after, patches):
+        for digest, before, after, diff in zip(self._pr_diff_ctx.code_digests, self._pr_diff_ctx.code_before,
+                                               code_after, patches):
+            if digest in cached_slices:  # file is unchanged since the previous push
+                result.append(cached_slices[digest])
+                continue
             before_map, after_map = self._build_changed_lines_scope_map(
                 before,
                 after,
@@ -1,15 +1,20 @@
 import docker
 import io
 import tarfile
+import tempfile
 import re
 import json
 import logging
+import math
 import shlex
+import threading
 
 from docker.errors import ImageNotFound, APIError, BuildError
 from docker.models.containers import Container
 from pathlib import Path
 
+from webhook_handler.core.cancellation import CancellationToken
+from webhook_handler.core.deadline import Deadline, DeadlineExceeded
 from webhook_handler.core.execution_error import ExecutionError
 from webhook_handler.data_models.pr_data import PullRequestData
 
@@ -27,48 +32,75 @@ class DockerService:
             old_repo_state: bool,
             pr_data: PullRequestData,
             pdf_name: str,
-            pdf_content: bytes
+            pdf_path: Path | None,
+            cancel_token: CancellationToken = None,
+            deadline: Deadline = None,
+            build_timeout: float = None,
+            test_timeout: float = 300
     ):
         self._project_root = project_root
         self._old_repo_state = old_repo_state
         self._pr_data = pr_data
         self._pdf_name = pdf_name
-        self._pdf_content = pdf_content
+        self._pdf_path = pdf_path
+        self._cancel_token = cancel_token or CancellationToken()
+        self._deadline = deadline or Deadline(None)
+        self._build_timeout = build_timeout
+        self._test_timeout = test_timeout
         self._client = docker.from_env()
 
     def build(self) -> None:
         """
-        Builds a Docker image using the Python Docker SDK.
+        Builds a Docker image using the Python Docker SDK. A build exceeding its budget or a cancelled job
+        aborts the build by closing the connection to the Docker daemon.
         """
 
         image_tag = self._pr_data.image_tag
         build_succeeded = False
 
         try:
-            self._client.images.get(f"{image_tag}:latest")
-            logger.info(f"Docker image '{image_tag}' already exists – skipped")
-            return
+            image = self._client.images.get(f"{image_tag}:latest")
+            built_from = image.labels.get("base_commit")
+            if built_from == self._pr_data.base_commit:
+                logger.info(f"Docker image '{image_tag}' already exists – skipped")
+                return
+            logger.warning(f"Docker image '{image_tag}' was built from base commit {built_from} – rebuilding")
+            self._client.images.remove(image=f"{image_tag}:latest", force=True)
         except ImageNotFound:
             logger.warning(f"No existing image '{image_tag}' found")
         except APIError as e:
             logger.error(f"Docker API error when checking for existing image: {e}")
 
+        self._deadline.check("building the Docker image")
         logger.info(f"Building from scratch based on commit {self._pr_data.base_commit}")
         dockerfile_path = Path("dockerfiles", f"Dockerfile_{self._pr_data.repo}_old").as_posix() \
             if self._old_repo_state \
             else Path("dockerfiles", f"Dockerfile_{self._pr_data.repo}").as_posix()
+        timed_out = threading.Event()
+
+        def _on_timeout() -> None:
+            timed_out.set()
+            self._abort_build()
+
+        budget = self._deadline.budget(self._build_timeout)
+        watchdog = None if math.isinf(budget) else threading.Timer(budget, _on_timeout)
         try:
+            self._cancel_token.add_callback(self._abort_build)  # cancelling the job aborts the build immediately
+            if watchdog is not None:
+                watchdog.start()
             self._client.images.build(
                 path=self._project_root,
                 tag=f"{self._pr_data.image_tag}:latest",
                 dockerfile=dockerfile_path,
                 buildargs={"commit_hash": self._pr_data.base_commit},
+                labels={"base_commit": self._pr_data.base_commit},  # decides reuse on later pushes
                 network_mode="host",
                 rm=True
             )
             build_succeeded = True
             logger.success(f"Docker image '{self._pr_data.image_tag}' built successfully")
         except BuildError as e:
+            self._raise_if_build_aborted(timed_out)
             log_lines = []
             for chunk in e.build_log:
                 if 'stream' in chunk:
@@ -77,9 +109,16 @@ class DockerService:
             logger.critical(f"Build failed for image '{image_tag}':\n{full_build_log}")
             raise ExecutionError("Docker build failed")
         except APIError as e:
+            self._raise_if_build_aborted(timed_out)
             logger.critical(f"Docker API error: {e}")
             raise ExecutionError("Docker API error")
+        except Exception:
+            self._raise_if_build_aborted(timed_out)  # an aborted build surfaces as a connection error
+            raise
         finally:
+            if watchdog is not None:
+                watchdog.cancel()
+            self._cancel_token.remove_callback(self._abort_build)
             if not build_succeeded:
                 logger.info("Cleaning up leftover containers and dangling images...")
                 for container in self._client.containers.list(all=True):
@@ -101,6 +140,27 @@ class DockerService:
                 except APIError as list_err:
                     logger.error(f"Error listing dangling images: {list_err}")
 
+        self._deadline.check("running the tests")  # the image is kept for later pushes anyway
+
+    def _abort_build(self) -> None:
+        """
+        Closes the connections to the Docker daemon, which stops a running build. Later requests open new ones.
+        """
+
+        self._client.api.close()
+
+    def _raise_if_build_aborted(self, timed_out: threading.Event) -> None:
+        """
+        Stops if the build has been aborted by the job being cancelled or by exceeding its budget.
+
+        Parameters:
+            timed_out (threading.Event): Set once the build has exceeded its budget
+        """
+
+        self._cancel_token.raise_if_cancelled()
+        if timed_out.is_set():
+            raise DeadlineExceeded("Docker build exceeded its time budget")
+
     def run_test_in_container(
             self,
             test_patch: str,
@@ -122,6 +182,8 @@ class DockerService:
             str: The output from running the test
         """
 
+        self._cancel_token.raise_if_cancelled()
+        self._deadline.check("running the test")
         try:
             logger.info("Creating container...")
             container = self._client.containers.create(
@@ -131,6 +193,7 @@ class DockerService:
                 detach=True
             )
             container.start()
+            self._cancel_token.add_callback(container.kill)  # cancelling the job kills the container immediately
             logger.success(f"Container {container.short_id} started")
 
             # check if the test file is already in the container, add stub otherwise (new file)
@@ -150,8 +213,8 @@ class DockerService:
                     raise ExecutionError("No gulpfile found")
 
             # add mock PDF if available
-            if self._pdf_name and self._pdf_content:
-                self._add_file_to_container(container, f"test/pdfs/{self._pdf_name}", self._pdf_content)
+            if self._pdf_name and self._pdf_path is not None:
+                self._add_local_file_to_container(container, f"test/pdfs/{self._pdf_name}", self._pdf_path)
 
             self._copy_and_apply_patch(
                 container,
@@ -164,10 +227,14 @@ class DockerService:
                     patch_content=golden_code_patch,
                     patch_name="golden_code_patch.diff"
                 )
-            stdout = self._run_test(container, gulpfile_pointer, tests_to_run)
+            test_timeout = self._deadline.timeout(self._test_timeout)
+            test_timeout = max(1, int(test_timeout)) if test_timeout is not None else 0  # 0 disables the timeout
+            stdout = self._run_test(container, gulpfile_pointer, tests_to_run, test_timeout)
+            self._cancel_token.raise_if_cancelled()  # output of a killed container is meaningless
             test_passed = self._evaluate_test(stdout)
             return test_passed, stdout
         finally:
+            self._cancel_token.remove_callback(container.kill)
             logger.warning("Stopping and removing container...")
             container.stop()
             container.remove()
@@ -202,6 +269,29 @@ class DockerService:
             logger.critical(f"Docker API error: {e}")
             raise ExecutionError("Docker API error")
 
+    @staticmethod
+    def _add_local_file_to_container(container: Container, file_path: str, local_path: Path) -> None:
+        """
+        Adds a file from disk to Docker container. The archive is spooled to a temporary file, hence large files
+        are never held in memory.
+
+        Parameters:
+            container (Container): Container to add file to
+            file_path (str): Path to the file to add to the container
+            local_path (Path): Path to the file on disk
+        """
+
+        with tempfile.TemporaryFile() as tar_file:
+            with tarfile.open(fileobj=tar_file, mode="w") as tar:
+                tar.add(local_path, arcname=file_path)
+            tar_file.seek(0)
+            try:
+                container.put_archive("/app/testbed", tar_file)
+                logger.success(f"File {file_path} added to container successfully")
+            except APIError as e:
+                logger.critical(f"Docker API error: {e}")
+                raise ExecutionError("Docker API error")
+
     def _whitelist_stub(self, container: Container, file_name: str) -> None:
         """
         Adds the new file to the whitelist for it to be detectable by Jasmine.
@@ -246,7 +336,7 @@ class DockerService:
         logger.success(f"Patch file {patch_name} applied successfully")
 
     @staticmethod
-    def _run_test(container: Container, gulpfile_pointer: str, tests_to_run: list) -> str:
+    def _run_test(container: Container, gulpfile_pointer: str, tests_to_run: list, timeout: int) -> str:
         """
         Runs tests in container.
 
@@ -254,6 +344,7 @@ class DockerService:
             container (Container): Container to run test
             gulpfile_pointer (str): Determines whether to use gulpfile.mjs or gulpfile.js
             tests_to_run (list): List of tests to run
+            timeout (int): Seconds after which a test command is killed
 
         Returns:
             str: The test output
@@ -263,7 +354,7 @@ class DockerService:
         for desc in tests_to_run:
             inner = f"TEST_FILTER='{desc}' npx gulp --gulpfile {gulpfile_pointer} unittest-single"
             test_single = shlex.quote(inner)
-            cmd = f"timeout 300 /bin/sh -c {test_single}"
+            cmd = f"timeout {timeout} /bin/sh -c {test_single}"
             test_commands.append(cmd)
 
         joined_cmds = " && ".join(test_commands)
@@ -1,48 +1,338 @@
+import json
 import requests
-import time
-import re
+import sqlite3
 import subprocess
+import threading
+import time
 import logging
 
+from collections import OrderedDict
+from typing import Iterator
+from urllib.parse import parse_qs, urlsplit
+
+from webhook_handler.core import helpers
 from webhook_handler.core.config import Config
+from webhook_handler.core.deadline import Deadline
 from webhook_handler.data_models.pr_data import PullRequestData
+from webhook_handler.data_models.request_priority import RequestPriority
+from webhook_handler.services.blob_cache import BlobCache, get_blob_cache
+from webhook_handler.services.co_change_index import get_co_change_index
+from webhook_handler.services.git_object_reader import GitObjectReader
+from webhook_handler.services.http_client import get_http_client
+from webhook_handler.services.rate_limiter import get_rate_limiter
+from webhook_handler.services.repo_mirror import get_repo_mirror
+from webhook_handler.services.response_cache import ResponseCache, get_response_cache
 
 
 logger = logging.getLogger(__name__)
 
+_MAX_RESOLVED_ISSUES = 1024
+_resolved_issues = OrderedDict()  # (tracker, ..., number) -> (description or None, resolution time), LRU order
+_resolved_issues_lock = threading.Lock()
+
 
 class GitHubApi:
     """
-    Used to interact with GitHub API.
+    Used to interact with GitHub API. All requests share the pooled sessions of the process-wide HTTP client and
+    are paced by the process-wide rate limiter. Once a local clone is attached, file versions are read from it
+    instead.
     """
-    def __init__(self, config: Config, pr_data: PullRequestData):
+    FILES_PER_PAGE = 100  # maximum page size of the GitHub API
+    OVERVIEW_QUERY = """
+query($owner: String!, $repo: String!, $number: Int!) {
+  repository(owner: $owner, name: $repo) {
+    pullRequest(number: $number) {
+      files(first: %d) { pageInfo { hasNextPage } nodes { path changeType } }
+      closingIssuesReferences(first: 10) { nodes { number title body } }
+    }
+%s
+  }
+}
+"""
+    ISSUE_FIELD = "    issue_%d: issueOrPullRequest(number: %d) { ... on Issue { number title body } }"
+    def __init__(
+            self,
+            config: Config,
+            pr_data: PullRequestData,
+            deadline: Deadline = None,
+            blob_cache: BlobCache = None,
+            response_cache: ResponseCache = None
+    ):
         self._config = config
         self._pr_data = pr_data
+        self._deadline = deadline or Deadline(None)
         self._api_url = "https://api.github.com/repos"
+        self._graphql_url = "https://api.github.com/graphql"
+        self._bugzilla_url = "https://bugzilla.mozilla.org/rest/bug"
+        self._raw_url = "https://raw.githubusercontent.com"
+        self._http = get_http_client()
+        self._rate_limiter = get_rate_limiter()
+        self._blob_cache = blob_cache or get_blob_cache()
+        self._response_cache = response_cache or get_response_cache()
+        self._stats_lock = threading.Lock()
+        self._n_requests = 0
+        self._n_bytes = 0
+        self._n_local_reads = 0
+        self._local_reader = None
+        self._overview = None
+        self._overview_fetched = False
+
+    @property
+    def request_stats(self) -> dict:
+        with self._stats_lock:
+            return {"requests": self._n_requests, "bytes": self._n_bytes, "local_reads": self._n_local_reads}
+
+    @property
+    def has_local_repo(self) -> bool:
+        return self._local_reader is not None
+
+    def attach_local_repo(self, repo_dir: str) -> None:
+        """
+        Serves file versions from a local clone from now on. Commits missing in the clone are still fetched
+        over HTTP.
 
-    def fetch_pr_files(self) -> dict:
+        Parameters:
+            repo_dir (str): Directory of the clone
+        """
+
+        self.close()
+        self._local_reader = GitObjectReader(repo_dir)
+
+    def close(self) -> None:
+        """
+        Stops reading from the local clone.
         """
-        Fetches all files of a pull request.
+
+        reader, self._local_reader = self._local_reader, None
+        if reader is not None:
+            reader.close()
+
+    def _read_local_version(self, commit: str, file_name: str) -> bytes | None:
+        """
+        Reads the version of a file from the attached clone.
+
+        Parameters:
+            commit (str): Commit hash
+            file_name (str): File name
 
         Returns:
-            dict: All raw files
+            bytes | None: File contents (empty if the file does not exist at the commit), or None if the
+            commit is not available locally
         """
 
-        url = f"{self._api_url}/{self._pr_data.owner}/{self._pr_data.repo}/pulls/{self._pr_data.number}/files"
-        response = requests.get(url, headers=self._config.headers)
-        if response.status_code == 403 and "X-RateLimit-Reset" in response.headers:
-            reset_time = int(response.headers["X-RateLimit-Reset"])
-            wait_time = reset_time - int(time.time()) + 1
-            logger.warning(f"Rate limit exceeded. Waiting for {wait_time} seconds...")
-            time.sleep(max(wait_time, 1))
-            return self.fetch_pr_files()
+        reader = self._local_reader
+        if reader is None:
+            return None
+        try:
+            if not reader.has_commit(commit):
+                return None
+            content = reader.read_file(commit, file_name)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Reading from local clone failed, falling back to HTTP: {e}")
+            self._local_reader = None
+            return None
+        with self._stats_lock:
+            self._n_local_reads += 1
+        return content or b""
+
+    def _read_local_blob_sha(self, commit: str, file_name: str) -> str | None:
+        """
+        Looks up the blob SHA of a file in the attached clone.
+
+        Parameters:
+            commit (str): Commit hash
+            file_name (str): File name
+
+        Returns:
+            str | None: The SHA of the blob, or None if the file or the commit is not available locally
+        """
+
+        reader = self._local_reader
+        if reader is None:
+            return None
+        try:
+            if not reader.has_commit(commit):
+                return None
+            return reader.blob_sha(commit, file_name)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Reading from local clone failed, falling back to HTTP: {e}")
+            self._local_reader = None
+            return None
+
+    def _request(
+            self,
+            method: str,
+            url: str,
+            priority: RequestPriority = RequestPriority.HIGH,
+            **kwargs
+    ) -> requests.Response:
+        """
+        Sends a request through the shared HTTP client once the rate limiter allows it and counts it. Requests
+        rejected due to the rate limit are repeated after the limit resets.
+
+        Parameters:
+            method (str): The HTTP method
+            url (str): The URL
+            priority (RequestPriority, optional): The priority of the request
+            **kwargs: Further arguments for requests
+
+        Returns:
+            requests.Response: The response
+        """
+
+        parts = urlsplit(url)
+        resource = parts.netloc + ("/graphql" if parts.path.endswith("/graphql") else "")  # separate rate limit
+        while True:
+            max_wait = self._deadline.budget(self._config.stage_timeouts["rate_limit_wait"])
+            self._rate_limiter.acquire(resource, priority, max_wait=max_wait)
+            response = self._http.request(method, url, **kwargs)
+            with self._stats_lock:
+                self._n_requests += 1
+                self._n_bytes += len(response.content)
+            if not self._rate_limiter.update(resource, response):
+                return response
+            logger.warning(f"Request to {resource} rejected due to the rate limit")
+
+    def fetch_pr_overview(self) -> dict | None:
+        """
+        Fetches the changed files, the closing issue references and all issues referenced in the title and
+        description of the pull request in one GraphQL round trip. The result is kept for later calls.
+
+        Returns:
+            dict | None: The raw files (None if they do not fit into one page), the numbers of the closing issues
+            and the descriptions of the referenced issues (None if a number is not a GitHub issue), or None if
+            GraphQL is not available
+        """
+
+        if self._overview_fetched:
+            return self._overview
+        self._overview_fetched = True
+        if not self._config.github_token:
+            return None
+
+        numbers = list(dict.fromkeys(int(number) for number in self._pr_data.linked_issue_candidates))
+        query = self.OVERVIEW_QUERY % (
+            self.FILES_PER_PAGE,
+            "\n".join(self.ISSUE_FIELD % (number, number) for number in numbers)
+        )
+        variables = {"owner": self._pr_data.owner, "repo": self._pr_data.repo, "number": int(self._pr_data.number)}
+        try:
+            response = self._request(
+                "POST",
+                self._graphql_url,
+                json={"query": query, "variables": variables},
+                headers={"Authorization": f"Bearer {self._config.github_token}"}
+            )
+            repository = (response.json().get("data") or {}).get("repository") if response.status_code == 200 else None
+        except (requests.RequestException, ValueError) as e:
+            logger.warning(f"GraphQL request failed: {e}")
+            repository = None
+        if not repository or not repository.get("pullRequest"):
+            logger.warning("GraphQL overview not available, falling back to REST")
+            return None
+
+        pull_request = repository["pullRequest"]
+        files = None
+        if not pull_request["files"]["pageInfo"]["hasNextPage"]:
+            files = [
+                {"filename": node["path"], "status": node["changeType"].lower()}
+                for node in pull_request["files"]["nodes"]
+            ]
+        issues = {}
+        for number in numbers:
+            issue = repository.get(f"issue_{number}") or {}
+            issues[number] = self._issue_description(issue) if issue.get("title") else None
+        closing_issues = []
+        for issue in pull_request["closingIssuesReferences"]["nodes"]:
+            issues[issue["number"]] = self._issue_description(issue)
+            closing_issues.append(issue["number"])
+        self._overview = {"files": files, "closing_issues": closing_issues, "issues": issues}
+        logger.success(f"GraphQL overview fetched successfully")
+        return self._overview
+
+    @staticmethod
+    def _issue_description(issue_data: dict) -> str:
+        return "\n".join(value for value in (issue_data["title"], issue_data["body"]) if value)
+
+    def _fetch_pr_files_page(self, page: int) -> requests.Response:
+        """
+        Fetches one page of the files of a pull request.
 
+        Parameters:
+            page (int): The number of the page, starting at 1
+
+        Returns:
+            requests.Response: The response
+        """
+
+        url = f"{self._api_url}/{self._pr_data.owner}/{self._pr_data.repo}/pulls/{self._pr_data.number}/files"
+        response = self._request(
+            "GET",
+            url,
+            params={"per_page": self.FILES_PER_PAGE, "page": page},
+            headers=self._config.headers
+        )
         response.raise_for_status()
-        return response.json()
+        return response
+
+    def iter_pr_file_pages(self, max_workers: int = 8) -> Iterator[tuple[int, list[dict]]]:
+        """
+        Fetches all files of a pull request page by page. Small PRs are served from the GraphQL overview, which
+        has no blob SHAs, hence they are looked up at the head commit in the attached clone. Otherwise, the Link
+        header of the first page tells the number of pages, the remaining pages are fetched concurrently and
+        yielded as soon as they arrive.
+
+        Parameters:
+            max_workers (int, optional): The maximum number of pages fetched concurrently
+
+        Returns:
+            Iterator[tuple[int, list[dict]]]: The number of each page and its raw files
+        """
+
+        overview = self.fetch_pr_overview()
+        if overview is not None and overview["files"] is not None:
+            yield 1, [
+                {**raw_file, "sha": self._read_local_blob_sha(self._pr_data.head_commit, raw_file["filename"])}
+                for raw_file in overview["files"]
+            ]
+            return
+
+        response = self._fetch_pr_files_page(1)
+        yield 1, response.json()
+        if "last" in response.links:
+            n_pages = int(parse_qs(urlsplit(response.links["last"]["url"]).query)["page"][0])
+            yield from (
+                (page, page_response.json())
+                for page, page_response in helpers.parallel_iter(
+                    self._fetch_pr_files_page,
+                    range(2, n_pages + 1),
+                    max_workers
+                )
+            )
+            return
+
+        page = 1
+        while "next" in response.links:  # the number of pages is unknown, follow the links one by one
+            page += 1
+            response = self._request("GET", response.links["next"]["url"], headers=self._config.headers)
+            response.raise_for_status()
+            yield page, response.json()
+
+    def fetch_pr_files(self) -> list[dict]:
+        """
+        Fetches all files of a pull request.
+
+        Returns:
+            list[dict]: All raw files in the order of the listing
+        """
+
+        pages = dict(self.iter_pr_file_pages())
+        return [raw_file for page in sorted(pages) for raw_file in pages[page]]
 
     def fetch_file_version(self, commit: str, file_name: str, get_bytes: bool = False) -> str | bytes:
         """
-        Fetches the version of a file at a specific commit.
+        Fetches the version of a file at a specific commit. The attached clone is read first. Otherwise, versions
+        of commit SHAs never change and are served from the blob cache after the first download.
 
         Parameters:
             commit (str): Commit hash
@@ -50,14 +340,24 @@ class GitHubApi:
             get_bytes (bool, optional): Get bytes instead of text
 
         Returns:
-            str | bytes: File contents
+            str | bytes: File contents (empty if the file does not exist at the commit or the download failed)
         """
 
-        url = f"https://raw.githubusercontent.com/{self._pr_data.owner}/{self._pr_data.repo}/{commit}/{file_name}"
-        response = requests.get(url, headers=self._config.headers)
-        if response.status_code == 200:
-            return response.content if get_bytes else response.text
-        return ""
+        owner, repo = self._pr_data.owner, self._pr_data.repo
+        content = self._read_local_version(commit, file_name)
+        if content is None:
+            content = self._blob_cache.get(owner, repo, commit, file_name)
+        if content is None:
+            url = f"{self._raw_url}/{owner}/{repo}/{commit}/{file_name}"
+            response = self._request("GET", url, RequestPriority.LOW, headers=self._config.headers)
+            if response.status_code == 200:
+                content = response.content
+            elif response.status_code == 404:  # file does not exist at this commit
+                content = b""
+            else:  # failed downloads are not cached
+                return b"" if get_bytes else ""
+            self._blob_cache.put(owner, repo, commit, file_name, content if response.status_code == 200 else None)
+        return content if get_bytes else content.decode("utf-8", errors="replace")
 
     def add_comment_to_pr(self, comment) -> [int, dict]:
         """
@@ -77,90 +377,171 @@ class GitHubApi:
             "Accept": "application/vnd.github.v3+json"
         }
         data = {"body": comment}
-        response = requests.post(url, json=data, headers=headers)
+        response = self._request("POST", url, json=data, headers=headers)
         return response.status_code, response.json()
 
-    def clone_repo(self) -> None:
+    def clone_repo(self, target_dir: str) -> None:
+        """
+        Checks out the base commit into a worktree of the shared mirror of the GitHub repository. An existing
+        worktree is switched to the base commit.
+
+        Parameters:
+            target_dir (str): Directory of the worktree
+        """
+
+        mirror = get_repo_mirror(self._pr_data.owner, self._pr_data.repo)
+        mirror.fetch(self._pr_data.base_commit)
+        mirror.add_worktree(target_dir, self._pr_data.base_commit)
+
+    def update_repo(self, commit: str, ref: str = None) -> None:
         """
-        Clones a GitHub repository.
+        Fetches new objects into the shared mirror if it does not contain the commit yet. All worktrees see them.
+        New commits of the default branch are added to the co-change index.
+
+        Parameters:
+            commit (str): Commit which must be available
+            ref (str, optional): Ref to fetch instead of all branches (e.g., pull/<number>/head for forks)
         """
 
-        logger.info(f"Cloning repository https://github.com/{self._pr_data.owner}/{self._pr_data.repo}.git")
-        _ = subprocess.run(
-            ["git", "clone", f"https://github.com/{self._pr_data.owner}/{self._pr_data.repo}.git",
-             self._config.cloned_repo_dir],
-            capture_output=True, check=True)
-        logger.success(f"Cloning successful")
+        get_repo_mirror(self._pr_data.owner, self._pr_data.repo).fetch(commit, ref)
+        try:
+            get_co_change_index(self._pr_data.owner, self._pr_data.repo).update()
+        except (subprocess.CalledProcessError, sqlite3.Error) as e:
+            logger.warning(f"Failed to update co-change index: {e}")
 
     def get_linked_data(self) -> [str, str]:
         """
-        Checks and fetches a linked issue.
+        Checks and fetches a linked issue. All candidates are resolved on GitHub and Bugzilla concurrently, GitHub
+        issues are taken from the GraphQL overview if available. The first candidate wins, a GitHub issue wins
+        over a Bugzilla bug with the same number. Closing issue references of the GraphQL overview which are not
+        mentioned in the title or description are only considered after all candidates.
 
         Returns:
             str: The linked issue title and description
             str: The candidate PDF filename
         """
 
-        issue_pattern = r'\b(?:Closes|Fixes|Resolves)\s+#(\d+)\b|\(?\b(?:bug|issue)\b\s+(\d+)\)?'
-        issue_description = f"{self._pr_data.title} {self._pr_data.description}"
-        matches = re.findall(issue_pattern, issue_description, re.IGNORECASE)
+        overview = self.fetch_pr_overview()
+        candidates = [int(number) for number in self._pr_data.linked_issue_candidates]
+        if overview is not None:
+            candidates += [number for number in overview["closing_issues"] if number not in candidates]
+            for number, description in overview["issues"].items():
+                self._remember_issue(self._issue_key("github", number), description)
+            # Bugzilla is only asked for the candidates before the first GitHub issue
+            first_issue = next((i for i, number in enumerate(candidates) if overview["issues"].get(number)), None)
+            lookups = [("bugzilla", number) for number in candidates[:first_issue]]
+        else:
+            lookups = [(tracker, number) for number in candidates for tracker in ("github", "bugzilla")]
+        descriptions = dict(zip(
+            lookups,
+            helpers.parallel_map(lambda lookup: self._resolve_issue(*lookup), lookups, self._config.max_fetch_workers)
+        ))
+        if overview is not None:
+            descriptions.update({("github", number): overview["issues"].get(number) for number in candidates})
+
+        for issue_nr in candidates:
+            if descriptions.get(("github", issue_nr)):
+                logger.success(f"Linked GitHub issue #{issue_nr} selected")
+                return descriptions[("github", issue_nr)], f"issue{issue_nr}"
+            if descriptions.get(("bugzilla", issue_nr)):
+                logger.success(f"Linked Bugzilla issue #{issue_nr} selected")
+                return descriptions[("bugzilla", issue_nr)], f"bug{issue_nr}"
 
-        for match in matches:
-            issue_nr_str = match[0] or match[1]
-            if not issue_nr_str: continue
+        return "", ""
 
-            issue_nr = int(issue_nr_str)
-            linked_issue_description = self._get_github_issue(issue_nr)
-            if linked_issue_description:
-                return linked_issue_description, f"issue{issue_nr_str}"
+    def _issue_key(self, tracker: str, number: int) -> tuple:
+        if tracker == "github":
+            return tracker, self._pr_data.owner, self._pr_data.repo, number
+        return tracker, self._bugzilla_url, number
 
-            linked_issue_description = self._get_bugzilla_issue(issue_nr)
-            if linked_issue_description:
-                return linked_issue_description, f"bug{issue_nr_str}"
+    def _remember_issue(self, key: tuple, description: str | None) -> None:
+        with _resolved_issues_lock:
+            _resolved_issues[key] = (description, time.monotonic())
+            _resolved_issues.move_to_end(key)
+            while len(_resolved_issues) > _MAX_RESOLVED_ISSUES:
+                _resolved_issues.popitem(last=False)
 
-        return "", ""
+    def _resolve_issue(self, tracker: str, number: int) -> str | None:
+        """
+        Resolves an issue number on a tracker. Definite results are reused by all PRs for a limited time, the
+        most recently used ones are kept in memory. Failed lookups are repeated by the next PR.
+
+        Parameters:
+            tracker (str): Either github or bugzilla
+            number (int): The number of the issue
 
-    def _get_github_issue(self, number: int) -> str | None:
+        Returns:
+            str | None: The issue title and description, or None if the tracker has no such issue
         """
-        Fetches a GitHub issue.
+
+        key = self._issue_key(tracker, number)
+        with _resolved_issues_lock:
+            resolved = _resolved_issues.get(key)
+            if resolved is not None and time.monotonic() - resolved[1] < self._config.linked_issue_ttl:
+                _resolved_issues.move_to_end(key)
+                return resolved[0]
+            _resolved_issues.pop(key, None)  # expired
+        if tracker == "github":
+            description, definite = self._get_github_issue(number)
+        else:
+            description, definite = self._get_bugzilla_issue(number)
+        if definite:
+            self._remember_issue(key, description)
+        return description
+
+    def _get_github_issue(self, number: int) -> tuple[str | None, bool]:
+        """
+        Fetches a GitHub issue. Cached issues are revalidated with their ETag.
 
         Parameters:
             number (int): The number of the issue
 
         Returns:
             str | None: The GitHub issue title and description
+            bool: True if GitHub answered, False if the request failed (e.g., server error or rate limit)
         """
 
         url = f"{self._api_url}/{self._pr_data.owner}/{self._pr_data.repo}/issues/{number}"
-        response = requests.get(url, headers=self._config.headers)
-        if response.status_code == 200:
-            issue_data = response.json()
+        status_code, body = self._response_cache.fetch(  # a 304 does not count against the rate limit
+            url,
+            lambda conditional_headers: self._request("GET", url, headers={**self._config.headers, **conditional_headers})
+        )
+        if status_code == 200:
+            issue_data = json.loads(body)
             if not "pull_request" in issue_data:
                 logger.success(f"Linked GitHub issue #{number} fetched successfully")
-                return "\n".join(value for value in (issue_data["title"], issue_data["body"]) if value)
+                return self._issue_description(issue_data), True
 
         logger.warning("No GitHub issue found")
-        return None
+        return None, status_code in (200, 404, 410)
 
-    @staticmethod
-    def _get_bugzilla_issue(number: int) -> str | None:
+    def _get_bugzilla_issue(self, number: int) -> tuple[str | None, bool]:
         """
-        Fetches a Bugzilla issue.
+        Fetches a Bugzilla issue. Cached bugs are served without request within the TTL.
 
         Parameters:
             number (int): The number of the issue
 
         Returns:
             str | None: The Bugzilla issue title and description
+            bool: True if Bugzilla answered, False if the request failed (e.g., server error)
         """
 
-        response = requests.get(f"https://bugzilla.mozilla.org/rest/bug/{number}")
-        if response.status_code == 200:
-            bug_data = response.json()
+        url = f"{self._bugzilla_url}/{number}"
+        status_code, body = self._response_cache.fetch(
+            url,
+            lambda conditional_headers: self._request("GET", url, headers=conditional_headers),
+            ttl=self._config.bugzilla_cache_ttl
+        )
+        if status_code == 200:
+            bug_data = json.loads(body)
             if "bugs" in bug_data and bug_data["bugs"]:
                 bug = bug_data["bugs"][0]
                 logger.success(f"Linked Bugzilla issue #{number} fetched successfully")
-                return "\n".join(value for value in (bug.get("summary", ""), bug.get("description", "")) if value)
+                description = "\n".join(
+                    value for value in (bug.get("summary", ""), bug.get("description", "")) if value
+                )
+                return description, True
 
         logger.warning("No Bugzilla issue found")
-        return None
+        return None, status_code in (200, 404)
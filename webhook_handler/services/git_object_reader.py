@@ -0,0 +1,112 @@
+import logging
+import subprocess
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+class GitObjectReader:
+    """
+    Reads objects from a local repository through one persistent `git cat-file --batch` process, which
+    avoids spawning a git process per file.
+    """
+    def __init__(self, repo_dir: str):
+        self._repo_dir = repo_dir
+        self._lock = threading.Lock()
+        self._known_commits = {}
+        self._process = subprocess.Popen(
+            ["git", "cat-file", "--batch"],
+            cwd=repo_dir,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+
+    def _read_object(self, name: str) -> tuple[str, str, bytes] | None:
+        """
+        Reads an object by name (e.g., <commit>:<path>).
+
+        Parameters:
+            name (str): The name of the object
+
+        Returns:
+            tuple[str, str, bytes] | None: The SHA, type and content of the object, or None if it does not exist
+        """
+
+        with self._lock:
+            if self._process.poll() is not None:
+                raise OSError(f"git cat-file exited in {self._repo_dir}")
+            self._process.stdin.write(f"{name}\n".encode("utf-8"))
+            self._process.stdin.flush()
+            header = self._process.stdout.readline()  # <sha> <type> <size>, or <name> missing
+            if not header or header.rstrip().endswith((b" missing", b" ambiguous")):
+                return None
+            sha, obj_type, size = header.split()
+            content = self._process.stdout.read(int(size))
+            self._process.stdout.read(1)  # trailing newline
+            return sha.decode(), obj_type.decode(), content
+
+    def has_commit(self, commit: str) -> bool:
+        """
+        Checks whether a commit is available locally.
+
+        Parameters:
+            commit (str): The commit hash
+
+        Returns:
+            bool: True if the commit exists in the repository, False otherwise
+        """
+
+        if commit not in self._known_commits:
+            obj = self._read_object(f"{commit}^{{commit}}")
+            self._known_commits[commit] = obj is not None and obj[1] == "commit"
+        return self._known_commits[commit]
+
+    def read_file(self, commit: str, path: str) -> bytes | None:
+        """
+        Reads the version of a file at a commit.
+
+        Parameters:
+            commit (str): The commit hash
+            path (str): The path of the file
+
+        Returns:
+            bytes | None: The content of the file, or None if it does not exist at the commit
+        """
+
+        obj = self._read_object(f"{commit}:{path}")
+        if obj is None or obj[1] != "blob":
+            return None
+        return obj[2]
+
+    def blob_sha(self, commit: str, path: str) -> str | None:
+        """
+        Looks up the blob SHA of a file at a commit.
+
+        Parameters:
+            commit (str): The commit hash
+            path (str): The path of the file
+
+        Returns:
+            str | None: The SHA of the blob, or None if the file does not exist at the commit
+        """
+
+        obj = self._read_object(f"{commit}:{path}")
+        if obj is None or obj[1] != "blob":
+            return None
+        return obj[0]
+
+    def close(self) -> None:
+        """
+        Terminates the git process.
+        """
+
+        with self._lock:
+            if self._process.poll() is None:
+                self._process.stdin.close()
+                try:
+                    self._process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    self._process.kill()
+            self._process.stdout.close()
@@ -0,0 +1,132 @@
+import functools
+import logging
+import random
+import threading
+import time
+import requests
+
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
+
+from webhook_handler.core.config import get_config
+
+
+logger = logging.getLogger(__name__)
+
+
+class HttpClient:
+    """
+    Process-wide HTTP client which keeps one pooled keep-alive session per host. Idempotent requests are
+    retried with jittered exponential backoff on server errors and connection failures.
+    """
+    RETRY_METHODS = ("GET", "HEAD")
+    RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+    def __init__(
+            self,
+            timeout: tuple[float, float] = (5, 30),
+            max_retries: int = 3,
+            backoff: float = 0.5,
+            pool_size: int = 16
+    ):
+        self._timeout = timeout
+        self._max_retries = max_retries
+        self._backoff = backoff
+        self._pool_size = pool_size
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._stats = {}
+
+    def _session(self, host: str) -> requests.Session:
+        """
+        Returns the session of a host, created on first use.
+
+        Parameters:
+            host (str): The host
+
+        Returns:
+            requests.Session: The pooled session
+        """
+
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self._pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._sessions[host] = session
+                self._stats[host] = {"requests": 0, "retries": 0, "errors": 0, "bytes": 0}
+            return session
+
+    def _count(self, host: str, **increments) -> None:
+        with self._lock:
+            for name, value in increments.items():
+                self._stats[host][name] += value
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Sends a request over the pooled session of the host.
+
+        Parameters:
+            method (str): The HTTP method
+            url (str): The URL
+            **kwargs: Further arguments for requests (e.g., headers, json, stream, timeout)
+
+        Returns:
+            requests.Response: The response
+        """
+
+        host = urlsplit(url).netloc
+        session = self._session(host)
+        kwargs.setdefault("timeout", self._timeout)
+        max_retries = self._max_retries if method.upper() in self.RETRY_METHODS else 0
+        for attempt in range(max_retries + 1):
+            try:
+                response = session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._count(host, requests=1, errors=1)
+                if attempt == max_retries:
+                    raise
+                reason = type(e).__name__
+            else:
+                n_bytes = int(response.headers.get("Content-Length", 0)) if kwargs.get("stream") \
+                    else len(response.content)
+                self._count(host, requests=1, bytes=n_bytes)
+                if response.status_code not in self.RETRY_STATUS_CODES or attempt == max_retries:
+                    return response
+                reason = f"status {response.status_code}"
+            delay = random.uniform(0, self._backoff * 2 ** attempt)  # full jitter
+            logger.warning(f"Request to {host} failed ({reason}), retrying in {delay:.2f} seconds...")
+            self._count(host, retries=1)
+            time.sleep(delay)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def stats(self) -> dict:
+        """
+        Collects the traffic of this process.
+
+        Returns:
+            dict: Requests, retries, errors and received bytes per host
+        """
+
+        with self._lock:
+            return {host: dict(counters) for host, counters in self._stats.items()}
+
+
+@functools.cache
+def get_http_client() -> HttpClient:
+    """
+    Returns the process-wide HTTP client, created on first use.
+
+    Returns:
+        HttpClient: The shared client
+    """
+
+    config = get_config()
+    return HttpClient(timeout=config.http_timeout, max_retries=config.http_max_retries)
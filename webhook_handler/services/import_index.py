@@ -0,0 +1,160 @@
+import functools
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from contextlib import contextmanager
+from pathlib import Path
+
+from webhook_handler.core import RepoTree, helpers
+from webhook_handler.core.config import get_config
+
+
+logger = logging.getLogger(__name__)
+
+
+class ImportIndex:
+    """
+    Persistent index of the relative imports of the test suite. The imports of each test file are stored by the
+    SHA of its blob, hence a new commit only parses the test files whose content is not indexed yet. The merged
+    imports are stored by the tree hash of the commit, so repeated lookups of a commit need no parsing at all.
+    """
+    def __init__(self, db_path: Path | str, max_trees: int = 1000, max_blobs: int = 100000):
+        self._db_path = str(db_path)
+        self._max_trees = max_trees
+        self._max_blobs = max_blobs
+        self._lock = threading.Lock()
+        self._stats = {"trees": 0, "parsed_files": 0, "indexed_files": 0}
+        Path(self._db_path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS trees (tree_hash TEXT PRIMARY KEY, imports TEXT NOT NULL, "
+                "last_access REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS blobs (blob_sha TEXT PRIMARY KEY, imports TEXT NOT NULL, "
+                "last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_trees_access ON trees (last_access)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_blobs_access ON blobs (last_access)")
+
+    @contextmanager
+    def _connect(self):
+        """
+        Opens a short-lived connection in autocommit mode.
+        """
+
+        conn = sqlite3.connect(self._db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _count(self, outcome: str, n: int = 1) -> None:
+        with self._lock:
+            self._stats[outcome] += n
+
+    def relative_imports(self, repo_tree: RepoTree) -> str:
+        """
+        Collects the relative imports of all test files of a commit.
+
+        Parameters:
+            repo_tree (RepoTree): The files of the commit
+
+        Returns:
+            str: All the relative imports
+        """
+
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT imports FROM trees WHERE tree_hash = ?", (repo_tree.tree_hash,)).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE trees SET last_access = ? WHERE tree_hash = ?", (now, repo_tree.tree_hash)
+                )
+                self._count("trees")
+                return row["imports"]
+
+        test_files = {repo_tree.blob_sha(path): path for path in helpers.list_test_files(repo_tree)}
+        file_imports = {}
+        with self._connect() as conn:
+            blob_shas = list(test_files)
+            for i in range(0, len(blob_shas), 500):  # stay below the SQLite variable limit
+                chunk = blob_shas[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT blob_sha, imports FROM blobs WHERE blob_sha IN ({', '.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                for row in rows:
+                    file_imports[row["blob_sha"]] = json.loads(row["imports"])
+            conn.executemany(
+                "UPDATE blobs SET last_access = ? WHERE blob_sha = ?", [(now, sha) for sha in file_imports]
+            )
+
+        missing = [path for sha, path in test_files.items() if sha not in file_imports]
+        parsed = {}
+        for path, content in repo_tree.read_texts(missing).items():
+            parsed[repo_tree.blob_sha(path)] = {
+                import_path: sorted(symbols) for import_path, symbols in helpers.parse_relative_imports(content).items()
+            }
+        file_imports.update(parsed)
+        self._count("indexed_files", len(test_files) - len(missing))
+        self._count("parsed_files", len(parsed))
+
+        import_map = {}
+        for imports in file_imports.values():
+            for import_path, symbols in imports.items():
+                import_map.setdefault(import_path, set()).update(symbols)
+        relative_imports = helpers.format_relative_imports(import_map)
+
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO blobs (blob_sha, imports, last_access) VALUES (?, ?, ?)",
+                [(sha, json.dumps(imports), now) for sha, imports in parsed.items()]
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO trees (tree_hash, imports, last_access) VALUES (?, ?, ?)",
+                (repo_tree.tree_hash, relative_imports, now)
+            )
+        logger.info(f"Relative imports indexed ({len(parsed)} of {len(test_files)} test files parsed)")
+        self._evict()
+        return relative_imports
+
+    def _evict(self) -> None:
+        """
+        Removes the least recently used trees and blobs until the index fits into its entry limits.
+        """
+
+        with self._connect() as conn:
+            for table, key, limit in [("trees", "tree_hash", self._max_trees), ("blobs", "blob_sha", self._max_blobs)]:
+                conn.execute(
+                    f"DELETE FROM {table} WHERE {key} IN (SELECT {key} FROM {table} ORDER BY last_access DESC "
+                    f"LIMIT -1 OFFSET ?)",
+                    (limit,)
+                )
+
+    def stats(self) -> dict:
+        """
+        Collects the usage of the index by this process.
+
+        Returns:
+            dict: Commits served from the index, test files parsed and test files served from the index
+        """
+
+        with self._lock:
+            return dict(self._stats)
+
+
+@functools.cache
+def get_import_index() -> ImportIndex:
+    """
+    Returns the process-wide import index, created on first use.
+
+    Returns:
+        ImportIndex: The shared index
+    """
+
+    return ImportIndex(get_config().import_index_path)
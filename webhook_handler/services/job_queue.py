@@ -0,0 +1,266 @@
+import logging
+import contextvars
+import threading
+import time
+
+from typing import Callable
+
+from webhook_handler.core.cancellation import CancellationToken
+from webhook_handler.data_models.job_state import JobState
+from webhook_handler.services.job_store import JobStore
+
+
+bootstrap = logging.getLogger("bootstrap")
+
+
+class JobQueue:
+    """
+    Bounded job queue which is served by a fixed number of worker threads. Jobs are persisted in the
+    JobStore and claimed atomically, hence several server processes can share one queue. Running jobs
+    receive a CancellationToken which is triggered if the job is cancelled by any of these processes.
+    """
+    def __init__(
+            self,
+            job_store: JobStore,
+            handler: Callable[[dict, JobStore, CancellationToken], tuple[JobState, str]],
+            max_workers: int,
+            max_queue_size: int,
+            poll_interval: float = 5.0,
+            cancel_poll_interval: float = 1.0
+    ):
+        self._job_store = job_store
+        self._handler = handler
+        self._max_workers = max_workers
+        self._max_queue_size = max_queue_size
+        self._poll_interval = poll_interval
+        self._cancel_poll_interval = cancel_poll_interval
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._stopped = threading.Event()
+        self._workers = []
+        self._tokens = {}  # job ID -> token of the jobs running in this process
+        self._active_jobs = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._cancelled = 0
+        self._rejected = 0
+        self._rejected_jobs = 0
+        self._duplicates = 0
+        self._total_wait_time = 0.0
+
+    @property
+    def job_store(self) -> JobStore:
+        return self._job_store
+
+    def start(self) -> None:
+        """
+        Re-queues jobs interrupted by a previous shutdown and starts the worker threads together with a
+        watcher for cancellations requested by other processes.
+        """
+
+        with self._lock:
+            if self._workers:
+                return
+            self._stopped.clear()
+            recovered = self._job_store.recover()
+            if recovered:
+                bootstrap.warning(f"Resuming {recovered} interrupted job(s)")
+            for i in range(self._max_workers):
+                worker = threading.Thread(target=self._work, name=f"pipeline-worker-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+            watcher = threading.Thread(target=self._watch_cancellations, name="pipeline-cancel-watcher", daemon=True)
+            watcher.start()
+            self._workers.append(watcher)
+
+    def stop(self, timeout: float = None) -> None:
+        """
+        Stops the worker threads and the watcher. Running jobs are finished first.
+
+        Parameters:
+            timeout (float, optional): Seconds to wait for each thread
+        """
+
+        with self._wakeup:
+            self._stopped.set()
+            self._wakeup.notify_all()
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.join(timeout)
+
+    def submit(
+            self,
+            payload: dict,
+            pr_number: int,
+            pr_id: str,
+            head_commit: str,
+            execution_timestamp: str,
+            delivery_id: str = None
+    ) -> [dict | None, bool]:
+        """
+        Persists a job and wakes up a worker without blocking. Repeated deliveries and events for an
+        already processed head commit are attached to the existing job instead.
+
+        Parameters:
+            payload (dict): The webhook payload
+            pr_number (int): The number of the PR
+            pr_id (str): The ID of the PR
+            head_commit (str): The head commit of the PR
+            execution_timestamp (str): The timestamp used for the log directory of the job
+            delivery_id (str, optional): The ID of the webhook delivery
+
+        Returns:
+            dict | None: The new or the existing job, or None if the queue is full
+            bool: True if a new job was queued, False otherwise
+        """
+
+        self.start()
+        job, created = self._job_store.enqueue(
+            payload,
+            pr_number,
+            pr_id,
+            head_commit,
+            execution_timestamp,
+            delivery_id=delivery_id,
+            max_queued=self._max_queue_size
+        )
+        if job is None:
+            with self._lock:
+                self._rejected += 1
+            bootstrap.warning(f"[#{pr_number}] Job queue is full ({self._max_queue_size} jobs)")
+            return None, False
+        if not created:
+            with self._lock:
+                self._duplicates += 1
+            bootstrap.info(f"[#{pr_number}] Duplicate event attached to job {job['id']} ({job['state']})")
+            return job, False
+
+        with self._wakeup:
+            self._submitted += 1
+            self._wakeup.notify()
+        bootstrap.info(f"[#{pr_number}] Job {job['id']} queued")
+        return job, True
+
+    def cancel(self, pr_id: str, reason: str, keep_head_commit: str = None) -> int:
+        """
+        Cancels all unfinished jobs of a PR. Running jobs of this process are stopped right away, those of
+        other processes once their watcher picks up the request.
+
+        Parameters:
+            pr_id (str): The ID of the PR
+            reason (str): Why the jobs are cancelled
+            keep_head_commit (str, optional): Jobs for this head commit are not cancelled
+
+        Returns:
+            int: Number of running jobs which are being stopped
+        """
+
+        job_ids = self._job_store.request_cancel(pr_id, reason, keep_head_commit=keep_head_commit)
+        for job_id in job_ids:
+            self._cancel_token(job_id, reason)
+        return len(job_ids)
+
+    def _cancel_token(self, job_id: str, reason: str) -> None:
+        """
+        Triggers the token of a job if it runs in this process.
+
+        Parameters:
+            job_id (str): The ID of the job
+            reason (str): Why the job is cancelled
+        """
+
+        with self._lock:
+            token = self._tokens.get(job_id)
+        if token is not None and not token.is_cancelled:
+            bootstrap.warning(f"Cancelling job {job_id} ({reason})")
+            token.cancel(reason)
+
+    def _watch_cancellations(self) -> None:
+        """
+        Watcher loop: stops running jobs of this process which were cancelled through another process.
+        """
+
+        while not self._stopped.wait(self._cancel_poll_interval):
+            with self._lock:
+                job_ids = list(self._tokens)
+            try:
+                for job_id, reason in self._job_store.cancel_requests(job_ids).items():
+                    self._cancel_token(job_id, reason)
+            except Exception as e:
+                bootstrap.error(f"Failed to check for cancelled jobs: {e}")
+
+    def metrics(self) -> dict:
+        """
+        Collects the current state of the queue.
+
+        Returns:
+            dict: Queue depth, worker utilization, job counters and persisted jobs per state
+        """
+
+        jobs_by_state = self._job_store.count_by_state()
+        with self._lock:
+            started = self._completed + self._failed + self._cancelled + self._rejected_jobs + self._active_jobs
+            return {
+                "queue_depth": jobs_by_state[JobState.QUEUED],
+                "max_queue_size": self._max_queue_size,
+                "active_workers": self._active_jobs,
+                "max_workers": self._max_workers,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "cancelled": self._cancelled,
+                "rejected": self._rejected_jobs,
+                "rejected_queue_full": self._rejected,
+                "duplicates": self._duplicates,
+                "avg_wait_seconds": round(self._total_wait_time / started, 3) if started else 0.0,
+                "jobs_by_state": jobs_by_state,
+            }
+
+    def _work(self) -> None:
+        """
+        Worker loop: claims jobs from the store and executes them one after another.
+        """
+
+        while not self._stopped.is_set():
+            try:
+                job = self._job_store.claim_next()
+            except Exception as e:
+                bootstrap.error(f"Failed to claim job: {e}")
+                job = None
+            if job is None:
+                with self._wakeup:
+                    if not self._stopped.is_set():
+                        self._wakeup.wait(timeout=self._poll_interval)  # jobs of other processes are found by polling
+                continue
+
+            token = CancellationToken()
+            with self._lock:
+                self._active_jobs += 1
+                self._total_wait_time += time.time() - job["created_at"]
+                self._tokens[job["id"]] = token
+            try:
+                if job["cancel_reason"]:  # cancelled between claim and start
+                    token.cancel(job["cancel_reason"])
+                # fresh context per job, so that job-scoped state (e.g., the log file) never leaks into the next job
+                state, message = contextvars.copy_context().run(self._handler, job, self._job_store, token)
+                self._job_store.update(job["id"], state, message=message)
+                with self._lock:
+                    if state == JobState.CANCELLED:
+                        self._cancelled += 1
+                    elif state == JobState.REJECTED:
+                        self._rejected_jobs += 1
+                    else:
+                        self._completed += 1
+            except Exception as e:
+                bootstrap.critical(f"[#{job['pr_number']}] Job {job['id']} failed: {e}")
+                try:
+                    self._job_store.update(job["id"], JobState.FAILED, message=str(e))
+                except Exception as store_error:  # the worker must survive, the job is recovered after a restart
+                    bootstrap.error(f"Failed to mark job {job['id']} as failed: {store_error}")
+                with self._lock:
+                    self._failed += 1
+            finally:
+                with self._lock:
+                    self._active_jobs -= 1
+                    self._tokens.pop(job["id"], None)
@@ -0,0 +1,421 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+import logging
+
+from contextlib import contextmanager
+from pathlib import Path
+
+from webhook_handler.data_models.job_state import JobState
+
+
+bootstrap = logging.getLogger("bootstrap")
+
+
+class JobStore:
+    """
+    Persists pipeline jobs in SQLite so that they survive restarts of the server.
+    """
+    _COLUMNS = {
+        "id":                  "TEXT PRIMARY KEY",
+        "pr_number":           "INTEGER NOT NULL",
+        "pr_id":               "TEXT NOT NULL",
+        "delivery_id":         "TEXT",
+        "head_commit":         "TEXT NOT NULL",
+        "payload":             "TEXT NOT NULL",
+        "execution_timestamp": "TEXT NOT NULL",
+        "state":               "TEXT NOT NULL",
+        "model":               "TEXT",
+        "attempt":             "INTEGER NOT NULL DEFAULT 0",  # number of finished attempts
+        "prepared":            "INTEGER NOT NULL DEFAULT 0",  # environment (clone, image) is available
+        "message":             "TEXT",
+        "cancel_reason":       "TEXT",  # cancellation requested for a running job
+        "worker":              "TEXT",
+        "created_at":          "REAL NOT NULL",
+        "updated_at":          "REAL NOT NULL",
+    }
+
+    _ACTIVE_STATES = tuple(state.value for state in JobState if not state.is_terminal and state != JobState.QUEUED)
+
+    def __init__(self, db_path: Path | str):
+        self._db_path = str(db_path)
+        self._lock = threading.Lock()
+        self._worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            columns = ", ".join(f"{name} {definition}" for name, definition in self._COLUMNS.items())
+            conn.execute(f"CREATE TABLE IF NOT EXISTS jobs ({columns})")
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for name, definition in self._COLUMNS.items():
+                if name not in existing:  # tables created by an older version
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition.replace('PRIMARY KEY', '')}")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_delivery ON jobs (delivery_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_head ON jobs (pr_id, head_commit)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots "
+                "(pr_id TEXT PRIMARY KEY, head_commit TEXT NOT NULL, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    @property
+    def worker_id(self) -> str:
+        return self._worker_id
+
+    @contextmanager
+    def _connect(self):
+        """
+        Opens a short-lived connection in autocommit mode.
+        """
+
+        conn = sqlite3.connect(self._db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(
+            self,
+            payload: dict,
+            pr_number: int,
+            pr_id: str,
+            head_commit: str,
+            execution_timestamp: str,
+            delivery_id: str = None,
+            max_queued: int = None
+    ) -> [dict | None, bool]:
+        """
+        Persists a new job in state QUEUED unless the same delivery or the same head commit of the PR
+        has already been processed or is in progress. Failed and cancelled jobs do not count as processed.
+
+        Parameters:
+            payload (dict): The webhook payload
+            pr_number (int): The number of the PR
+            pr_id (str): The ID of the PR
+            head_commit (str): The head commit of the PR
+            execution_timestamp (str): The timestamp used for the log directory of the job
+            delivery_id (str, optional): The ID of the webhook delivery
+            max_queued (int, optional): The maximum number of queued jobs
+
+        Returns:
+            dict | None: The new or the existing job, or None if the queue is full
+            bool: True if a new job was created, False otherwise
+        """
+
+        with self._lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                existing = None
+                if delivery_id:
+                    existing = conn.execute(
+                        "SELECT * FROM jobs WHERE delivery_id = ? AND state NOT IN (?, ?) "
+                        "ORDER BY created_at DESC LIMIT 1",
+                        (delivery_id, JobState.FAILED, JobState.CANCELLED)
+                    ).fetchone()
+                if existing is None:
+                    existing = conn.execute(
+                        "SELECT * FROM jobs WHERE pr_id = ? AND head_commit = ? AND state NOT IN (?, ?) "
+                        "ORDER BY created_at DESC LIMIT 1",
+                        (pr_id, head_commit, JobState.FAILED, JobState.CANCELLED)
+                    ).fetchone()
+                if existing is not None:
+                    conn.execute("COMMIT")
+                    return dict(existing), False
+
+                if max_queued is not None:
+                    n_queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE state = ?", (JobState.QUEUED,)).fetchone()[0]
+                    if n_queued >= max_queued:
+                        conn.execute("COMMIT")
+                        return None, False
+
+                job_id = uuid.uuid4().hex
+                now = time.time()
+                conn.execute(
+                    "INSERT INTO jobs (id, pr_number, pr_id, delivery_id, head_commit, payload, execution_timestamp, "
+                    "state, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, pr_number, pr_id, delivery_id, head_commit, json.dumps(payload), execution_timestamp,
+                     JobState.QUEUED, now, now)
+                )
+                job = dict(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return job, True
+
+    def claim_next(self) -> dict | None:
+        """
+        Atomically moves the oldest queued job to state PREPARING and assigns it to this process. Jobs of a PR
+        which already has a running job wait, since both would share the clone and the image of the PR.
+
+        Returns:
+            dict | None: The claimed job, or None if no job is queued
+        """
+
+        with self._lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                placeholders = ", ".join("?" for _ in self._ACTIVE_STATES)
+                row = conn.execute(
+                    f"SELECT * FROM jobs WHERE state = ? AND pr_id NOT IN "
+                    f"(SELECT pr_id FROM jobs WHERE state IN ({placeholders})) ORDER BY created_at LIMIT 1",
+                    (JobState.QUEUED, *self._ACTIVE_STATES)
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET state = ?, worker = ?, updated_at = ? WHERE id = ?",
+                    (JobState.PREPARING, self._worker_id, time.time(), row["id"])
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        job = dict(row)
+        job["state"] = JobState.PREPARING
+        return job
+
+    def update(self, job_id: str, state: JobState, **fields) -> None:
+        """
+        Moves a job to a new state.
+
+        Parameters:
+            job_id (str): The ID of the job
+            state (JobState): The new state
+            **fields: Further columns to update (e.g., attempt, model, prepared, message)
+        """
+
+        fields = {"state": state, "updated_at": time.time(), **fields}
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id: str) -> dict | None:
+        """
+        Fetches a job.
+
+        Parameters:
+            job_id (str): The ID of the job
+
+        Returns:
+            dict | None: The job, or None if it does not exist
+        """
+
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def count_by_state(self) -> dict:
+        """
+        Counts jobs per state.
+
+        Returns:
+            dict: Number of jobs for every state
+        """
+
+        counts = {state.value: 0 for state in JobState}
+        with self._connect() as conn:
+            for row in conn.execute("SELECT state, COUNT(*) AS n FROM jobs GROUP BY state"):
+                counts[row["state"]] = row["n"]
+        return counts
+
+    def request_cancel(self, pr_id: str, reason: str, keep_head_commit: str = None) -> list[str]:
+        """
+        Cancels all unfinished jobs of a PR. Queued jobs are cancelled right away, running jobs are flagged
+        and stopped by the process executing them.
+
+        Parameters:
+            pr_id (str): The ID of the PR
+            reason (str): Why the jobs are cancelled
+            keep_head_commit (str, optional): Jobs for this head commit are not cancelled
+
+        Returns:
+            list[str]: The IDs of the running jobs which have to be stopped
+        """
+
+        placeholders = ", ".join("?" for _ in self._ACTIVE_STATES)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "UPDATE jobs SET state = ?, message = ?, updated_at = ? "
+                    "WHERE pr_id = ? AND state = ? AND head_commit IS NOT ?",
+                    (JobState.CANCELLED, f"Cancelled ({reason})", now, pr_id, JobState.QUEUED, keep_head_commit)
+                )
+                rows = conn.execute(
+                    f"SELECT id FROM jobs WHERE pr_id = ? AND state IN ({placeholders}) AND head_commit IS NOT ?",
+                    (pr_id, *self._ACTIVE_STATES, keep_head_commit)
+                ).fetchall()
+                job_ids = [row["id"] for row in rows]
+                conn.executemany(
+                    "UPDATE jobs SET cancel_reason = ?, updated_at = ? WHERE id = ?",
+                    [(reason, now, job_id) for job_id in job_ids]
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return job_ids
+
+    def cancel_requests(self, job_ids: list[str]) -> dict:
+        """
+        Looks up which of the given jobs have been flagged for cancellation.
+
+        Parameters:
+            job_ids (list[str]): The IDs of running jobs
+
+        Returns:
+            dict: The reason of every flagged job, keyed by job ID
+        """
+
+        if not job_ids:
+            return {}
+        placeholders = ", ".join("?" for _ in job_ids)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT id, cancel_reason FROM jobs WHERE id IN ({placeholders}) AND cancel_reason IS NOT NULL",
+                job_ids
+            ).fetchall()
+        return {row["id"]: row["cancel_reason"] for row in rows}
+
+    def save_snapshot(self, pr_id: str, head_commit: str, snapshot: dict) -> None:
+        """
+        Stores the prepared inputs of the latest push to a PR, so that later pushes only redo what changed.
+
+        Parameters:
+            pr_id (str): The ID of the PR
+            head_commit (str): The head commit the snapshot was prepared for
+            snapshot (dict): The prepared inputs
+        """
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO snapshots (pr_id, head_commit, data, updated_at) VALUES (?, ?, ?, ?)",
+                (pr_id, head_commit, json.dumps(snapshot), time.time())
+            )
+
+    def load_snapshot(self, pr_id: str) -> dict | None:
+        """
+        Fetches the prepared inputs of the latest push to a PR.
+
+        Parameters:
+            pr_id (str): The ID of the PR
+
+        Returns:
+            dict | None: The prepared inputs, or None if the PR has not been prepared yet
+        """
+
+        with self._connect() as conn:
+            row = conn.execute("SELECT data FROM snapshots WHERE pr_id = ?", (pr_id,)).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def delete_snapshot(self, pr_id: str) -> None:
+        """
+        Removes the prepared inputs of a PR.
+
+        Parameters:
+            pr_id (str): The ID of the PR
+        """
+
+        with self._connect() as conn:
+            conn.execute("DELETE FROM snapshots WHERE pr_id = ?", (pr_id,))
+
+    def expired_snapshots(self, max_kept: int, max_age: float) -> list[dict]:
+        """
+        Finds the PRs whose kept artifacts exceed the retention limits: all but the most recently prepared
+        PRs and those prepared too long ago. PRs with unfinished jobs are skipped.
+
+        Parameters:
+            max_kept (int): The maximum number of PRs whose artifacts are kept
+            max_age (float): The maximum time in seconds artifacts are kept after their last preparation
+
+        Returns:
+            list[dict]: The payload of the latest job of each expired PR
+        """
+
+        terminal_states = [state for state in JobState if state.is_terminal]
+        placeholders = ", ".join("?" * len(terminal_states))
+        with self._connect() as conn:
+            rows = conn.execute("SELECT pr_id, updated_at FROM snapshots ORDER BY updated_at DESC").fetchall()
+            expired = [
+                row["pr_id"] for i, row in enumerate(rows)
+                if i >= max_kept or row["updated_at"] < time.time() - max_age
+            ]
+            payloads = []
+            for pr_id in expired:
+                n_unfinished = conn.execute(
+                    f"SELECT COUNT(*) FROM jobs WHERE pr_id = ? AND state NOT IN ({placeholders})",
+                    (pr_id, *terminal_states)
+                ).fetchone()[0]
+                if n_unfinished:
+                    continue
+                job = conn.execute(
+                    "SELECT payload FROM jobs WHERE pr_id = ? ORDER BY created_at DESC LIMIT 1", (pr_id,)
+                ).fetchone()
+                if job is not None:
+                    payloads.append(json.loads(job["payload"]))
+        return payloads
+
+    def recover(self) -> int:
+        """
+        Re-queues jobs whose worker process no longer exists. Finished attempts and the prepared
+        environment are kept so that the job resumes where it was interrupted. Jobs flagged for
+        cancellation are cancelled instead.
+
+        Returns:
+            int: Number of recovered jobs
+        """
+
+        placeholders = ", ".join("?" for _ in self._ACTIVE_STATES)
+        recovered = 0
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT id, pr_number, worker, cancel_reason FROM jobs WHERE state IN ({placeholders})",
+                self._ACTIVE_STATES
+            ).fetchall()
+            for row in rows:
+                if self._is_worker_alive(row["worker"]):
+                    continue
+                if row["cancel_reason"]:
+                    conn.execute(
+                        "UPDATE jobs SET state = ?, message = ?, updated_at = ? WHERE id = ?",
+                        (JobState.CANCELLED, f"Cancelled ({row['cancel_reason']})", time.time(), row["id"])
+                    )
+                    continue
+                conn.execute(
+                    "UPDATE jobs SET state = ?, worker = NULL, updated_at = ? WHERE id = ? AND worker IS ?",
+                    (JobState.QUEUED, time.time(), row["id"], row["worker"])
+                )
+                bootstrap.warning(f"[#{row['pr_number']}] Interrupted job {row['id']} re-queued")
+                recovered += 1
+        return recovered
+
+    def _is_worker_alive(self, worker: str | None) -> bool:
+        """
+        Checks whether the process owning a job is still running on this host.
+
+        Parameters:
+            worker (str | None): Worker ID in the form <hostname>:<pid>
+
+        Returns:
+            bool: True if the worker is still running, False otherwise
+        """
+
+        if not worker:
+            return False
+        hostname, _, pid = worker.rpartition(":")
+        if hostname != socket.gethostname():
+            return True  # cannot be verified from here
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return False
+        except (PermissionError, ValueError):
+            return True
+        return True
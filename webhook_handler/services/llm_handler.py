@@ -4,6 +4,7 @@ from openai import OpenAI
 from groq import Groq
 
 from webhook_handler.core.config import Config
+from webhook_handler.core.deadline import Deadline
 from webhook_handler.data_models.llm_enum import LLM
 from webhook_handler.data_models.pipeline_inputs import PipelineInputs
 
@@ -12,8 +13,10 @@ class LLMHandler:
     """
     Used to interact with LLMs.
     """
-    def __init__(self, config: Config, data: PipelineInputs):
+    def __init__(self, config: Config, data: PipelineInputs, deadline: Deadline = None):
         self._pipeline_inputs = data
+        self._query_timeout = config.stage_timeouts["llm_query"]
+        self._deadline = deadline or Deadline(None)
         self._pr_data = data.pr_data
         self._pr_diff_ctx = data.pr_diff_ctx
         self._openai_client = OpenAI(api_key=config.openai_api_key)
@@ -169,7 +172,7 @@ class LLMHandler:
 
     def query_model(self, prompt: str, model: LLM, temperature: float = 0.0) -> str:
         """
-        Query a model and return its results.
+        Query a model and return its results. The request is aborted once the time budget is used up.
 
         Parameters:
             prompt (str): Prompt to ask for
@@ -180,18 +183,21 @@ class LLMHandler:
             str: Response from model
         """
 
+        timeout = self._deadline.timeout(self._query_timeout)
         try:
             if model == LLM.GPT4o:
                 response = self._openai_client.chat.completions.create(
                     model=model,
                     messages=[{"role": "user", "content": prompt}],
-                    temperature=temperature
+                    temperature=temperature,
+                    timeout=timeout
                 )
                 return response.choices[0].message.content.strip()
             elif model == LLM.GPTo3_MINI:  # does not accept temperature
                 response = self._openai_client.chat.completions.create(
                     model=model,
                     messages=[{"role": "user", "content": prompt}],
+                    timeout=timeout
                 )
                 return response.choices[0].message.content.strip()
             elif model == LLM.LLAMA:
@@ -199,7 +205,8 @@ class LLMHandler:
                     model=model,
                     messages=[{"role": "user", "content": prompt}],
                     max_tokens=700,
-                    temperature=temperature
+                    temperature=temperature,
+                    timeout=timeout
                 )
                 return completion.choices[0].message.content
             elif model == LLM.DEEPSEEK:
@@ -209,7 +216,8 @@ class LLMHandler:
                         {"role": "system",
                          "content": "You are an experienced software tester specializing in developing regression tests. Follow the user's instructions for generating a regression test. The output format is STRICT: do all your reasoning in the beginning, but the end of your output should ONLY contain javascript code, i.e., NO natural language after the code."},
                         {"role": "user", "content": prompt}
-                    ]
+                    ],
+                    timeout=timeout
                 )
                 return response.choices[0].message.content
         except:
@@ -0,0 +1,263 @@
+import functools
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import requests
+
+from contextlib import contextmanager
+from pathlib import Path
+
+from webhook_handler.core.config import get_config
+from webhook_handler.services.http_client import get_http_client
+
+
+logger = logging.getLogger(__name__)
+
+
+class PdfCache:
+    """
+    Content-addressed cache of reference PDFs on disk. Downloads are streamed to disk with a size limit and a
+    timeout, an SQLite index maps each source (URL or commit and path) to the digest of its content, so repeated
+    runs skip the download. PDFs are handed on as file paths instead of being held in memory, linked into the
+    directory of the job so that evictions by other jobs cannot remove them while they are in use.
+    """
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(
+            self,
+            cache_dir: Path | str,
+            max_pdf_bytes: int,
+            max_bytes: int,
+            timeout: float,
+            http_timeout: tuple[float, float] = (5, 30)
+    ):
+        self._cache_dir = Path(cache_dir)
+        self._objects_dir = Path(self._cache_dir, "objects")
+        self._db_path = str(Path(self._cache_dir, "index.sqlite3"))
+        self._max_pdf_bytes = max_pdf_bytes
+        self._max_bytes = max_bytes
+        self._timeout = timeout
+        self._http_timeout = http_timeout
+        self._objects_dir.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sources (source TEXT PRIMARY KEY, digest TEXT NOT NULL, "
+                "size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sources_access ON sources (last_access)")
+
+    @contextmanager
+    def _connect(self):
+        """
+        Opens a short-lived connection in autocommit mode.
+        """
+
+        conn = sqlite3.connect(self._db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _object_path(self, digest: str) -> Path:
+        return Path(self._objects_dir, f"{digest}.pdf")
+
+    def get(self, source: str) -> Path | None:
+        """
+        Looks up a PDF.
+
+        Parameters:
+            source (str): The URL or commit and path of the PDF
+
+        Returns:
+            Path | None: The path of the cached PDF, or None on a cache miss
+        """
+
+        with self._connect() as conn:
+            row = conn.execute("SELECT digest FROM sources WHERE source = ?", (source,)).fetchone()
+            if row is None or not self._object_path(row["digest"]).exists():
+                return None
+            conn.execute("UPDATE sources SET last_access = ? WHERE source = ?", (time.time(), source))
+        return self._object_path(row["digest"])
+
+    def put(self, source: str, content: bytes) -> Path | None:
+        """
+        Stores a PDF which is already in memory.
+
+        Parameters:
+            source (str): The URL or commit and path of the PDF
+            content (bytes): The content
+
+        Returns:
+            Path | None: The path of the cached PDF, or None if it exceeds the size limit
+        """
+
+        if len(content) > self._max_pdf_bytes:
+            logger.warning(f"PDF {source} exceeds the size limit of {self._max_pdf_bytes} bytes")
+            return None
+        fd, tmp_path = tempfile.mkstemp(dir=self._objects_dir)
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        return self._store(source, tmp_path, hashlib.sha256(content).hexdigest(), len(content))
+
+    def download(self, url: str) -> Path | None:
+        """
+        Streams a PDF to disk unless it is already cached. Downloads exceeding the size limit or the timeout are
+        aborted.
+
+        Parameters:
+            url (str): The URL of the PDF
+
+        Returns:
+            Path | None: The path of the cached PDF, or None if the download failed
+        """
+
+        cached = self.get(url)
+        if cached is not None:
+            logger.info(f"PDF {url} served from cache")
+            return cached
+
+        try:
+            response = get_http_client().get(url, stream=True, timeout=self._http_timeout)
+        except requests.RequestException as e:
+            logger.warning(f"Failed to download PDF {url}: {e}")
+            return None
+        with response:
+            if response.status_code != 200:
+                logger.warning(f"Failed to download PDF {url}: status {response.status_code}")
+                return None
+            if int(response.headers.get("Content-Length") or 0) > self._max_pdf_bytes:
+                logger.warning(f"PDF {url} exceeds the size limit of {self._max_pdf_bytes} bytes")
+                return None
+
+            fd, tmp_path = tempfile.mkstemp(dir=self._objects_dir)
+            digest, size, failure = hashlib.sha256(), 0, None
+            start = time.monotonic()
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    for chunk in response.iter_content(self.CHUNK_SIZE):
+                        size += len(chunk)
+                        if size > self._max_pdf_bytes:
+                            failure = f"exceeds the size limit of {self._max_pdf_bytes} bytes"
+                            break
+                        if time.monotonic() - start > self._timeout:
+                            failure = f"exceeds the timeout of {self._timeout} seconds"
+                            break
+                        digest.update(chunk)
+                        f.write(chunk)
+            except requests.RequestException as e:
+                failure = str(e)
+            if failure is not None:
+                os.unlink(tmp_path)
+                logger.warning(f"Download of PDF {url} aborted: {failure}")
+                return None
+        return self._store(url, tmp_path, digest.hexdigest(), size)
+
+    def link(self, object_path: Path, target_path: Path) -> Path | None:
+        """
+        Hands a cached PDF to a job as a hard link, or as a copy if the file system does not support links.
+
+        Parameters:
+            object_path (Path): The path of the cached PDF
+            target_path (Path): The path in the directory of the job
+
+        Returns:
+            Path | None: The target path, or None if the PDF was evicted in the meantime
+        """
+
+        target_path.parent.mkdir(parents=True, exist_ok=True)
+        target_path.unlink(missing_ok=True)
+        try:
+            os.link(object_path, target_path)
+        except FileNotFoundError:
+            return None
+        except OSError:
+            try:
+                shutil.copyfile(object_path, target_path)
+            except FileNotFoundError:
+                return None
+        return target_path
+
+    def _store(self, source: str, tmp_path: str, digest: str, size: int) -> Path:
+        """
+        Moves a written PDF to its content address and indexes its source.
+
+        Parameters:
+            source (str): The URL or commit and path of the PDF
+            tmp_path (str): The temporary file holding the content
+            digest (str): The SHA-256 digest of the content
+            size (int): The size of the content in bytes
+
+        Returns:
+            Path: The path of the cached PDF
+        """
+
+        object_path = self._object_path(digest)
+        os.replace(tmp_path, object_path)  # readers never see partially written PDFs
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sources (source, digest, size, last_access) VALUES (?, ?, ?, ?)",
+                (source, digest, size, time.time())
+            )
+        self._evict(keep=digest)
+        return object_path
+
+    def _evict(self, keep: str) -> None:
+        """
+        Removes the least recently used PDFs until the distinct contents fit into the size limit.
+
+        Parameters:
+            keep (str): The digest of the PDF which was just stored
+        """
+
+        removed_digests = set()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                total = conn.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT digest, size FROM sources)"
+                ).fetchone()[0]
+                if total > self._max_bytes:
+                    rows = conn.execute(
+                        "SELECT source, digest, size FROM sources WHERE digest != ? ORDER BY last_access", (keep,)
+                    ).fetchall()
+                    for row in rows:
+                        conn.execute("DELETE FROM sources WHERE source = ?", (row["source"],))
+                        if not conn.execute(
+                                "SELECT 1 FROM sources WHERE digest = ? LIMIT 1", (row["digest"],)).fetchone():
+                            removed_digests.add(row["digest"])
+                            total -= row["size"]
+                        if total <= self._max_bytes:
+                            break
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        for digest in removed_digests:
+            self._object_path(digest).unlink(missing_ok=True)
+        if removed_digests:
+            logger.info(f"Evicted {len(removed_digests)} PDF(s) from the PDF cache")
+
+
+@functools.cache
+def get_pdf_cache() -> PdfCache:
+    """
+    Returns the process-wide PDF cache, created on first use.
+
+    Returns:
+        PdfCache: The shared cache
+    """
+
+    config = get_config()
+    return PdfCache(
+        config.pdf_cache_dir,
+        max_pdf_bytes=config.pdf_max_bytes,
+        max_bytes=config.pdf_cache_max_bytes,
+        timeout=config.pdf_download_timeout,
+        http_timeout=config.http_timeout
+    )
@@ -1,8 +1,13 @@
+import contextvars
 import logging
-import requests
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
 
 from webhook_handler.data_models.pr_file_diff import PullRequestFileDiff
 from webhook_handler.services.gh_api import GitHubApi
+from webhook_handler.services.pdf_cache import get_pdf_cache
 
 
 logger = logging.getLogger(__name__)
@@ -12,16 +17,68 @@ class PullRequestDiffContext:
     """
     Holds all the PullRequestFileDiffs for one PR and provides common operations.
     """
-    def __init__(self, base_commit: str, head_commit: str, gh_api: GitHubApi):
+    def __init__(
+            self,
+            base_commit: str,
+            head_commit: str,
+            gh_api: GitHubApi,
+            previous: dict = None,
+            max_workers: int = 8
+    ):
         self._gh_api = gh_api
         self._pr_file_diffs = []
-        raw_files = gh_api.fetch_pr_files()
+        self._fetched_files = {}
+        # snapshot of an earlier push: base versions are reused if the base commit is unchanged,
+        # head versions if the blob SHA of the file is unchanged
+        previous = previous or {}
+        previous_files = previous.get("files", {})
+        same_base = previous.get("base_commit") == base_commit
+        versions = {}  # (file name, is head version) -> content
+        pending = {}  # (file name, is head version) -> future of the content
+        pages = {}  # page number -> raw files
+        # versions of a page are fetched concurrently as soon as the page arrives
+        with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+            for page, page_files in gh_api.iter_pr_file_pages(max_workers):
+                pages[page] = page_files
+                for raw_file in page_files:
+                    file_name = raw_file["filename"]
+                    known = previous_files.get(file_name)
+                    if known and same_base:
+                        versions[(file_name, False)] = known["before"]
+                    else:
+                        pending[(file_name, False)] = executor.submit(
+                            contextvars.copy_context().run, gh_api.fetch_file_version, base_commit, file_name
+                        )
+                    if known and raw_file.get("sha") and known["sha"] == raw_file["sha"]:
+                        versions[(file_name, True)] = known["after"]
+                    else:
+                        pending[(file_name, True)] = executor.submit(
+                            contextvars.copy_context().run, gh_api.fetch_file_version, head_commit, file_name
+                        )
+            versions.update({key: future.result() for key, future in pending.items()})
+        raw_files = [raw_file for page in sorted(pages) for raw_file in pages[page]]
+        if previous_files:
+            logger.info(f"Reused {2 * len(raw_files) - len(pending)} of {2 * len(raw_files)} file versions "
+                        f"from the previous push")
+
         for raw_file in raw_files:
             file_name = raw_file["filename"]
-            before = gh_api.fetch_file_version(base_commit, file_name)
-            after  = gh_api.fetch_file_version(head_commit, file_name)
+            sha = raw_file.get("sha")
+            before, after = versions[(file_name, False)], versions[(file_name, True)]
+            self._fetched_files[file_name] = {"sha": sha, "before": before, "after": after}
             if before != after:
-                self._pr_file_diffs.append(PullRequestFileDiff(file_name, before, after))
+                self._pr_file_diffs.append(PullRequestFileDiff(file_name, before, after, sha))
+
+    @property
+    def files_snapshot(self) -> dict:
+        """
+        Base and head versions of all files of the PR, keyed by file name, to be reused by a later push.
+
+        Returns:
+            dict: The blob SHA and both versions of every file
+        """
+
+        return self._fetched_files
 
     @property
     def source_code_file_diffs(self) -> list[PullRequestFileDiff]:
@@ -53,6 +110,10 @@ class PullRequestDiffContext:
     def code_names(self) -> list[str]:
         return [code_file_diff.name for code_file_diff in self.source_code_file_diffs]
 
+    @property
+    def code_digests(self) -> list[str]:
+        return [code_file_diff.digest for code_file_diff in self.source_code_file_diffs]
+
     @property
     def code_before(self) -> list[str]:
         return [code_file_diff.before for code_file_diff in self.source_code_file_diffs]
@@ -81,37 +142,60 @@ class PullRequestDiffContext:
     def golden_test_patch(self) -> str:
         return "\n\n".join(pr_file_diff.unified_test_diff() for pr_file_diff in self.test_file_diffs) + "\n\n"
 
-    def get_issue_pdf(self, candidate: str, head_commit: str) -> [str, bytes]:
+    def get_issue_pdf(self, candidate: str, head_commit: str, target_dir: Path) -> [str, Path | None]:
         """
-        Returns the name and content of the linked pdf if available.
+        Returns the name and the path of the linked pdf if available. PDFs are kept in the PDF cache on disk and
+        linked into the directory of the job.
 
         Parameters:
             candidate (str): The name of the candidate file
             head_commit (str): The commit hash of the head
+            target_dir (Path): The directory of the job the pdf is linked into
 
         Returns:
             str: The name of the pdf file, or empty if not available
-            bytes: The content of the pdf file, or empty if not available
+            Path | None: The path of the pdf file in the directory of the job, or None if not available
         """
 
+        pdf_cache = get_pdf_cache()
+
+        def _claim(resolve: Callable[[], Path | None], pdf_filename: str) -> Path | None:
+            for _ in range(2):  # another job may evict the cached pdf before it is linked
+                cached_path = resolve()
+                if cached_path is None:
+                    return None
+                pdf_path = pdf_cache.link(cached_path, Path(target_dir, pdf_filename))
+                if pdf_path is not None:
+                    return pdf_path
+            return None
+
         for pr_file_diff in self._pr_file_diffs:
             filename = pr_file_diff.name.split("/")[-1]
             if candidate in filename:
                 if filename.endswith(".pdf"):
-                    content = self._gh_api.fetch_file_version(head_commit, pr_file_diff.name, get_bytes=True)
-                    if content:
+                    source = f"{head_commit}:{pr_file_diff.name}"
+
+                    def _resolve_committed() -> Path | None:
+                        cached_path = pdf_cache.get(source)
+                        if cached_path is None:
+                            content = self._gh_api.fetch_file_version(head_commit, pr_file_diff.name, get_bytes=True)
+                            cached_path = pdf_cache.put(source, content) if content else None
+                        return cached_path
+
+                    pdf_path = _claim(_resolve_committed, filename)
+                    if pdf_path is not None:
                         logger.success("PDF file %s fetched successfully", filename)
-                        return filename, content
+                        return filename, pdf_path
                     logger.warning("Failed to fetch PDF file %s", filename)
                 elif filename.endswith(".link"):
                     url = pr_file_diff.after.rstrip('\n')
                     pdf_filename = filename.replace(".link", "")
                     logger.info("Fetching PDF file %s", url)
-                    response = requests.get(url, stream=True)
-                    if response.status_code == 200:
+                    pdf_path = _claim(lambda: pdf_cache.download(url), pdf_filename)
+                    if pdf_path is not None:
                         logger.success("PDF file %s fetched successfully", pdf_filename)
-                        return pdf_filename, response.content
+                        return pdf_filename, pdf_path
                     logger.warning("Failed to fetch PDF file %s", pdf_filename)
 
         logger.warning("No PDF file available")
-        return "", b""
+        return "", None
@@ -0,0 +1,154 @@
+import functools
+import logging
+import threading
+import time
+import requests
+
+from webhook_handler.core.config import get_config
+from webhook_handler.core.deadline import DeadlineExceeded
+from webhook_handler.data_models.request_priority import RequestPriority
+
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Token bucket per API resource which is shared by all pipelines of the process. The bucket is synchronized
+    with the X-RateLimit-* headers of every response and refilled once the limit resets. Low priority requests
+    leave a reserve for high priority ones and are spread over the rest of the window once the budget runs low,
+    so concurrent pipelines slow down together instead of exhausting the limit.
+    """
+    RATE_LIMIT_STATUS_CODES = (403, 429)
+
+    def __init__(self, reserve: float = 0.1, pace_below: float = 0.5):
+        self._reserve = reserve
+        self._pace_below = pace_below
+        self._cond = threading.Condition()
+        self._buckets = {}
+
+    def _bucket(self, resource: str) -> dict:
+        bucket = self._buckets.get(resource)
+        if bucket is None:
+            bucket = {"limit": None, "remaining": None, "reset_at": None, "next_slot": 0.0, "waits": 0, "waited": 0.0}
+            self._buckets[resource] = bucket
+        return bucket
+
+    def acquire(self, resource: str, priority: RequestPriority, max_wait: float = float("inf")) -> None:
+        """
+        Takes a token from the bucket of a resource and blocks until one is available.
+
+        Parameters:
+            resource (str): The rate limited resource (e.g., the host)
+            priority (RequestPriority): The priority of the request
+            max_wait (float, optional): The maximum time to wait in seconds
+
+        Raises:
+            DeadlineExceeded: If no token becomes available in time
+        """
+
+        start = time.monotonic()
+        with self._cond:
+            bucket = self._bucket(resource)
+            while True:
+                now = time.time()
+                if bucket["reset_at"] is not None and now >= bucket["reset_at"]:
+                    bucket["remaining"], bucket["reset_at"] = bucket["limit"], None  # next response resynchronizes
+                if bucket["remaining"] is None:  # limit not known (yet)
+                    return
+                floor = 0
+                if priority == RequestPriority.LOW and bucket["limit"] is not None:
+                    floor = int(bucket["limit"] * self._reserve)
+                if bucket["remaining"] > floor:
+                    break
+                wait = bucket["reset_at"] - now if bucket["reset_at"] is not None else 1.0
+                if time.monotonic() - start + wait > max_wait:
+                    logger.critical(f"Rate limit of {resource} resets in {wait:.0f} seconds which exceeds the time budget")
+                    raise DeadlineExceeded("Rate limit reset exceeds the time budget")
+                if wait >= 1.0:
+                    logger.warning(f"Rate limit of {resource} exhausted. Waiting for {wait:.0f} seconds...")
+                bucket["waits"] += 1
+                self._cond.wait(max(wait, 0.01))
+
+            bucket["remaining"] -= 1
+            delay = 0.0
+            if (priority == RequestPriority.LOW and bucket["reset_at"] is not None
+                    and bucket["remaining"] < bucket["limit"] * self._pace_below):
+                interval = max(bucket["reset_at"] - now, 0) / (bucket["remaining"] - floor + 1)
+                slot = max(now, bucket["next_slot"])
+                bucket["next_slot"] = slot + interval
+                delay = slot - now
+            bucket["waited"] += time.monotonic() - start + delay
+
+        if delay > 0:
+            if time.monotonic() - start + delay > max_wait:
+                raise DeadlineExceeded("Paced request exceeds the time budget")
+            time.sleep(delay)
+
+    def update(self, resource: str, response: requests.Response) -> bool:
+        """
+        Synchronizes the bucket of a resource with the rate limit headers of a response.
+
+        Parameters:
+            resource (str): The rate limited resource (e.g., the host)
+            response (requests.Response): The response
+
+        Returns:
+            bool: True if the request was rejected due to the rate limit and must be repeated, False otherwise
+        """
+
+        headers = response.headers
+        remaining = int(headers["X-RateLimit-Remaining"]) if "X-RateLimit-Remaining" in headers else None
+        limited = response.status_code in self.RATE_LIMIT_STATUS_CODES and (remaining == 0 or "Retry-After" in headers)
+        if remaining is None and not limited:
+            return False
+
+        with self._cond:
+            bucket = self._bucket(resource)
+            if remaining is not None:
+                reset_at = float(headers.get("X-RateLimit-Reset", time.time() + 60))
+                if bucket["remaining"] is None or bucket["reset_at"] is None or reset_at > bucket["reset_at"]:
+                    bucket["remaining"] = remaining  # new window
+                else:
+                    bucket["remaining"] = min(bucket["remaining"], remaining)  # responses may arrive out of order
+                bucket["limit"] = int(headers.get("X-RateLimit-Limit", max(remaining, bucket["limit"] or 0)))
+                bucket["reset_at"] = reset_at
+            if limited and "Retry-After" in headers:  # secondary rate limit
+                bucket["remaining"] = 0
+                bucket["reset_at"] = max(bucket["reset_at"] or 0, time.time() + int(headers["Retry-After"]))
+            self._cond.notify_all()
+        return limited
+
+    def stats(self) -> dict:
+        """
+        Collects the state of all buckets.
+
+        Returns:
+            dict: Limit, remaining tokens, seconds until reset, waits and waited seconds per resource
+        """
+
+        with self._cond:
+            now = time.time()
+            return {
+                resource: {
+                    "limit": bucket["limit"],
+                    "remaining": bucket["remaining"],
+                    "reset_in": round(max(bucket["reset_at"] - now, 0)) if bucket["reset_at"] is not None else None,
+                    "waits": bucket["waits"],
+                    "waited_seconds": round(bucket["waited"], 1),
+                }
+                for resource, bucket in self._buckets.items()
+            }
+
+
+@functools.cache
+def get_rate_limiter() -> RateLimiter:
+    """
+    Returns the process-wide rate limiter, created on first use.
+
+    Returns:
+        RateLimiter: The shared rate limiter
+    """
+
+    config = get_config()
+    return RateLimiter(reserve=config.rate_limit_reserve, pace_below=config.rate_limit_pace_below)
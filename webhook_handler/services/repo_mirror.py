@@ -0,0 +1,182 @@
+import functools
+import logging
+import subprocess
+import threading
+
+from contextlib import contextmanager
+from pathlib import Path
+
+from webhook_handler.core import helpers
+from webhook_handler.core.config import get_config
+
+try:
+    import fcntl
+except ImportError:  # Windows, only threads of one process are serialized
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class RepoMirror:
+    """
+    Long-lived bare mirror of a repository which is updated with `git fetch`. Jobs check out worktrees of it
+    instead of cloning the repository, all worktrees share the object storage of the mirror. Changes to the
+    mirror are serialized by a lock file next to it, which also covers other server processes.
+    """
+    def __init__(self, mirror_dir: Path | str, url: str):
+        self._mirror_dir = Path(mirror_dir).resolve()
+        self._url = url
+        self._lock_path = self._mirror_dir.with_name(f"{self._mirror_dir.name}.lock")
+        self._lock = threading.Lock()
+
+    @property
+    def mirror_dir(self) -> Path:
+        return self._mirror_dir
+
+    @contextmanager
+    def _locked(self):
+        """
+        Holds the lock of the mirror, first against other threads and then against other processes.
+        """
+
+        with self._lock:
+            self._lock_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self._lock_path, "a") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _git(self, *args: str, check: bool = True) -> subprocess.CompletedProcess:
+        """
+        Runs a git command on the mirror.
+
+        Parameters:
+            *args (str): The arguments of the git command
+            check (bool, optional): Raise if the command fails
+
+        Returns:
+            subprocess.CompletedProcess: The finished command
+        """
+
+        return subprocess.run(
+            ["git", f"--git-dir={self._mirror_dir}", *args],
+            capture_output=True, text=True, check=check
+        )
+
+    def _ensure(self) -> None:
+        """
+        Creates the mirror on first use.
+        """
+
+        if Path(self._mirror_dir, "HEAD").exists():
+            return
+        logger.info(f"Creating mirror of {self._url}")
+        helpers.remove_dir(self._mirror_dir)  # leftovers of an interrupted clone
+        self._mirror_dir.parent.mkdir(parents=True, exist_ok=True)
+        subprocess.run(["git", "clone", "--bare", self._url, str(self._mirror_dir)], capture_output=True, check=True)
+        self._git("config", "remote.origin.fetch", "+refs/heads/*:refs/heads/*")
+        logger.success(f"Mirror created successfully")
+
+    def has_commit(self, commit: str) -> bool:
+        """
+        Checks whether a commit is available in the mirror.
+
+        Parameters:
+            commit (str): The commit hash
+
+        Returns:
+            bool: True if the mirror contains the commit, False otherwise
+        """
+
+        return self._git("cat-file", "-e", f"{commit}^{{commit}}", check=False).returncode == 0
+
+    def fetch(self, commit: str, ref: str = None) -> None:
+        """
+        Fetches new objects into the mirror if it does not contain the commit yet.
+
+        Parameters:
+            commit (str): Commit which must be available
+            ref (str, optional): Ref to fetch instead of all branches (e.g., pull/<number>/head for forks), it is
+            kept in the mirror so that its objects are not garbage-collected
+        """
+
+        with self._locked():
+            self._ensure()
+            if self.has_commit(commit):
+                logger.info(f"Commit {commit} already available in mirror – fetch skipped")
+                return
+            logger.info(f"Fetching repository updates for commit {commit}")
+            refspecs = [f"+refs/{ref}:refs/{ref}"] if ref else []
+            result = self._git("fetch", "origin", *refspecs, check=False)
+            if result.returncode != 0:
+                logger.warning(f"Fetching failed: {result.stderr.strip()}")
+                return
+            logger.success(f"Fetching successful")
+
+    def add_worktree(self, target_dir: Path | str, commit: str) -> None:
+        """
+        Checks out a commit into a worktree. An existing worktree is switched to the commit.
+
+        Parameters:
+            target_dir (Path | str): Directory of the worktree
+            commit (str): The commit to check out
+        """
+
+        target_dir = Path(target_dir).resolve()
+        with self._locked():
+            self._ensure()
+            if Path(target_dir, ".git").is_file():
+                result = subprocess.run(
+                    ["git", "checkout", "-q", "--force", "--detach", commit],
+                    cwd=target_dir, capture_output=True, text=True
+                )
+                if result.returncode == 0:
+                    logger.info(f"Worktree {target_dir.name} switched to {commit}")
+                    return
+                logger.warning(f"Failed to switch worktree {target_dir.name}: {result.stderr.strip()}")
+            helpers.remove_dir(target_dir)
+            self._git("worktree", "prune")
+            self._git("worktree", "add", "--force", "--detach", str(target_dir), commit)
+            logger.success(f"Worktree {target_dir.name} checked out at {commit}")
+
+    def remove_worktree(self, target_dir: Path | str, ref: str = None) -> None:
+        """
+        Removes a worktree and garbage-collects its administrative files in the mirror.
+
+        Parameters:
+            target_dir (Path | str): Directory of the worktree
+            ref (str, optional): Ref fetched for the worktree (e.g., pull/<number>/head) which is deleted as well
+        """
+
+        target_dir = Path(target_dir).resolve()
+        with self._locked():
+            if Path(self._mirror_dir, "HEAD").exists() and target_dir.exists():
+                self._git("worktree", "remove", "--force", str(target_dir), check=False)
+            helpers.remove_dir(target_dir, log_success=True)
+            if Path(self._mirror_dir, "HEAD").exists():
+                self._git("worktree", "prune", check=False)
+                if ref:
+                    self._git("update-ref", "-d", f"refs/{ref}", check=False)
+
+
+@functools.cache
+def get_repo_mirror(owner: str, repo: str) -> RepoMirror:
+    """
+    Returns the process-wide mirror of a GitHub repository, created on first use.
+
+    Parameters:
+        owner (str): The owner of the repository
+        repo (str): The name of the repository
+
+    Returns:
+        RepoMirror: The shared mirror
+    """
+
+    return RepoMirror(
+        Path(get_config().repo_mirror_dir, f"{owner}__{repo}.git"),
+        f"https://github.com/{owner}/{repo}.git"
+    )
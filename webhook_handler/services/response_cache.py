@@ -0,0 +1,146 @@
+import functools
+import logging
+import sqlite3
+import threading
+import time
+import requests
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable
+
+from webhook_handler.core.config import get_config
+
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    Persistent cache of GET responses together with their validators (ETag, Last-Modified). Cached responses are
+    revalidated with a conditional request, a 304 answer serves the stored body. Responses of hosts without
+    validators can be served without any request within a TTL. The least recently used entries are evicted once
+    the cache holds too many responses.
+    """
+    def __init__(self, db_path: Path | str, max_entries: int = 10000):
+        self._db_path = str(db_path)
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._stats = {"fresh": 0, "revalidated": 0, "misses": 0}
+        Path(self._db_path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses (url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, "
+                "body BLOB NOT NULL, fetched_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_access ON responses (last_access)")
+
+    @contextmanager
+    def _connect(self):
+        """
+        Opens a short-lived connection in autocommit mode.
+        """
+
+        conn = sqlite3.connect(self._db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _count(self, outcome: str) -> None:
+        with self._lock:
+            self._stats[outcome] += 1
+
+    def fetch(
+            self,
+            url: str,
+            send: Callable[[dict], requests.Response],
+            ttl: float = 0
+    ) -> tuple[int, bytes]:
+        """
+        Serves a GET request from the cache if possible.
+
+        Parameters:
+            url (str): The URL
+            send (Callable[[dict], requests.Response]): Sends the request with the given additional headers
+            ttl (float, optional): Seconds a cached response is served without revalidation
+
+        Returns:
+            int: The status code (200 if the response was served from the cache)
+            bytes: The body
+        """
+
+        now = time.time()
+        with self._connect() as conn:
+            entry = conn.execute("SELECT * FROM responses WHERE url = ?", (url,)).fetchone()
+            if entry is not None and now - entry["fetched_at"] < ttl:
+                conn.execute("UPDATE responses SET last_access = ? WHERE url = ?", (now, url))
+                self._count("fresh")
+                return 200, entry["body"]
+
+        conditional_headers = {}
+        if entry is not None and entry["etag"]:
+            conditional_headers["If-None-Match"] = entry["etag"]
+        if entry is not None and entry["last_modified"]:
+            conditional_headers["If-Modified-Since"] = entry["last_modified"]
+        response = send(conditional_headers)
+
+        if response.status_code == 304 and entry is not None:
+            with self._connect() as conn:
+                conn.execute(
+                    "UPDATE responses SET fetched_at = ?, last_access = ? WHERE url = ?",
+                    (time.time(), time.time(), url)
+                )
+            self._count("revalidated")
+            return 200, entry["body"]
+
+        self._count("misses")
+        etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        if response.status_code == 200 and (etag or last_modified or ttl > 0):
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (url, etag, last_modified, body, fetched_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (url, etag, last_modified, response.content, time.time(), time.time())
+                )
+            self._evict()
+        return response.status_code, response.content
+
+    def _evict(self) -> None:
+        """
+        Removes the least recently used responses until the cache fits into the entry limit.
+        """
+
+        with self._connect() as conn:
+            n_removed = conn.execute(
+                "DELETE FROM responses WHERE url IN (SELECT url FROM responses ORDER BY last_access DESC "
+                "LIMIT -1 OFFSET ?)",
+                (self._max_entries,)
+            ).rowcount
+        if n_removed:
+            logger.info(f"Evicted {n_removed} response(s) from the response cache")
+
+    def stats(self) -> dict:
+        """
+        Collects the usage of the cache by this process.
+
+        Returns:
+            dict: Responses served without request, revalidated responses and misses
+        """
+
+        with self._lock:
+            return dict(self._stats)
+
+
+@functools.cache
+def get_response_cache() -> ResponseCache:
+    """
+    Returns the process-wide response cache, created on first use.
+
+    Returns:
+        ResponseCache: The shared cache
+    """
+
+    return ResponseCache(get_config().response_cache_path)
@@ -1,8 +1,10 @@
 import logging
 
 from pathlib import Path
+from typing import Callable
 
 from webhook_handler.core.config import Config
+from webhook_handler.core.job_context import JobContext
 from webhook_handler.core import (
     ExecutionError,
     git_diff
@@ -26,6 +28,7 @@ class TestGenerator:
     def __init__(
         self,
         config: Config,
+        job_ctx: JobContext,
         data: PipelineInputs,
         mock_response: str,
         post_comment: bool,
@@ -35,9 +38,11 @@ class TestGenerator:
         docker_service: DockerService,
         llm_handler: LLMHandler,
         i_attempt: int,
-        model: LLM
+        model: LLM,
+        on_validation: Callable[[], None] = None
     ):
         self._config              = config
+        self._job_ctx             = job_ctx
         self._pipeline_inputs     = data
         self._pr_data             = data.pr_data
         self._pr_diff_ctx         = data.pr_diff_ctx
@@ -51,6 +56,7 @@ class TestGenerator:
         self._llm_handler         = llm_handler
         self._i_attempt           = i_attempt
         self._model               = model
+        self._on_validation       = on_validation
 
     def generate(self) -> bool:
         """
@@ -78,10 +84,11 @@ class TestGenerator:
             logger.critical("Prompt exceeds limits, skipping...")
             raise ExecutionError("Prompt is too long.")
 
-        generation_dir = Path(self._config.output_dir, "generation")
+        generation_dir = Path(self._job_ctx.output_dir, "generation")
         (generation_dir / "prompt.txt").write_text(prompt, encoding="utf-8")
 
         if self._mock_response is None:
+            self._job_ctx.deadline.check("querying the model")
             logger.info("Querying LLM...")
             response = self._llm_handler.query_model(prompt, model=self._model, temperature=0.0)
             if not response:
@@ -120,6 +127,8 @@ class TestGenerator:
 
         test_to_run = self._cst_builder.extract_changed_tests(test_file_diff)
 
+        if self._on_validation is not None:
+            self._on_validation()
         logger.marker("Running test in pre-PR codebase...")
         test_passed_before, stdout_before = self._docker_service.run_test_in_container(
             model_test_patch,
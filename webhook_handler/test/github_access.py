@@ -0,0 +1,658 @@
+import functools
+import json
+import requests
+import subprocess
+import tempfile
+import threading
+import time
+
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.test import SimpleTestCase
+from requests.structures import CaseInsensitiveDict
+
+from webhook_handler.core import Config, DeadlineExceeded, RepoTree, helpers, test_injection
+from webhook_handler.data_models import PullRequestData, RequestPriority
+from webhook_handler.services import gh_api as gh_api_module
+from webhook_handler.services import (
+    BlobCache,
+    CoChangeIndex,
+    GitHubApi,
+    GitObjectReader,
+    HttpClient,
+    ImportIndex,
+    PdfCache,
+    PullRequestDiffContext,
+    RateLimiter,
+    RepoMirror,
+    ResponseCache
+)
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    responses = []  # (status, body) served in order, the last one is repeated
+    routes = {}  # path -> (status, body, headers), served instead of the responses
+    hits = []
+
+    def _respond(self):
+        type(self).hits.append((self.command, self.path))
+        if self.path in type(self).routes:
+            status, body, headers = type(self).routes[self.path]
+        else:
+            status, body = type(self).responses[min(len(type(self).hits), len(type(self).responses)) - 1]
+            headers = {}
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _respond
+    do_POST = _respond
+
+    def log_message(self, *args):
+        pass
+
+
+class _ConcurrentGitHubApi:
+    def __init__(self, n_files: int, n_concurrent: int):
+        self._n_files = n_files
+        self._n_concurrent = n_concurrent
+        self._lock = threading.Lock()
+        self._all_in_flight = threading.Event()
+        self._in_flight = 0
+        self.max_in_flight = 0
+
+    def iter_pr_file_pages(self, max_workers: int = 8):
+        yield 1, [{"filename": f"src/file_{i}.js", "sha": str(i)} for i in range(self._n_files)]
+
+    def fetch_file_version(self, commit: str, file_name: str, get_bytes: bool = False) -> str:
+        with self._lock:
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+            if self._in_flight >= self._n_concurrent:
+                self._all_in_flight.set()
+        self._all_in_flight.wait(timeout=5)  # released once enough requests are in flight at the same time
+        with self._lock:
+            self._in_flight -= 1
+        return f"// {file_name} at {commit}"
+
+
+def _response(status: int, body: bytes = b"", headers: dict = None) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response._content = body
+    response.headers = CaseInsensitiveDict(headers or {})
+    return response
+
+
+def _rate_limited_response(status: int, remaining: int, limit: int, reset_in: float) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response.headers = CaseInsensitiveDict({
+        "X-RateLimit-Limit": str(limit),
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Reset": str(time.time() + reset_in),
+    })
+    return response
+
+
+def _github_api(config: Config, pr_data: PullRequestData, cache_dir: str) -> GitHubApi:
+    return GitHubApi(
+        config,
+        pr_data,
+        blob_cache=BlobCache(Path(cache_dir, "blobs"), max_bytes=1 << 20),
+        response_cache=ResponseCache(Path(cache_dir, "responses.sqlite3"))
+    )
+
+
+class _StubServer:
+    def __init__(self, responses: list, routes: dict = None):
+        _StubHandler.responses = responses
+        _StubHandler.routes = routes or {}
+        _StubHandler.hits = []
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    @property
+    def hits(self) -> list:
+        return _StubHandler.hits
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+#
+# RUN With: python manage.py test webhook_handler.test.<filename>.<testname>
+#
+class TestHttpClient(SimpleTestCase):
+    def tearDown(self):
+        self.server.close()
+
+    def test_server_error_is_retried(self):
+        self.server = _StubServer([(503, b"{}"), (200, b'{"ok": true}')])
+        http = HttpClient(max_retries=2, backoff=0.01)
+        response = http.get(f"{self.server.url}/files")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.server.hits), 2)
+        stats = http.stats()[self.server.url.removeprefix("http://")]
+        self.assertEqual((stats["requests"], stats["retries"], stats["bytes"]), (2, 1, 14))
+
+    def test_post_is_not_retried(self):
+        self.server = _StubServer([(503, b"{}")])
+        http = HttpClient(max_retries=2, backoff=0.01)
+        self.assertEqual(http.post(f"{self.server.url}/comments", json={}).status_code, 503)
+        self.assertEqual(len(self.server.hits), 1)
+
+
+class TestPullRequestFileListing(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.close()
+        self.tmp_dir.cleanup()
+
+    def test_all_pages_are_listed_in_order(self):
+        path = "/mozilla/pdf.js/pulls/1/files?per_page=100&page={}"
+        pages = [[{"filename": f"src/file_{page}_{i}.js"} for i in range(100 if page < 3 else 5)] for page in (1, 2, 3)]
+        self.server = _StubServer([], {
+            path.format(page): (200, json.dumps(files).encode(), {})
+            for page, files in enumerate(pages, start=1)
+        })
+        _, body, _ = _StubHandler.routes[path.format(1)]
+        _StubHandler.routes[path.format(1)] = (200, body, {
+            "Link": f'<{self.server.url}{path.format(2)}>; rel="next", <{self.server.url}{path.format(3)}>; rel="last"'
+        })
+        pr_data = PullRequestData("1", "", "", "", "", "master", "base", "feature", "head", "mozilla", "pdf.js")
+        gh_api = _github_api(Config(github_token=""), pr_data, self.tmp_dir.name)
+        gh_api._api_url = self.server.url
+
+        raw_files = gh_api.fetch_pr_files()
+        self.assertEqual(len(raw_files), 205)
+        self.assertEqual(raw_files[100]["filename"], "src/file_2_0.js")
+        self.assertEqual(raw_files[-1]["filename"], "src/file_3_4.js")
+        self.assertEqual(len(self.server.hits), 3)
+
+    def test_failed_downloads_are_not_cached(self):
+        self.server = _StubServer([(503, b"unavailable"), (200, b"a = 1;")])
+        pr_data = PullRequestData("1", "", "", "", "", "master", "base", "feature", "head", "mozilla", "pdf.js")
+        gh_api = _github_api(Config(github_token=""), pr_data, self.tmp_dir.name)
+        gh_api._http = HttpClient(max_retries=0)
+        gh_api._raw_url = self.server.url
+        commit = "a" * 40
+        self.assertEqual(gh_api.fetch_file_version(commit, "src/a.js", get_bytes=True), b"")
+        self.assertEqual(gh_api.fetch_file_version(commit, "src/a.js", get_bytes=True), b"a = 1;")
+        self.assertEqual(gh_api.fetch_file_version(commit, "src/a.js"), "a = 1;")  # served from the blob cache
+        self.assertEqual(len(self.server.hits), 2)
+
+
+class TestPullRequestOverview(SimpleTestCase):
+    def setUp(self):
+        mocks_dir = Path(Path(__file__).parent, "test_mocks")
+        payload = json.loads(Path(mocks_dir, "pdf_js_19849.json").read_text(encoding="utf-8"))
+        self.pr_data = PullRequestData.from_payload(payload)
+        self.recorded_response = Path(mocks_dir, "pdf_js_19849_graphql.json").read_bytes()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.close()
+        self.tmp_dir.cleanup()
+
+    def _gh_api(self) -> GitHubApi:
+        gh_api = _github_api(Config(github_token="test-token", linked_issue_ttl=0), self.pr_data, self.tmp_dir.name)
+        gh_api._api_url = self.server.url
+        gh_api._graphql_url = f"{self.server.url}/graphql"
+        gh_api._bugzilla_url = f"{self.server.url}/bug"
+        return gh_api
+
+    def test_files_and_issues_are_fetched_in_one_round_trip(self):
+        self.server = _StubServer([], {"/graphql": (200, self.recorded_response, {})})
+        gh_api = self._gh_api()
+        issue_statement, pdf_candidate = gh_api.get_linked_data()
+        self.assertTrue(issue_statement.startswith("Form XObject with a non-dictionary /Resources entry"))
+        self.assertEqual(pdf_candidate, "issue19848")
+        self.assertEqual([raw_file["filename"] for raw_file in gh_api.fetch_pr_files()], ["src/core/evaluator.js"])
+        self.assertEqual(self.server.hits, [("POST", "/graphql")])
+
+    def test_rest_is_used_if_graphql_fails(self):
+        issue = {"title": "Form XObject issue", "body": "Details"}
+        self.server = _StubServer([], {
+            "/graphql": (200, b'{"data": null, "errors": [{"message": "Something went wrong"}]}', {}),
+            "/mozilla/pdf.js/issues/19848": (200, json.dumps(issue).encode(), {}),
+            "/bug/19848": (200, b'{"bugs": []}', {}),
+            "/mozilla/pdf.js/pulls/19849/files?per_page=100&page=1": (
+                200, b'[{"filename": "src/core/evaluator.js", "sha": "abc"}]', {}
+            ),
+        })
+        gh_api = self._gh_api()
+        self.assertEqual(gh_api.get_linked_data(), ("Form XObject issue\nDetails", "issue19848"))
+        self.assertEqual(gh_api.fetch_pr_files()[0]["sha"], "abc")
+        self.assertEqual(len(self.server.hits), 4)  # both trackers are asked concurrently
+
+    def test_referenced_candidates_win_over_closing_issues(self):
+        repository = {
+            "pullRequest": {
+                "files": {"pageInfo": {"hasNextPage": False}, "nodes": []},
+                "closingIssuesReferences": {"nodes": [{"number": 300, "title": "Issue 300", "body": None}]},
+            },
+            "issue_100": None,
+        }
+        self.server = _StubServer([(404, b"{}")], {
+            "/graphql": (200, json.dumps({"data": {"repository": repository}}).encode(), {}),
+            "/bug/100": (200, b'{"bugs": [{"summary": "Bug 100"}]}', {}),
+        })
+        self.pr_data = PullRequestData(
+            "19849", "Fix rendering", "Fixes #100", "", "", "master", "base", "feature", "head", "mozilla", "pdf.js"
+        )
+        self.assertEqual(self._gh_api().get_linked_data(), ("Bug 100", "bug100"))
+
+    def test_rerun_reuses_unchanged_head_files_of_overview(self):
+        self.server = _StubServer([], {"/graphql": (200, self.recorded_response, {})})
+        with tempfile.TemporaryDirectory() as repo_dir:
+            git = ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+            commits = []
+            for content in ("a = 1;", "a = 2;"):
+                Path(repo_dir, "src", "core").mkdir(parents=True, exist_ok=True)
+                Path(repo_dir, "src", "core", "evaluator.js").write_text(content)
+                for command in (["init", "-q"], ["add", "."], ["commit", "-q", "-m", content]):
+                    subprocess.run(git + command, cwd=repo_dir, check=True)
+                commits.append(subprocess.run(
+                    ["git", "rev-parse", "HEAD"], cwd=repo_dir, capture_output=True, text=True
+                ).stdout.strip())
+            blob_sha = subprocess.run(
+                ["git", "rev-parse", "HEAD:src/core/evaluator.js"], cwd=repo_dir, capture_output=True, text=True
+            ).stdout.strip()
+            self.pr_data = PullRequestData(
+                "19849", "", "", "", "", "master", commits[0], "feature", commits[1], "mozilla", "pdf.js"
+            )
+
+            snapshot = None
+            for _ in range(2):
+                gh_api = self._gh_api()
+                gh_api.attach_local_repo(repo_dir)
+                pr_diff_ctx = PullRequestDiffContext(
+                    commits[0], commits[1], gh_api, previous=snapshot and {"base_commit": commits[0], "files": snapshot}
+                )
+                snapshot = pr_diff_ctx.files_snapshot
+                gh_api.close()
+            self.assertEqual(snapshot["src/core/evaluator.js"]["sha"], blob_sha)
+            self.assertEqual(pr_diff_ctx.code_after, ["a = 2;"])
+            self.assertEqual(gh_api.request_stats["local_reads"], 0)  # both versions reused
+
+
+class TestLinkedIssueResolution(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        gh_api_module._resolved_issues.clear()
+
+    def tearDown(self):
+        self.server.close()
+        self.tmp_dir.cleanup()
+        gh_api_module._resolved_issues.clear()
+
+    def test_earlier_candidates_win_and_results_are_reused(self):
+        self.server = _StubServer([(404, b"{}")], {
+            "/bug/100": (200, b'{"bugs": [{"summary": "Bug 100"}]}', {}),
+            "/bug/200": (200, b'{"bugs": []}', {}),
+            "/resolver/pdf.js/issues/200": (200, b'{"title": "Issue 200", "body": null}', {}),
+        })
+        pr_data = PullRequestData(
+            "1", "Fix rendering", "Fixes #100, Fixes #200", "", "",
+            "master", "base", "feature", "head", "resolver", "pdf.js"
+        )
+        for _ in range(2):
+            gh_api = _github_api(Config(github_token=""), pr_data, self.tmp_dir.name)
+            gh_api._api_url = self.server.url
+            gh_api._bugzilla_url = f"{self.server.url}/bug"
+            self.assertEqual(gh_api.get_linked_data(), ("Bug 100", "bug100"))
+        self.assertEqual(len(self.server.hits), 4)  # the second PR reuses the resolved numbers
+
+    def test_resolved_issues_are_bounded(self):
+        self.server = _StubServer([(404, b"{}")])
+        pr_data = PullRequestData(
+            "1", "Fix rendering", "", "", "", "master", "base", "feature", "head", "resolver", "pdf.js"
+        )
+        gh_api = _github_api(Config(github_token=""), pr_data, self.tmp_dir.name)
+        for number in range(gh_api_module._MAX_RESOLVED_ISSUES + 10):
+            gh_api._remember_issue(gh_api._issue_key("bugzilla", number), None)
+        self.assertEqual(len(gh_api_module._resolved_issues), gh_api_module._MAX_RESOLVED_ISSUES)
+        self.assertNotIn(gh_api._issue_key("bugzilla", 0), gh_api_module._resolved_issues)
+
+    def test_failed_lookups_are_not_reused(self):
+        self.server = _StubServer([(503, b"{}")], {
+            "/bug/100": (404, b'{"error": true}', {}),
+        })
+        pr_data = PullRequestData(
+            "1", "Fix rendering", "Fixes #100", "", "", "master", "base", "feature", "head", "resolver", "pdf.js"
+        )
+        for _ in range(2):
+            gh_api = _github_api(Config(github_token=""), pr_data, self.tmp_dir.name)
+            gh_api._http = HttpClient(max_retries=0)
+            gh_api._api_url = self.server.url
+            gh_api._bugzilla_url = f"{self.server.url}/bug"
+            self.assertEqual(gh_api.get_linked_data(), ("", ""))
+        # the GitHub server error is asked again, the missing Bugzilla bug is not
+        paths = sorted(path for _, path in self.server.hits)
+        self.assertEqual(paths, ["/bug/100", "/resolver/pdf.js/issues/100", "/resolver/pdf.js/issues/100"])
+
+    def test_bugzilla_results_are_scoped_to_the_tracker(self):
+        self.server = _StubServer([(404, b"{}")], {
+            "/bug/100": (200, b'{"bugs": [{"summary": "Bug 100"}]}', {}),
+            "/other/100": (200, b'{"bugs": []}', {}),
+        })
+        pr_data = PullRequestData(
+            "1", "Fix rendering", "Fixes #100", "", "", "master", "base", "feature", "head", "resolver", "pdf.js"
+        )
+        expected = {"bug": ("Bug 100", "bug100"), "other": ("", "")}
+        for tracker, linked_data in expected.items():
+            gh_api = _github_api(Config(github_token=""), pr_data, self.tmp_dir.name)
+            gh_api._api_url = self.server.url
+            gh_api._bugzilla_url = f"{self.server.url}/{tracker}"
+            self.assertEqual(gh_api.get_linked_data(), linked_data)
+
+
+class TestPullRequestDiffContext(SimpleTestCase):
+    def test_file_versions_are_fetched_concurrently_in_order(self):
+        gh_api = _ConcurrentGitHubApi(10, n_concurrent=4)
+        pr_diff_ctx = PullRequestDiffContext("base", "head", gh_api, max_workers=20)
+        self.assertGreaterEqual(gh_api.max_in_flight, 4)
+        self.assertEqual(pr_diff_ctx.code_names, [f"src/file_{i}.js" for i in range(10)])
+        self.assertEqual(pr_diff_ctx.code_after[3], "// src/file_3.js at head")
+
+
+class TestBlobCache(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.commits = [f"{i:040x}" for i in range(3)]
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_versions_are_stored_once_per_content(self):
+        blob_cache = BlobCache(self.tmp_dir.name, max_bytes=1024)
+        for commit in self.commits:
+            blob_cache.put("mozilla", "pdf.js", commit, "src/a.js", b"a = 1;")
+        blob_cache.put("mozilla", "pdf.js", self.commits[0], "src/new.js", None)
+        self.assertEqual(blob_cache.get("mozilla", "pdf.js", self.commits[2], "src/a.js"), b"a = 1;")
+        self.assertEqual(blob_cache.get("mozilla", "pdf.js", self.commits[0], "src/new.js"), b"")
+        self.assertIsNone(blob_cache.get("mozilla", "pdf.js", self.commits[1], "src/new.js"))
+        self.assertEqual(len(list(Path(self.tmp_dir.name, "objects").rglob("*/*"))), 1)
+        self.assertEqual(blob_cache.stats()["hits"], 2)
+
+    def test_least_recently_used_versions_are_evicted(self):
+        blob_cache = BlobCache(self.tmp_dir.name, max_bytes=10)
+        blob_cache.put("mozilla", "pdf.js", self.commits[0], "src/a.js", b"aaaaaa")
+        blob_cache.put("mozilla", "pdf.js", self.commits[1], "src/b.js", b"bbbbbb")
+        self.assertIsNone(blob_cache.get("mozilla", "pdf.js", self.commits[0], "src/a.js"))
+        self.assertEqual(blob_cache.get("mozilla", "pdf.js", self.commits[1], "src/b.js"), b"bbbbbb")
+
+    def test_branch_names_are_not_cached(self):
+        blob_cache = BlobCache(self.tmp_dir.name, max_bytes=1024)
+        blob_cache.put("mozilla", "pdf.js", "master", "src/a.js", b"a = 1;")
+        self.assertIsNone(blob_cache.get("mozilla", "pdf.js", "master", "src/a.js"))
+
+
+class TestGitObjectReader(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        Path(self.tmp_dir.name, "src").mkdir()
+        Path(self.tmp_dir.name, "src", "a.js").write_text("a = 1;")
+        git = ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+        for command in (["init", "-q"], ["add", "."], ["commit", "-q", "-m", "init"]):
+            subprocess.run(git + command, cwd=self.tmp_dir.name, check=True)
+        self.commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=self.tmp_dir.name, capture_output=True, text=True
+        ).stdout.strip()
+        self.reader = GitObjectReader(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.reader.close()
+        self.tmp_dir.cleanup()
+
+    def test_files_are_read_by_commit_and_path(self):
+        self.assertTrue(self.reader.has_commit(self.commit))
+        self.assertEqual(self.reader.read_file(self.commit, "src/a.js"), b"a = 1;")
+        self.assertIsNone(self.reader.read_file(self.commit, "src/new.js"))
+        self.assertIsNone(self.reader.read_file(self.commit, "src"))  # trees are not files
+        self.assertEqual(self.reader.read_file(self.commit, "src/a.js"), b"a = 1;")
+        self.assertEqual(
+            self.reader.blob_sha(self.commit, "src/a.js"),
+            subprocess.run(
+                ["git", "rev-parse", f"{self.commit}:src/a.js"], cwd=self.tmp_dir.name, capture_output=True, text=True
+            ).stdout.strip()
+        )
+        self.assertIsNone(self.reader.blob_sha(self.commit, "src/new.js"))
+
+    def test_unknown_commits_are_reported_missing(self):
+        self.assertFalse(self.reader.has_commit("f" * 40))
+
+
+class TestRateLimiter(SimpleTestCase):
+    def test_bulk_downloads_leave_reserve_to_validation_calls(self):
+        rate_limiter = RateLimiter(reserve=0.1)
+        rate_limiter.update("api.github.com", _rate_limited_response(200, 5, 50, 60))
+        rate_limiter.acquire("api.github.com", RequestPriority.HIGH, max_wait=0.1)
+        with self.assertRaises(DeadlineExceeded):
+            rate_limiter.acquire("api.github.com", RequestPriority.LOW, max_wait=0.1)
+        self.assertEqual(rate_limiter.stats()["api.github.com"]["remaining"], 4)
+
+    def test_rejected_requests_wait_for_reset(self):
+        rate_limiter = RateLimiter()
+        self.assertTrue(rate_limiter.update("api.github.com", _rate_limited_response(403, 0, 50, 0.3)))
+        start = time.monotonic()
+        rate_limiter.acquire("api.github.com", RequestPriority.HIGH, max_wait=5)
+        self.assertGreater(time.monotonic() - start, 0.2)
+        self.assertFalse(rate_limiter.update("api.github.com", _rate_limited_response(200, 49, 50, 60)))
+
+
+class TestResponseCache(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.response_cache = ResponseCache(Path(self.tmp_dir.name, "responses.sqlite3"))
+        self.sent = []
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_responses_are_revalidated_with_etag(self):
+        responses = [_response(200, b'{"title": "Bug"}', {"ETag": '"v1"'}), _response(304)]
+        send = lambda headers: self.sent.append(headers) or responses[len(self.sent) - 1]
+        url = "https://api.github.com/repos/mozilla/pdf.js/issues/1"
+        self.assertEqual(self.response_cache.fetch(url, send), (200, b'{"title": "Bug"}'))
+        self.assertEqual(self.response_cache.fetch(url, send), (200, b'{"title": "Bug"}'))
+        self.assertEqual(self.sent, [{}, {"If-None-Match": '"v1"'}])
+        self.assertEqual(self.response_cache.stats(), {"fresh": 0, "revalidated": 1, "misses": 1})
+
+    def test_responses_without_validators_are_served_within_ttl(self):
+        send = lambda headers: self.sent.append(headers) or _response(200, b'{"bugs": []}')
+        url = "https://bugzilla.mozilla.org/rest/bug/1"
+        self.response_cache.fetch(url, send, ttl=60)
+        self.assertEqual(self.response_cache.fetch(url, send, ttl=60), (200, b'{"bugs": []}'))
+        self.response_cache.fetch(url, send, ttl=0)
+        self.assertEqual(len(self.sent), 2)
+
+
+class TestPdfCache(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.server = _StubServer([], {
+            "/small.pdf": (200, b"%PDF-1.7 small", {}),
+            "/large.pdf": (200, b"%PDF-1.7 " + b"x" * 100, {}),
+        })
+
+    def tearDown(self):
+        self.server.close()
+        self.tmp_dir.cleanup()
+
+    def test_pdfs_are_downloaded_once_to_disk(self):
+        pdf_cache = PdfCache(self.tmp_dir.name, max_pdf_bytes=64, max_bytes=1024, timeout=10)
+        pdf_path = pdf_cache.download(f"{self.server.url}/small.pdf")
+        self.assertEqual(pdf_path.read_bytes(), b"%PDF-1.7 small")
+        self.assertEqual(pdf_cache.download(f"{self.server.url}/small.pdf"), pdf_path)
+        self.assertEqual(len(self.server.hits), 1)
+
+    def test_pdfs_exceeding_the_size_limit_are_skipped(self):
+        pdf_cache = PdfCache(self.tmp_dir.name, max_pdf_bytes=64, max_bytes=1024, timeout=10)
+        self.assertIsNone(pdf_cache.download(f"{self.server.url}/large.pdf"))
+        self.assertEqual(list(Path(self.tmp_dir.name, "objects").iterdir()), [])
+
+    def test_linked_pdf_survives_eviction(self):
+        pdf_cache = PdfCache(Path(self.tmp_dir.name, "cache"), max_pdf_bytes=64, max_bytes=20, timeout=10)
+        cached_path = pdf_cache.put("a", b"%PDF-1.7 first")
+        job_path = pdf_cache.link(cached_path, Path(self.tmp_dir.name, "job", "first.pdf"))
+        pdf_cache.put("b", b"%PDF-1.7 second")  # evicts the first PDF
+        self.assertFalse(cached_path.exists())
+        self.assertEqual(job_path.read_bytes(), b"%PDF-1.7 first")
+        self.assertIsNone(pdf_cache.link(cached_path, Path(self.tmp_dir.name, "job", "again.pdf")))
+
+
+class TestRepoMirror(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.origin = Path(self.tmp_dir.name, "origin")
+        self.origin.mkdir()
+        subprocess.run(["git", "init", "-q"], cwd=self.origin, check=True)
+        self.commits = [self._commit("a = 1;"), self._commit("a = 2;")]
+        self.mirror = RepoMirror(Path(self.tmp_dir.name, "mirror.git"), str(self.origin))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _commit(self, content: str) -> str:
+        Path(self.origin, "a.js").write_text(content)
+        git = ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+        subprocess.run(git + ["add", "."], cwd=self.origin, check=True)
+        subprocess.run(git + ["commit", "-q", "-m", content], cwd=self.origin, check=True)
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=self.origin, capture_output=True, text=True
+        ).stdout.strip()
+
+    def test_worktrees_share_the_mirror(self):
+        worktrees = [Path(self.tmp_dir.name, "pr_1"), Path(self.tmp_dir.name, "pr_2")]
+        self.mirror.fetch(self.commits[0])
+        self.mirror.add_worktree(worktrees[0], self.commits[0])
+        self.mirror.add_worktree(worktrees[1], self.commits[1])
+        self.assertEqual(Path(worktrees[0], "a.js").read_text(), "a = 1;")
+        self.assertEqual(Path(worktrees[1], "a.js").read_text(), "a = 2;")
+
+        new_commit = self._commit("a = 3;")
+        self.mirror.fetch(new_commit)
+        self.mirror.add_worktree(worktrees[0], new_commit)  # existing worktree is switched
+        self.assertEqual(Path(worktrees[0], "a.js").read_text(), "a = 3;")
+
+        self.mirror.remove_worktree(worktrees[0])
+        self.assertFalse(worktrees[0].exists())
+        worktree_list = subprocess.run(
+            ["git", "--git-dir", str(Path(self.tmp_dir.name, "mirror.git")), "worktree", "list"],
+            capture_output=True, text=True
+        ).stdout
+        self.assertNotIn("pr_1", worktree_list)
+        self.assertIn("pr_2", worktree_list)
+
+    def test_pull_ref_is_pruned_with_worktree(self):
+        pull_commit = self._commit("a = 4;")
+        subprocess.run(["git", "update-ref", "refs/pull/1/head", pull_commit], cwd=self.origin, check=True)
+        subprocess.run(["git", "reset", "-q", "--hard", self.commits[1]], cwd=self.origin, check=True)
+        worktree = Path(self.tmp_dir.name, "pr_1")
+        self.mirror.fetch(self.commits[1])
+        self.mirror.fetch(pull_commit, ref="pull/1/head")
+        self.mirror.add_worktree(worktree, pull_commit)
+        self.assertTrue(Path(self.tmp_dir.name, "mirror.git.lock").exists())
+
+        self.mirror.remove_worktree(worktree, ref="pull/1/head")
+        refs = subprocess.run(
+            ["git", "--git-dir", str(Path(self.tmp_dir.name, "mirror.git")), "for-each-ref", "refs/pull"],
+            capture_output=True, text=True
+        ).stdout
+        self.assertEqual(refs, "")
+
+
+class TestRepoTree(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.repo = Path(self.tmp_dir.name)
+        Path(self.repo, "test", "unit").mkdir(parents=True)
+        subprocess.run(["git", "init", "-q"], cwd=self.repo, check=True)
+        self.base = self._commit({
+            "package.json": json.dumps({"devDependencies": {"jasmine": "^5.0.0"}}),
+            "test/unit/util_spec.js": 'import { a, b as c } from "../../src/util.js";\n',
+            "test/unit/other_spec.js": 'import { e } from "../../src/other.js";\n'
+        })
+        self._commit({
+            "package.json": json.dumps({"devDependencies": {"jasmine": "^6.0.0"}}),
+            "test/unit/util_spec.js": 'import { d } from "../../src/util.js";\n'
+        })
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _commit(self, files: dict) -> str:
+        for path, content in files.items():
+            Path(self.repo, path).write_text(content)
+        git = ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+        subprocess.run(git + ["add", "."], cwd=self.repo, check=True)
+        subprocess.run(git + ["commit", "-q", "-m", "update"], cwd=self.repo, check=True)
+        return self._head()
+
+    def _head(self) -> str:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=self.repo, capture_output=True, text=True
+        ).stdout.strip()
+
+    def test_reads_base_commit_without_checkout(self):
+        head = self._head()
+        repo_tree = RepoTree(str(self.repo), self.base)
+        self.assertIn("jasmine: ^5.0.0", helpers.extract_packages(repo_tree))
+        filename, content = test_injection._find_file_to_inject(
+            repo_tree, "+++ b/src/util.js\n", lambda file, n_last_commits, n_files: []
+        )
+        self.assertEqual(filename, "test/unit/util_spec.js")
+        self.assertIn("b as c", content)
+        self.assertIsNone(repo_tree.read_text("missing.js"))
+        self.assertEqual(repo_tree.find_unit_test_files("util_spec.js"), ["test/unit/util_spec.js"])
+        self.assertEqual(repo_tree.find_unit_test_files("package.json"), [])
+        self.assertEqual(self._head(), head)
+        self.assertIn("^6.0.0", Path(self.repo, "package.json").read_text())
+
+    def test_import_index_parses_changed_files_only(self):
+        index = ImportIndex(Path(self.tmp_dir.name, "import_index.sqlite3"))
+        base_tree, head_tree = RepoTree(str(self.repo), self.base), RepoTree(str(self.repo), self._head())
+        self.assertEqual(
+            index.relative_imports(base_tree),
+            "Available Relative Imports:\n- `../../src/other.js`: e\n- `../../src/util.js`: a, b"
+        )
+        self.assertEqual(index.stats(), {"trees": 0, "parsed_files": 2, "indexed_files": 0})
+        self.assertEqual(
+            index.relative_imports(head_tree),
+            "Available Relative Imports:\n- `../../src/other.js`: e\n- `../../src/util.js`: d"
+        )
+        self.assertEqual(index.stats(), {"trees": 0, "parsed_files": 3, "indexed_files": 1})
+        index.relative_imports(base_tree)
+        self.assertEqual(index.stats(), {"trees": 1, "parsed_files": 3, "indexed_files": 1})
+
+    def test_co_change_index_is_updated_incrementally(self):
+        index = CoChangeIndex(Path(self.tmp_dir.name, "co_change_index.sqlite3"), Path(self.repo, ".git"), "test")
+        index.update()
+        head = self._head()
+        self.assertEqual(index.co_edited_files(head, "package.json"), [("test/unit/util_spec.js", 2),
+                                                                       ("test/unit/other_spec.js", 1)])
+        self.assertEqual(index.co_edited_files(head, "package.json", n_last_commits=1),
+                         [("test/unit/util_spec.js", 1)])
+        self.assertEqual(index.co_edited_files(self.base, "package.json"), [("test/unit/util_spec.js", 1),
+                                                                            ("test/unit/other_spec.js", 1)])
+        Path(self.repo, "src").mkdir()
+        self._commit({"src/lib.js": "export const e = 1;", "test/unit/other_spec.js": "// e"})
+        index.update()
+        self.assertEqual(index.co_edited_files(self._head(), "src/lib.js"), [("test/unit/other_spec.js", 1)])
+        self.assertEqual(index.co_edited_files(head, "src/lib.js"), [])  # commit after the base is ignored
+
+        reloaded = CoChangeIndex(Path(self.tmp_dir.name, "co_change_index.sqlite3"), Path(self.repo, ".git"), "test")
+        repo_tree = RepoTree(str(self.repo), self._head())
+        filename, content = test_injection._find_file_to_inject(
+            repo_tree, "+++ b/src/lib.js\n", functools.partial(reloaded.co_edited_files, self._head())
+        )
+        self.assertEqual((filename, content), ("test/unit/other_spec.js", "// e"))
@@ -27,8 +27,7 @@ class TestGenerationPdfJs18844(TestCase):
     def setUp(self):
         self.payload = _get_payload("test_mocks/pdf_js_18844.json")
         mock_response = _get_mock_content("test_mocks/pdf_js_18844_response.txt")
-        self.config = Config()
-        self.config.fetch_pdf = False
+        self.config = Config(fetch_pdf=False)
         self.pipeline = Pipeline(self.payload, self.config, mock_response=mock_response)
 
     def tearDown(self):
@@ -45,9 +44,7 @@ class TestGenerationPdfJs18910(TestCase):
     def setUp(self):
         self.payload = _get_payload("test_mocks/pdf_js_18910.json")
         mock_response = _get_mock_content("test_mocks/pdf_js_18910_response.txt")
-        self.config = Config()
-        self.config.fetch_pdf = False
-        self.config.inject_in_file = "test/unit/jpg_spec.js"
+        self.config = Config(fetch_pdf=False, inject_in_file="test/unit/jpg_spec.js")
         self.pipeline = Pipeline(self.payload, self.config, mock_response=mock_response)
 
     def tearDown(self):
@@ -64,9 +61,7 @@ class TestGenerationPdfJs19184(TestCase):
     def setUp(self):
         self.payload = _get_payload("test_mocks/pdf_js_19184.json")
         mock_response = _get_mock_content("test_mocks/pdf_js_19184_response.txt")
-        self.config = Config()
-        self.config.fetch_pdf = False
-        self.config.inject_in_file = "test/unit/to_unicode_map_spec.js"
+        self.config = Config(fetch_pdf=False, inject_in_file="test/unit/to_unicode_map_spec.js")
         self.pipeline = Pipeline(self.payload, self.config, mock_response=mock_response)
 
     def tearDown(self):
@@ -0,0 +1,331 @@
+import os
+import json
+import sqlite3
+import tempfile
+import threading
+import time
+
+from pathlib import Path
+from django.test import SimpleTestCase
+
+from webhook_handler.core import CancellationToken, Config, Deadline, DeadlineExceeded, JobCancelled
+from webhook_handler.data_models import CancelReason, JobState, PullRequestData
+from webhook_handler.services import JobQueue, JobStore, PullRequestDiffContext
+from webhook_handler.webhook import _precheck_pr
+
+
+def _get_payload(rel_path: str) -> dict:
+    abs_path = os.path.join(os.path.dirname(__file__), rel_path)
+    with open(abs_path, "r", encoding="utf-8") as f:
+        payload = json.load(f)
+    return payload
+
+
+def _enqueue(job_store: JobStore, pr_number: int = 1, head_commit: str = "abc", delivery_id: str = None) -> str:
+    job, _ = job_store.enqueue(
+        {"number": pr_number},
+        pr_number,
+        f"mozilla__pdf.js-{pr_number}",
+        head_commit,
+        "ts",
+        delivery_id=delivery_id
+    )
+    return job["id"]
+
+#
+# RUN With: python manage.py test webhook_handler.test.<filename>.<testname>
+#
+class TestJobStore(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.job_store = JobStore(Path(self.tmp_dir.name, "jobs.sqlite3"))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_claim_is_exclusive(self):
+        job_id = _enqueue(self.job_store)
+        job = self.job_store.claim_next()
+        self.assertEqual(job["id"], job_id)
+        self.assertEqual(job["state"], JobState.PREPARING)
+        self.assertIsNone(self.job_store.claim_next())
+
+    def test_duplicate_head_commit_attaches_to_job(self):
+        job_id = _enqueue(self.job_store, delivery_id="delivery-1")
+        self.assertEqual(_enqueue(self.job_store, delivery_id="delivery-2"), job_id)
+        self.assertEqual(_enqueue(self.job_store, head_commit="def", delivery_id="delivery-1"), job_id)
+        self.assertNotEqual(_enqueue(self.job_store, head_commit="def"), job_id)
+
+    def test_failed_job_is_not_deduplicated(self):
+        job_id = _enqueue(self.job_store)
+        self.job_store.update(job_id, JobState.FAILED)
+        self.assertNotEqual(_enqueue(self.job_store), job_id)
+
+    def test_failed_delivery_is_not_deduplicated(self):
+        job_id = _enqueue(self.job_store, delivery_id="delivery-1")
+        self.job_store.update(job_id, JobState.FAILED)
+        self.assertNotEqual(_enqueue(self.job_store, delivery_id="delivery-1"), job_id)
+
+    def test_recover_keeps_progress_of_dead_worker(self):
+        job_id = _enqueue(self.job_store)
+        self.job_store.claim_next()
+        self.job_store.update(job_id, JobState.ATTEMPT, attempt=2, prepared=1, worker=f"{self.job_store.worker_id}0000")
+        self.assertEqual(self.job_store.recover(), 1)
+        job = self.job_store.claim_next()
+        self.assertEqual(job["id"], job_id)
+        self.assertEqual(job["attempt"], 2)
+        self.assertEqual(job["prepared"], 1)
+
+    def test_claim_waits_for_running_job_of_same_pr(self):
+        _enqueue(self.job_store)
+        self.job_store.claim_next()
+        _enqueue(self.job_store, head_commit="def")
+        self.assertIsNone(self.job_store.claim_next())
+
+    def test_recover_skips_running_worker(self):
+        _enqueue(self.job_store)
+        self.job_store.claim_next()
+        self.assertEqual(self.job_store.recover(), 0)
+
+
+class TestJobQueue(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.job_store = JobStore(Path(self.tmp_dir.name, "jobs.sqlite3"))
+        self.job_queues = []
+
+    def tearDown(self):
+        for job_queue in self.job_queues:
+            job_queue.stop(timeout=5)
+        self.tmp_dir.cleanup()
+
+    def test_full_queue_rejects_job(self):
+        job_queue = JobQueue(self.job_store, lambda job, store, token: (JobState.DONE, "done"), max_workers=0, max_queue_size=1)
+        self.job_queues.append(job_queue)
+        self.assertIsNotNone(job_queue.submit({}, 1, "pr-1", "abc", "ts")[0])
+        self.assertIsNone(job_queue.submit({}, 2, "pr-2", "abc", "ts")[0])
+        self.assertEqual(job_queue.metrics()["rejected_queue_full"], 1)
+
+    def test_worker_finishes_job(self):
+        job_queue = JobQueue(self.job_store, lambda job, store, token: (JobState.DONE, "done"), max_workers=1, max_queue_size=1)
+        self.job_queues.append(job_queue)
+        job_id = job_queue.submit({}, 1, "pr-1", "abc", "ts")[0]["id"]
+        deadline = time.time() + 5
+        while self.job_store.get(job_id)["state"] != JobState.DONE and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(self.job_store.get(job_id)["message"], "done")
+
+    def test_rejected_jobs_are_counted_separately(self):
+        job_queue = JobQueue(
+            self.job_store, lambda job, store, token: (JobState.REJECTED, "No linked issue found"),
+            max_workers=1, max_queue_size=1
+        )
+        self.job_queues.append(job_queue)
+        job_queue.submit({}, 1, "pr-1", "abc", "ts")
+        deadline = time.time() + 5
+        while job_queue.metrics()["rejected"] == 0 and time.time() < deadline:
+            time.sleep(0.05)
+        metrics = job_queue.metrics()
+        self.assertEqual((metrics["rejected"], metrics["completed"]), (1, 0))
+
+    def test_worker_survives_store_errors(self):
+        update = self.job_store.update
+
+        def failing_update(job_id, state, **fields):
+            if state == JobState.FAILED:
+                raise sqlite3.OperationalError("database is locked")
+            update(job_id, state, **fields)
+
+        def handler(job, store, token):
+            if job["pr_number"] == 1:
+                raise RuntimeError("pipeline crashed")
+            return JobState.DONE, "done"
+
+        self.job_store.update = failing_update
+        job_queue = JobQueue(self.job_store, handler, max_workers=1, max_queue_size=2, poll_interval=0.1)
+        self.job_queues.append(job_queue)
+        job_queue.submit({}, 1, "pr-1", "abc", "ts")
+        job_id = job_queue.submit({}, 2, "pr-2", "abc", "ts")[0]["id"]
+        deadline = time.time() + 5
+        while self.job_store.get(job_id)["state"] != JobState.DONE and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(self.job_store.get(job_id)["message"], "done")
+        self.assertEqual(job_queue.metrics()["failed"], 1)
+
+
+class TestCancellation(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.job_store = JobStore(Path(self.tmp_dir.name, "jobs.sqlite3"))
+        self.job_queues = []
+
+    def tearDown(self):
+        for job_queue in self.job_queues:
+            job_queue.stop(timeout=5)
+        self.tmp_dir.cleanup()
+
+    def test_token_runs_callbacks_and_raises(self):
+        token = CancellationToken()
+        killed = []
+        token.add_callback(lambda: killed.append(True))
+        token.raise_if_cancelled()
+        token.cancel(CancelReason.CLOSED)
+        self.assertEqual(killed, [True])
+        with self.assertRaises(JobCancelled):
+            token.raise_if_cancelled()
+
+    def test_superseded_jobs_are_cancelled(self):
+        running_id = _enqueue(self.job_store, head_commit="old")
+        self.job_store.claim_next()
+        queued_id = _enqueue(self.job_store, head_commit="older")
+        kept_id = _enqueue(self.job_store, head_commit="new")
+        job_ids = self.job_store.request_cancel("mozilla__pdf.js-1", CancelReason.SUPERSEDED, keep_head_commit="new")
+        self.assertEqual(job_ids, [running_id])
+        self.assertEqual(self.job_store.get(queued_id)["state"], JobState.CANCELLED)
+        self.assertEqual(self.job_store.get(kept_id)["state"], JobState.QUEUED)
+        self.assertEqual(self.job_store.cancel_requests([running_id, kept_id]), {running_id: CancelReason.SUPERSEDED})
+
+    def test_running_job_is_stopped(self):
+        started = threading.Event()
+
+        def handler(job, store, token):
+            started.set()
+            deadline = time.time() + 5
+            while not token.is_cancelled and time.time() < deadline:
+                time.sleep(0.01)
+            return JobState.CANCELLED, token.reason
+
+        job_queue = JobQueue(self.job_store, handler, max_workers=1, max_queue_size=1, poll_interval=0.1)
+        self.job_queues.append(job_queue)
+        job_id = job_queue.submit({}, 1, "pr-1", "abc", "ts")[0]["id"]
+        self.assertTrue(started.wait(5))
+        self.assertEqual(job_queue.cancel("pr-1", CancelReason.CLOSED), 1)
+        deadline = time.time() + 5
+        while self.job_store.get(job_id)["state"] != JobState.CANCELLED and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(self.job_store.get(job_id)["message"], CancelReason.CLOSED)
+        self.assertEqual(job_queue.metrics()["cancelled"], 1)
+
+
+class TestDeadline(SimpleTestCase):
+    def test_stage_budget_is_capped_by_job(self):
+        deadline = Deadline(10)
+        self.assertEqual(deadline.budget(5), 5)
+        self.assertLessEqual(deadline.budget(60), 10)
+        self.assertIsNone(Deadline(None).timeout(None))
+
+    def test_expired_deadline_aborts_stage(self):
+        deadline = Deadline(0.01)
+        time.sleep(0.02)
+        self.assertTrue(deadline.expired)
+        self.assertEqual(deadline.budget(5), 0)
+        with self.assertRaises(DeadlineExceeded):
+            deadline.check("running the test")
+
+
+class _FakeGitHubApi:
+    def __init__(self, raw_files: list, versions: dict):
+        self._raw_files = raw_files
+        self._versions = versions
+        self.fetched = []
+
+    def iter_pr_file_pages(self, max_workers: int = 8):
+        yield 1, self._raw_files
+
+    def fetch_file_version(self, commit: str, file_name: str, get_bytes: bool = False) -> str:
+        self.fetched.append((commit, file_name))
+        return self._versions[(commit, file_name)]
+
+
+class TestIncrementalRerun(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.job_store = JobStore(Path(self.tmp_dir.name, "jobs.sqlite3"))
+        self.previous = {
+            "base_commit": "base",
+            "head_commit": "head1",
+            "files": {
+                "src/a.js": {"sha": "a1", "before": "a = 0;", "after": "a = 1;"},
+                "src/b.js": {"sha": "b1", "before": "b = 0;", "after": "b = 1;"},
+            }
+        }
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_snapshot_is_replaced_and_deleted(self):
+        self.job_store.save_snapshot("pr-1", "head0", {"base_commit": "old"})
+        self.job_store.save_snapshot("pr-1", "head1", self.previous)
+        self.assertEqual(self.job_store.load_snapshot("pr-1"), self.previous)
+        self.job_store.delete_snapshot("pr-1")
+        self.assertIsNone(self.job_store.load_snapshot("pr-1"))
+
+    def test_artifacts_beyond_retention_limits_expire(self):
+        for pr_number in (1, 2, 3):
+            job_id = _enqueue(self.job_store, pr_number=pr_number)
+            if pr_number != 1:
+                self.job_store.update(job_id, JobState.DONE)
+            self.job_store.save_snapshot(f"mozilla__pdf.js-{pr_number}", "abc", self.previous)
+            time.sleep(0.01)
+        # PR 3 is kept, PR 1 still has a queued job
+        self.assertEqual(self.job_store.expired_snapshots(max_kept=1, max_age=3600), [{"number": 2}])
+        self.assertEqual(self.job_store.expired_snapshots(max_kept=10, max_age=0), [{"number": 3}, {"number": 2}])
+
+    def test_only_changed_head_versions_are_fetched(self):
+        gh_api = _FakeGitHubApi(
+            [{"filename": "src/a.js", "sha": "a2"}, {"filename": "src/b.js", "sha": "b1"}],
+            {("head2", "src/a.js"): "a = 2;"}
+        )
+        pr_diff_ctx = PullRequestDiffContext("base", "head2", gh_api, previous=self.previous)
+        self.assertEqual(gh_api.fetched, [("head2", "src/a.js")])
+        self.assertEqual(pr_diff_ctx.code_after, ["a = 2;", "b = 1;"])
+        self.assertEqual(pr_diff_ctx.files_snapshot["src/a.js"]["sha"], "a2")
+
+    def test_changed_base_commit_refetches_base_versions(self):
+        gh_api = _FakeGitHubApi(
+            [{"filename": "src/b.js", "sha": "b1"}],
+            {("base2", "src/b.js"): "b = 0;"}
+        )
+        PullRequestDiffContext("base2", "head2", gh_api, previous=self.previous)
+        self.assertEqual(gh_api.fetched, [("base2", "src/b.js")])
+
+
+class TestPayloadPrecheck(SimpleTestCase):
+    def setUp(self):
+        self.payload = _get_payload("test_mocks/pdf_js_18844.json")
+        self.config = Config()
+
+    def tearDown(self):
+        del self.payload
+        del self.config
+
+    def test_linked_bug_passes(self):
+        _, valid = _precheck_pr(PullRequestData.from_payload(self.payload), self.config)
+        self.assertTrue(valid)
+
+    def test_missing_issue_reference_is_rejected(self):
+        self.payload["pull_request"]["title"] = "Refactor font loading"
+        self.payload["pull_request"]["body"] = ""
+        message, valid = _precheck_pr(PullRequestData.from_payload(self.payload), self.config)
+        self.assertFalse(valid)
+        self.assertEqual(message, "No linked issue found")
+
+    def test_too_many_changed_files_are_rejected(self):
+        self.payload["pull_request"]["changed_files"] = self.config.max_changed_files + 1
+        _, valid = _precheck_pr(PullRequestData.from_payload(self.payload), self.config)
+        self.assertFalse(valid)
+
+
+class TestAsyncWebhook(SimpleTestCase):
+    async def test_head_request_is_acknowledged(self):
+        response = await self.async_client.head("/webhook-js/")
+        self.assertEqual(response.status_code, 200)
+
+    async def test_invalid_signature_is_rejected(self):
+        response = await self.async_client.post(
+            "/webhook-js/",
+            data=b'{"action": "opened"}',
+            content_type="application/json",
+            headers={"X-Hub-Signature-256": "sha256=invalid", "X-GitHub-Event": "pull_request"}
+        )
+        self.assertEqual(response.status_code, 403)
@@ -3,4 +3,5 @@ from . import webhook
 
 urlpatterns = [
     path('', webhook.github_webhook, name='github_webhook'),  # Matches /webhook-js/
+    path('metrics/', webhook.queue_metrics, name='queue_metrics'),  # Matches /webhook-js/metrics/
 ]
@@ -4,22 +4,43 @@ import hashlib
 import logging
 import threading
 
+from asgiref.sync import sync_to_async
 from django.views.decorators.csrf import csrf_exempt
 from django.http import JsonResponse, HttpResponseForbidden, HttpResponse, HttpResponseNotAllowed
 from pathlib import Path
 
-from webhook_handler.core import Config
+from webhook_handler.core import (
+    CancellationToken,
+    Config,
+    JobCancelled,
+    get_config,
+    new_execution_timestamp
+)
+from webhook_handler.data_models import CancelReason, JobState, PullRequestData
+from webhook_handler.services import (
+    JobQueue,
+    JobStore,
+    get_blob_cache,
+    get_http_client,
+    get_import_index,
+    get_rate_limiter,
+    get_response_cache
+)
 from .pipeline import Pipeline
 
 
 bootstrap = logging.getLogger("bootstrap")
 
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
 
 #################### Webhook ####################
 @csrf_exempt
-def github_webhook(request):
+async def github_webhook(request):
     """
-    Handles GitHub webhook events.
+    Handles GitHub webhook events. The view never blocks the event loop: disk and database access run
+    in worker threads, the pipeline itself runs in the job queue.
 
     Parameters:
         request (django.http.HttpRequest): The HTTP request
@@ -28,8 +49,8 @@ def github_webhook(request):
         django.http.HttpResponse: The HTTP response
     """
 
-    # 1) Initialize config
-    config = Config()
+    # 1) Load config (shared by all requests of this process)
+    config = get_config()
     bootstrap.info("Received GitHub webhook event")
 
     # 2) Allow HEAD for health checks
@@ -59,41 +80,230 @@ def github_webhook(request):
         bootstrap.critical("Webhook event must be pull request")
         return JsonResponse({'status': 'success', 'message': 'Webhook event must be pull request'}, status=200)
 
-    # 7) Pull request action check
+    # 7) Pull request action check (closed PRs cancel their jobs and release their kept artifacts)
     pr_number = payload['number']
-    if payload.get('action') != 'opened':
-        bootstrap.critical(f"[#{pr_number}] Pull request action must be OPENED")
-        return JsonResponse({'status': 'success', 'message': 'Pull request action must be OPENED'}, status=200)
+    action = payload.get('action')
+    pr_data = PullRequestData.from_payload(payload)
+    if action == 'closed':
+        await sync_to_async(_close_pr, thread_sensitive=False)(pr_data, config)
+        return JsonResponse({'status': 'success', 'message': 'Jobs of closed pull request cancelled'}, status=200)
+    if action not in ('opened', 'synchronize'):
+        bootstrap.critical(f"[#{pr_number}] Pull request action must be OPENED or SYNCHRONIZE")
+        return JsonResponse(
+            {'status': 'success', 'message': 'Pull request action must be OPENED or SYNCHRONIZE'},
+            status=200
+        )
 
-    # 8) Check for PR validity
-    bootstrap.info(f"[#{pr_number}] Validating PR...")
-    pipeline = Pipeline(payload, config, post_comment=True)
-    message, valid = pipeline.is_valid_pr()
+    # 8) A new push supersedes unfinished jobs for older head commits
+    if action == 'synchronize':
+        await sync_to_async(_get_job_queue(config).cancel, thread_sensitive=False)(
+            pr_data.id,
+            CancelReason.SUPERSEDED,
+            keep_head_commit=pr_data.head_commit
+        )
+
+    # 9) Cheap payload-only check (full validation runs asynchronously in the job)
+    message, valid = _precheck_pr(pr_data, config)
     if not valid:
         bootstrap.critical(f'[#{pr_number}] {message}')
         return JsonResponse({'status': 'success', 'message': message}, status=200)
 
-    def _execute_pipeline_in_background():
-        try:
-            bootstrap.info(f"[#{pr_number}] Starting pipeline execution...")
-            generation_completed = pipeline.execute_pipeline()
-            completed_message = "Test generated successfully" if generation_completed else "No test generated"
-            bootstrap.info(f"[#{pr_number}] Pipeline execution completed")
-            bootstrap.info(f"[#{pr_number}] {completed_message}")
-        except:
-            bootstrap.critical(f"[#{pr_number}] Pipeline execution failed")
-
-    # 9) Save payload
-    payload_path = Path(config.webhook_raw_log_dir, f"pdf_js_{pr_number}_{config.execution_timestamp}.json")
+    # 10) Save payload and queue pipeline (deduplicated by delivery and head commit)
+    job, created = await sync_to_async(_persist_and_enqueue, thread_sensitive=False)(
+        payload,
+        pr_data,
+        config,
+        request.headers.get('X-GitHub-Delivery')
+    )
+
+    # 11) Reject with retry hint if queue is full
+    if job is None:
+        response = JsonResponse({'status': 'rejected', 'message': 'Job queue is full, retry later'}, status=503)
+        response['Retry-After'] = str(config.queue_retry_after)
+        return response
+
+    if not created:
+        job_state = JobState(job['state'])
+        if job_state.is_terminal:  # cached outcome
+            return JsonResponse(
+                {'status': 'success', 'message': job['message'], 'job_id': job['id'], 'state': job_state},
+                status=200
+            )
+        return JsonResponse(
+            {'status': 'accepted', 'message': 'Payload is already being processed...', 'job_id': job['id'],
+             'state': job_state},
+            status=202
+        )
+
+    return JsonResponse({'status': 'accepted', 'message': message, 'job_id': job['id']}, status=202)
+
+
+def queue_metrics(request):
+    """
+    Exposes the state of the job queue.
+
+    Parameters:
+        request (django.http.HttpRequest): The HTTP request
+
+    Returns:
+        django.http.JsonResponse: Queue depth, worker utilization, job counters, HTTP traffic per host, blob and
+        response cache usage and rate limit state
+    """
+
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'], 'Request method must be GET')
+    metrics = _get_job_queue(get_config()).metrics()
+    metrics["http"] = get_http_client().stats()
+    metrics["blob_cache"] = get_blob_cache().stats()
+    metrics["rate_limit"] = get_rate_limiter().stats()
+    metrics["response_cache"] = get_response_cache().stats()
+    metrics["import_index"] = get_import_index().stats()
+    return JsonResponse(metrics, status=200)
+
+
+def _persist_and_enqueue(payload: dict, pr_data: PullRequestData, config: Config, delivery_id: str) -> [dict | None, bool]:
+    """
+    Saves the raw payload and submits the job to the queue.
+
+    Parameters:
+        payload (dict): The webhook payload
+        pr_data (PullRequestData): The data of the PR
+        config (Config): The config
+        delivery_id (str): The ID of the webhook delivery
+
+    Returns:
+        dict | None: The new or the existing job, or None if the queue is full
+        bool: True if a new job was queued, False otherwise
+    """
+
+    execution_timestamp = new_execution_timestamp()
+    payload_path = Path(config.webhook_raw_log_dir, f"pdf_js_{pr_data.number}_{execution_timestamp}.json")
     with open(payload_path, "w") as f:
         json.dump(payload, f, indent=4)
-    bootstrap.info(f"[#{pr_number}] Payload saved to {payload_path}")
+    bootstrap.info(f"[#{pr_data.number}] Payload saved to {payload_path}")
+
+    return _get_job_queue(config).submit(
+        payload,
+        pr_data.number,
+        pr_data.id,
+        pr_data.head_commit,
+        execution_timestamp,
+        delivery_id=delivery_id
+    )
+
+
+def _close_pr(pr_data: PullRequestData, config: Config) -> None:
+    """
+    Cancels all jobs of a closed PR and removes the clone, image and prepared inputs kept for later pushes.
+    Running jobs remove these artifacts themselves once they have stopped.
+
+    Parameters:
+        pr_data (PullRequestData): The data of the PR
+        config (Config): The config
+    """
+
+    job_queue = _get_job_queue(config)
+    n_running = job_queue.cancel(pr_data.id, CancelReason.CLOSED)
+    bootstrap.info(f"[#{pr_data.number}] Pull request closed, {n_running} running job(s) cancelled")
+    if config.reuse_artifacts and n_running == 0:
+        Pipeline.remove_artifacts(pr_data, job_queue.job_store)
+
 
-    # 10) Execute pipeline
-    thread = threading.Thread(target=_execute_pipeline_in_background, daemon=True)
-    thread.start()
+def _precheck_pr(pr_data: PullRequestData, config: Config) -> [str, bool]:
+    """
+    Rejects PRs which can never be valid based on the payload alone, without any API calls.
+
+    Parameters:
+        pr_data (PullRequestData): The data of the PR
+        config (Config): The config holding the limits
+
+    Returns:
+        str: Message to deliver to client
+        bool: True if the PR is worth validating, False otherwise
+    """
+
+    if not pr_data.linked_issue_candidates:
+        return 'No linked issue found', False
+    if pr_data.changed_files is not None:
+        if pr_data.changed_files == 0:
+            return 'Must modify source code files only', False
+        if pr_data.changed_files > config.max_changed_files:
+            return f'Must not modify more than {config.max_changed_files} files', False
+    return 'Payload is queued for validation...', True
+
+
+def start_job_queue() -> None:
+    """
+    Starts the workers of the job queue when the server boots, which resumes jobs interrupted by a restart.
+    """
+
+    _get_job_queue(get_config()).start()
+
+
+def _get_job_queue(config: Config) -> JobQueue:
+    """
+    Returns the process-wide job queue, created on first use.
+
+    Parameters:
+        config (Config): The config holding the queue limits
+
+    Returns:
+        JobQueue: The job queue
+    """
+
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue(
+                JobStore(config.job_db_path),
+                _execute_job,
+                config.max_workers,
+                config.max_queue_size
+            )
+        return _job_queue
+
+
+def _execute_job(job: dict, job_store: JobStore, cancel_token: CancellationToken) -> [JobState, str]:
+    """
+    Validates the PR of a claimed job and executes its pipeline. Interrupted jobs continue after their
+    last finished attempt.
+
+    Parameters:
+        job (dict): The claimed job
+        job_store (JobStore): The store to report progress to
+        cancel_token (CancellationToken): The token which stops the pipeline if the job is cancelled
+
+    Returns:
+        JobState: The final state of the job
+        str: Message describing the outcome
+    """
+
+    pr_number = job["pr_number"]
+    pipeline = Pipeline(
+        json.loads(job["payload"]),
+        get_config(),
+        post_comment=True,
+        job_store=job_store,
+        job=job,
+        cancel_token=cancel_token
+    )
+
+    bootstrap.info(f"[#{pr_number}] Validating PR...")
+    message, valid = pipeline.is_valid_pr()
+    if not valid:
+        bootstrap.critical(f'[#{pr_number}] {message}')
+        return JobState.REJECTED, message
 
-    return JsonResponse({'status': 'accepted', 'message': message}, status=202)
+    bootstrap.info(f"[#{pr_number}] Starting pipeline execution...")
+    try:
+        generation_completed = pipeline.execute_pipeline()
+    except JobCancelled as e:
+        bootstrap.warning(f"[#{pr_number}] {e}")
+        return JobState.CANCELLED, str(e)
+    completed_message = "Test generated successfully" if generation_completed else "No test generated"
+    bootstrap.info(f"[#{pr_number}] Pipeline execution completed")
+    bootstrap.info(f"[#{pr_number}] {completed_message}")
+    return JobState.DONE, completed_message
 
 
 def _verify_signature(request, github_webhook_secret) -> bool:
@@ -109,7 +319,7 @@ def _verify_signature(request, github_webhook_secret) -> bool:
     """
 
     signature = request.headers.get('X-Hub-Signature-256')
-    if not signature:
+    if not signature or not github_webhook_secret:
         return False
     sha_name, signature = signature.split('=')
     if sha_name != 'sha256':